@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-17 05:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_chatmessage_tool_role_session_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -7,6 +7,7 @@ class ChatSession(models.Model):
     """
     session_id = models.CharField(max_length=100, unique=True)
     workflow_state = models.JSONField(default=dict, blank=True)  # Store travel planning workflow state
+    version = models.PositiveIntegerField(default=0)  # Bumped on every save, for optimistic concurrency
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -25,6 +26,7 @@ class ChatMessage(models.Model):
         ('user', 'User'),
         ('assistant', 'Assistant'),
         ('system', 'System'),
+        ('tool', 'Tool'),
     ]
     
     session = models.ForeignKey(
@@ -34,11 +36,14 @@ class ChatMessage(models.Model):
     )
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
     content = models.TextField()
-    metadata = models.JSONField(default=dict, blank=True)
+    metadata = models.JSONField(default=dict, blank=True)  # tool_calls, tool_call_id, name, ...
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['session', 'created_at'], name='chat_msg_session_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.role}: {self.content[:50]}"
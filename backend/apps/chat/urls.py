@@ -4,6 +4,7 @@ from .views import LocateCityView
 
 urlpatterns = [
     path('', views.chat, name='chat'),
+    path('stream/', views.chat_stream, name='chat_stream'),
     path('reset/', views.reset, name='reset'),
     path('update_state/', views.update_state, name='update_state'),
     path('summary/', views.summary, name='summary'),
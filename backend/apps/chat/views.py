@@ -1,11 +1,15 @@
+import json
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from services.chatbot_service import ChatbotService
+from services.session_backends import SessionConflict
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from django.views import View
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from services.image_city_service import ImageCityService
 
 
@@ -16,11 +20,15 @@ def get_chatbot_service():
     return get_chatbot_service._instance
 
 
-@api_view(['GET', 'POST'])
-def chat(request):
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+async def chat(request):
     """
     Handle chat messages with tool-calling orchestration.
     
+    Async view: under ASGI the whole LLM/Amadeus tool loop is awaited, so a
+    single worker can hold many in-flight conversations.
+    
     POST /chat
     
     Request body:
@@ -40,28 +48,87 @@ def chat(request):
     chatbot_service = get_chatbot_service()
 
     if request.method == 'GET':
-        session_id = request.query_params.get('sessionId') or request.query_params.get('session_id') or request.headers.get('X-Session-Id')
+        session_id = request.GET.get('sessionId') or request.GET.get('session_id') or request.headers.get('X-Session-Id')
         if not session_id:
-            return Response({'error': 'sessionId query param required'}, status=status.HTTP_400_BAD_REQUEST)
-        data = chatbot_service.get_session_data(session_id)
+            return JsonResponse({'error': 'sessionId query param required'}, status=status.HTTP_400_BAD_REQUEST)
+        data = await chatbot_service.aget_session_data(session_id)
         if not data:
-            return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
-        return Response(data)
+            return JsonResponse({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse(data)
 
     # POST
-    message = request.data.get('message')
+    try:
+        body = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(body, dict):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+    message = body.get('message')
     session_id = (
-        request.data.get('sessionId')
-        or request.data.get('session_id')
+        body.get('sessionId')
+        or body.get('session_id')
         or request.headers.get('X-Session-Id')
     )
     if not message:
-        return Response({'error': 'Message is required'}, status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse({'error': 'Message is required'}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        result = chatbot_service.process_message(message, session_id)
-        return Response(result)
+        result = await chatbot_service.aprocess_message(message, session_id)
+        return JsonResponse(result)
+    except SessionConflict as e:
+        return JsonResponse({'error': 'Session was updated by another request, please retry', 'details': str(e)}, status=status.HTTP_409_CONFLICT)
     except Exception as e:
-        return Response({'error': 'Failed to process message', 'details': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return JsonResponse({'error': 'Failed to process message', 'details': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+async def chat_stream(request):
+    """
+    Stream a chat reply as server-sent events.
+    
+    POST /chat/stream
+    
+    Request body: same as POST /chat
+    
+    Response: text/event-stream with `session`, `token`, `tool_call_started`,
+    `tool_call_finished`, `final` (same payload as POST /chat) and, on
+    failure, `error` events.
+    """
+    try:
+        body = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(body, dict):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+    message = body.get('message')
+    session_id = (
+        body.get('sessionId')
+        or body.get('session_id')
+        or request.headers.get('X-Session-Id')
+    )
+    if not message:
+        return JsonResponse({'error': 'Message is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    chatbot_service = get_chatbot_service()
+
+    async def event_stream():
+        try:
+            async for event, data in chatbot_service.astream_message(message, session_id):
+                yield _sse(event, data)
+        except SessionConflict as e:
+            yield _sse('error', {'error': 'Session was updated by another request, please retry', 'details': str(e)})
+        except Exception as e:
+            yield _sse('error', {'error': 'Failed to process message', 'details': str(e)})
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
 
 
 @api_view(['POST'])
@@ -113,7 +180,10 @@ def update_state(request):
     updates = request.data.get('updates') or {}
     if not isinstance(updates, dict):
         return Response({'error': 'updates must be an object'}, status=status.HTTP_400_BAD_REQUEST)
-    state = chatbot_service.update_state(session_id, updates)
+    try:
+        state = chatbot_service.update_state(session_id, updates)
+    except SessionConflict as e:
+        return Response({'error': 'Session was updated by another request, please retry', 'details': str(e)}, status=status.HTTP_409_CONFLICT)
     if state is None:
         return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
     return Response({'session_id': session_id, 'state': state})
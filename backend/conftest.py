@@ -0,0 +1,35 @@
+"""
+pytest setup: configure Django and provide a test database to tests that need one
+"""
+
+import os
+
+import django
+import pytest
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+
+@pytest.fixture(scope='session')
+def django_test_db():
+    """Create the test database (in-memory for SQLite) once per run."""
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    runner = DiscoverRunner(verbosity=0)
+    setup_test_environment()
+    old_config = runner.setup_databases()
+    yield
+    runner.teardown_databases(old_config)
+    teardown_test_environment()
+
+
+@pytest.fixture
+def db(django_test_db):
+    """Run the test in a transaction rolled back afterwards."""
+    from django.db import transaction
+
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
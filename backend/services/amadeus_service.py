@@ -13,8 +13,18 @@ This service provides functions for:
 """
 
 import os
-from typing import Optional, List, Dict, Any
+import time
+from typing import Optional, List, Dict, Any, Callable
 from amadeus import Client, ResponseError, Location
+from services.response_cache import ResponseCache, cached_response, get_default_cache
+from services.rate_limiter import RateLimiter, RateLimitTimeout, RetryPolicy, get_default_rate_limiter, parse_retry_after
+from services.circuit_breaker import get_breaker
+from services.token_manager import SDKAccessToken, TokenFetchError, get_token_manager
+from services.tool_registry import current_tool
+
+
+# Failures the endpoint wrappers report as `{'success': False, 'error': ...}`
+REQUEST_ERRORS = (ResponseError, TokenFetchError, RateLimitTimeout)
 
 
 class AmadeusService:
@@ -23,7 +33,36 @@ class AmadeusService:
     Uses the official Amadeus Python SDK.
     """
     
-    def __init__(self, client_id: Optional[str] = None, client_secret: Optional[str] = None, hostname: str = 'test'):
+    # Default cache TTLs (seconds) for reference-data endpoints; override with
+    # AMADEUS_CACHE_TTL_<METHOD_NAME> env vars, 0 disables caching.
+    CACHE_TTLS = {
+        'search_locations': 24 * 3600,
+        'lookup_airline': 7 * 24 * 3600,
+        'get_airport_routes': 24 * 3600,
+        'search_airports': 7 * 24 * 3600,
+        'get_travel_recommendations': 24 * 3600,
+        # Activity listings change slowly; bounding-box searches reuse cached tiles
+        'search_activities': 6 * 3600,
+    }
+    
+    # Offer searches are cached briefly (AMADEUS_OFFER_CACHE_TTL_MINUTES, default 5)
+    # since prices and availability move quickly, and are not served stale
+    # while Amadeus is down unless AMADEUS_OFFER_STALE_SECONDS allows it.
+    OFFER_ENDPOINTS = ('search_flights', 'search_hotels_by_hotels')
+    
+    # Client-side request rates (requests/second). Amadeus self-service allows
+    # 10 TPS per API key in test; '*' is shared by all endpoints. Override with
+    # AMADEUS_RATE_LIMIT_QPS / AMADEUS_RATE_LIMIT_<METHOD_NAME> env vars.
+    RATE_LIMITS = {'*': 10}
+    
+    def __init__(
+        self,
+        client_id: Optional[str] = None,
+        client_secret: Optional[str] = None,
+        hostname: str = 'test',
+        cache: Optional[ResponseCache] = None,
+        rate_limiter: Optional[RateLimiter] = None
+    ):
         """
         Initialize Amadeus client.
         
@@ -31,6 +70,8 @@ class AmadeusService:
             client_id: Amadeus API client ID (defaults to env var AMADEUS_CLIENT_ID)
             client_secret: Amadeus API client secret (defaults to env var AMADEUS_CLIENT_SECRET)
             hostname: 'test' or 'production' (defaults to env var AMADEUS_HOSTNAME or 'test')
+            cache: Response cache (defaults to the process-wide cache)
+            rate_limiter: Rate limiter (defaults to the process-wide limiter)
         """
         self.client_id = client_id or os.getenv('AMADEUS_CLIENT_ID')
         self.client_secret = client_secret or os.getenv('AMADEUS_CLIENT_SECRET')
@@ -44,9 +85,116 @@ class AmadeusService:
             client_secret=self.client_secret,
             hostname=self.hostname
         )
+        # Share one access token per credentials across instances, threads and (optionally) workers
+        self.token_manager = get_token_manager(self.client.host, self.client_id, self.client_secret)
+        self.client.access_token = SDKAccessToken(self.token_manager)
+        
+        self.cache = cache or get_default_cache()
+        self.cache_ttls = self.configured_cache_ttls()
+        self.stale_windows = self.configured_stale_windows()
+        self.rate_limiter = rate_limiter or get_default_rate_limiter(self.RATE_LIMITS)
+        self.retry_policy = self.configured_retry_policy()
+        self.breaker = get_breaker('amadeus')
+    
+    @classmethod
+    def configured_cache_ttls(cls) -> Dict[str, int]:
+        """Cache TTL (seconds) per endpoint, from CACHE_TTLS and the environment."""
+        offer_ttl = int(float(os.getenv('AMADEUS_OFFER_CACHE_TTL_MINUTES', '5')) * 60)
+        default_ttls = dict(cls.CACHE_TTLS, **{endpoint: offer_ttl for endpoint in cls.OFFER_ENDPOINTS})
+        return {
+            endpoint: int(os.getenv(f'AMADEUS_CACHE_TTL_{endpoint.upper()}', ttl))
+            for endpoint, ttl in default_ttls.items()
+        }
+    
+    @classmethod
+    def configured_stale_windows(cls) -> Dict[str, float]:
+        """Serve-stale window (seconds past expiry) for offer endpoints; other endpoints use the cache's."""
+        offer_stale = float(os.getenv('AMADEUS_OFFER_STALE_SECONDS', '0'))
+        return {endpoint: offer_stale for endpoint in cls.OFFER_ENDPOINTS}
+    
+    @staticmethod
+    def configured_retry_policy() -> RetryPolicy:
+        """Retry policy from AMADEUS_MAX_RETRIES, AMADEUS_RETRY_BASE_DELAY and AMADEUS_RETRY_MAX_DELAY."""
+        return RetryPolicy(
+            max_retries=int(os.getenv('AMADEUS_MAX_RETRIES', '3')),
+            base_delay=float(os.getenv('AMADEUS_RETRY_BASE_DELAY', '0.5')),
+            max_delay=float(os.getenv('AMADEUS_RETRY_MAX_DELAY', '8'))
+        )
+    
+    def _request(self, endpoint: str, fn: Callable, *args, **params) -> Any:
+        """
+        Call an Amadeus SDK method under the rate limiter and circuit breaker,
+        retrying throttled (429), server (5xx) and network errors with
+        jittered backoff, and a rejected (401) token once with a new token.
+        Calls made by a non-idempotent tool are only retried when Amadeus
+        rejected them unprocessed (401, 429). Calls that still fail with one
+        of those errors count against the circuit; while it is open, calls fail fast.
+        
+        Args:
+            endpoint: Endpoint name used for rate limits and metrics (the method name)
+            fn: SDK method to call
+            *args, **params: Arguments for `fn`
+            
+        Returns:
+            The SDK response
+            
+        Raises:
+            ResponseError: when the call fails and retries are exhausted or not applicable
+            TokenFetchError: when no access token could be obtained
+            RateLimitTimeout: when the call would queue longer than the limiter allows
+            CircuitOpenError: when Amadeus is failing and the circuit is open
+        """
+        self.breaker.allow()
+        tool_spec = current_tool()
+        idempotent = tool_spec is None or tool_spec.idempotent
+        attempt = 0
+        reauthenticated = False
+        try:
+            while True:
+                self.rate_limiter.acquire(endpoint)
+                try:
+                    response = fn(*args, **params)
+                    break
+                except (ResponseError, TokenFetchError) as error:
+                    status = self._error_status(error)
+                    if status == 401 and isinstance(error, ResponseError) and not reauthenticated:
+                        # Token revoked or expired early: replace it once and retry
+                        bearer = getattr(error.response.request, 'bearer_token', None) or ''
+                        self.token_manager.token(rejected=bearer[len('Bearer '):])
+                        reauthenticated = True
+                        continue
+                    if not self.retry_policy.should_retry(status, attempt) or (not idempotent and status != 429):
+                        raise
+                    self.rate_limiter.record_retry(endpoint, status)
+                    time.sleep(self.retry_policy.delay(attempt, parse_retry_after(self._error_headers(error))))
+                    attempt += 1
+        except (ResponseError, TokenFetchError) as error:
+            if self._error_status(error) in RetryPolicy.RETRY_STATUSES:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+        return response
+    
+    @staticmethod
+    def _error_status(error: Exception) -> Optional[int]:
+        if isinstance(error, TokenFetchError):
+            return error.status_code
+        return getattr(getattr(error, 'response', None), 'status_code', None)
+    
+    @staticmethod
+    def _error_headers(error: Exception) -> Any:
+        if isinstance(error, TokenFetchError):
+            return error.headers
+        return getattr(getattr(error, 'response', None), 'headers', None)
     
     # ==================== FLIGHT APIS ====================
     
+    @cached_response(coalesce=True)
     def search_flights(
         self,
         origin: str,
@@ -101,9 +249,17 @@ class AmadeusService:
             if non_stop:
                 params['nonStop'] = 'true'
             
-            response = self.client.shopping.flight_offers_search.get(**params)
-            return {'success': True, 'data': response.data}
-        except ResponseError as error:
+            response = self._request(
+                'search_flights',
+                self.client.shopping.flight_offers_search.get,
+                **params
+            )
+            return {
+                'success': True,
+                'data': response.data,
+                'dictionaries': (response.result or {}).get('dictionaries', {})
+            }
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     def get_flight_cheapest_dates(
@@ -134,9 +290,13 @@ class AmadeusService:
             if departure_date:
                 params['departureDate'] = departure_date
                 
-            response = self.client.shopping.flight_dates.get(**params)
+            response = self._request(
+                'get_flight_cheapest_dates',
+                self.client.shopping.flight_dates.get,
+                **params
+            )
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     def predict_flight_delay(
@@ -167,7 +327,9 @@ class AmadeusService:
             Dictionary with delay prediction
         """
         try:
-            response = self.client.travel.predictions.flight_delay.get(
+            response = self._request(
+                'predict_flight_delay',
+                self.client.travel.predictions.flight_delay.get,
                 originLocationCode=origin,
                 destinationLocationCode=destination,
                 departureDate=departure_date,
@@ -178,7 +340,7 @@ class AmadeusService:
                 flightNumber=flight_number
             )
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     # ==================== HOTEL APIS ====================
@@ -211,7 +373,9 @@ class AmadeusService:
             Dictionary with hotel offers
         """
         try:
-            response = self.client.shopping.hotel_offers_search.get(
+            response = self._request(
+                'search_hotels_by_city',
+                self.client.shopping.hotel_offers_search.get,
                 cityCode=city_code,
                 checkInDate=check_in_date,
                 checkOutDate=check_out_date,
@@ -222,9 +386,10 @@ class AmadeusService:
                 radiusUnit=radius_unit
             )
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
+    @cached_response(coalesce=True)
     def search_hotels_by_hotels(
         self,
         hotel_ids: List[str],
@@ -249,7 +414,9 @@ class AmadeusService:
             Dictionary with hotel offers
         """
         try:
-            response = self.client.shopping.hotel_offers_search.get(
+            response = self._request(
+                'search_hotels_by_hotels',
+                self.client.shopping.hotel_offers_search.get,
                 hotelIds=','.join(hotel_ids),
                 checkInDate=check_in_date,
                 checkOutDate=check_out_date,
@@ -258,7 +425,7 @@ class AmadeusService:
                 currency=currency
             )
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     def get_hotel_offer(self, offer_id: str) -> Dict[str, Any]:
@@ -272,9 +439,9 @@ class AmadeusService:
             Dictionary with hotel offer details
         """
         try:
-            response = self.client.shopping.hotel_offer_search(offer_id).get()
+            response = self._request('get_hotel_offer', self.client.shopping.hotel_offer_search(offer_id).get)
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     def get_hotel_ratings(
@@ -291,11 +458,13 @@ class AmadeusService:
             Dictionary with hotel ratings
         """
         try:
-            response = self.client.e_reputation.hotel_sentiments.get(
+            response = self._request(
+                'get_hotel_ratings',
+                self.client.e_reputation.hotel_sentiments.get,
                 hotelIds=','.join(hotel_ids[:3])  # Max 3 hotels
             )
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     def search_hotel_by_name(
@@ -318,13 +487,18 @@ class AmadeusService:
             if sub_type:
                 params['subType'] = ','.join(sub_type)
             
-            response = self.client.reference_data.locations.get(**params)
+            response = self._request(
+                'search_hotel_by_name',
+                self.client.reference_data.locations.get,
+                **params
+            )
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     # ==================== ACTIVITIES & POI APIS ====================
     
+    @cached_response()
     def search_activities(
         self,
         latitude: float,
@@ -343,13 +517,15 @@ class AmadeusService:
             Dictionary with activities data
         """
         try:
-            response = self.client.shopping.activities.get(
+            response = self._request(
+                'search_activities',
+                self.client.shopping.activities.get,
                 latitude=latitude,
                 longitude=longitude,
                 radius=radius
             )
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     def get_activity_details(self, activity_id: str) -> Dict[str, Any]:
@@ -363,9 +539,9 @@ class AmadeusService:
             Dictionary with activity details
         """
         try:
-            response = self.client.shopping.activity(activity_id).get()
+            response = self._request('get_activity_details', self.client.shopping.activity(activity_id).get)
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     def search_points_of_interest(
@@ -396,9 +572,13 @@ class AmadeusService:
             if categories:
                 params['categories'] = ','.join(categories)
             
-            response = self.client.reference_data.locations.points_of_interest.get(**params)
+            response = self._request(
+                'search_points_of_interest',
+                self.client.reference_data.locations.points_of_interest.get,
+                **params
+            )
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     def get_poi_details(self, poi_id: str) -> Dict[str, Any]:
@@ -412,13 +592,14 @@ class AmadeusService:
             Dictionary with POI details
         """
         try:
-            response = self.client.reference_data.locations.point_of_interest(poi_id).get()
+            response = self._request('get_poi_details', self.client.reference_data.locations.point_of_interest(poi_id).get)
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     # ==================== LOCATION APIS ====================
     
+    @cached_response()
     def search_locations(
         self,
         keyword: str,
@@ -445,9 +626,9 @@ class AmadeusService:
                 sub_type_value = [getattr(Location, st, st) for st in sub_type]
                 params['subType'] = sub_type_value
             
-            response = self.client.reference_data.locations.get(**params)
+            response = self._request('search_locations', self.client.reference_data.locations.get, **params)
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     def get_location_details(self, location_id: str) -> Dict[str, Any]:
@@ -461,11 +642,12 @@ class AmadeusService:
             Dictionary with location details
         """
         try:
-            response = self.client.reference_data.location(location_id).get()
+            response = self._request('get_location_details', self.client.reference_data.location(location_id).get)
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
+    @cached_response()
     def search_airports(
         self,
         latitude: float,
@@ -484,13 +666,15 @@ class AmadeusService:
             Dictionary with nearby airports
         """
         try:
-            response = self.client.reference_data.locations.airports.get(
+            response = self._request(
+                'search_airports',
+                self.client.reference_data.locations.airports.get,
                 latitude=latitude,
                 longitude=longitude,
                 radius=radius
             )
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     # ==================== TRANSFER APIS ====================
@@ -536,13 +720,14 @@ class AmadeusService:
             if end_address_line:
                 body['endAddressLine'] = end_address_line
             
-            response = self.client.shopping.transfer_offers.post(body)
+            response = self._request('search_transfers', self.client.shopping.transfer_offers.post, body)
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     # ==================== RECOMMENDATIONS APIS ====================
     
+    @cached_response()
     def get_travel_recommendations(
         self,
         origin: str,
@@ -565,13 +750,18 @@ class AmadeusService:
             if destination_country:
                 params['destinationCountryCodes'] = destination_country
             
-            response = self.client.reference_data.recommended_locations.get(**params)
+            response = self._request(
+                'get_travel_recommendations',
+                self.client.reference_data.recommended_locations.get,
+                **params
+            )
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
     # ==================== AIRLINE & AIRPORT INFO ====================
     
+    @cached_response()
     def lookup_airline(self, airline_code: str) -> Dict[str, Any]:
         """
         Look up airline information by code.
@@ -583,11 +773,16 @@ class AmadeusService:
             Dictionary with airline information
         """
         try:
-            response = self.client.reference_data.airlines.get(airlineCodes=airline_code)
+            response = self._request(
+                'lookup_airline',
+                self.client.reference_data.airlines.get,
+                airlineCodes=airline_code
+            )
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
     
+    @cached_response()
     def get_airport_routes(
         self,
         airport_code: str,
@@ -604,10 +799,12 @@ class AmadeusService:
             Dictionary with airport routes
         """
         try:
-            response = self.client.airport.direct_destinations.get(
+            response = self._request(
+                'get_airport_routes',
+                self.client.airport.direct_destinations.get,
                 departureAirportCode=airport_code,
                 max=max_results
             )
             return {'success': True, 'data': response.data}
-        except ResponseError as error:
+        except REQUEST_ERRORS as error:
             return {'success': False, 'error': str(error)}
@@ -4,22 +4,93 @@ Provides all required functions for travel chatbot tool-calling
 """
 
 import os
-from typing import Optional, List, Dict, Any
+from datetime import date, timedelta
+from typing import Optional, List, Dict, Any, Tuple, Callable
 from services.amadeus_service import AmadeusService as BaseAmadeusService
+from services.tool_registry import ToolRegistry, tool
+from services.offer_store import get_default_offer_store
+from services.concurrency import fan_out
+from services.geo_tiling import TooManyTiles, cover_box
+from services.gazetteer import get_default_gazetteer, learn_locations, summarize_location
+from services.route_graph import get_default_route_graph
+from services.spatial_index import get_default_spatial_index
+from services.offer_projection import (
+    project_flight_offer, project_flight_offers, project_hotel_offers, project_activities, project_date_matrix,
+    project_route_comparison, project_points_of_interest
+)
 
 
 class AmadeusToolService:
     """
     Wrapper around AmadeusService to provide exact function signatures
     required for the chatbot tool-calling interface.
+    
+    Each tool method declares its schema and execution policy with @tool;
+    `self.registry` dispatches calls and generates the tool list.
     """
     
+    # Concurrent calls per tool concurrency class; override with TOOL_CONCURRENCY_<CLASS> env vars
+    CONCURRENCY_LIMITS = {
+        'search': 4,
+        'pricing': 2,
+        'reference': 8,
+    }
+    
     def __init__(self):
         """Initialize the Amadeus tool service."""
         self.base_service = BaseAmadeusService()
+        self.offer_store = get_default_offer_store()
+        # Number of ranked summaries returned to the LLM per search
+        self.flight_offers_limit = int(os.getenv('FLIGHT_OFFERS_RESULT_LIMIT', '10'))
+        self.hotel_results_limit = int(os.getenv('HOTEL_RESULTS_LIMIT', '10'))
+        self.activity_results_limit = int(os.getenv('ACTIVITY_RESULTS_LIMIT', '20'))
+        self.poi_results_limit = int(os.getenv('POI_RESULTS_LIMIT', '20'))
+        self.location_results_limit = int(os.getenv('LOCATION_RESULTS_LIMIT', '10'))
+        # Fan-out of one tool call into several Amadeus requests
+        self.hotel_ids_per_request = int(os.getenv('HOTEL_IDS_PER_REQUEST', '20'))
+        self.fanout_concurrency = int(os.getenv('AMADEUS_FANOUT_CONCURRENCY', '4'))
+        self.fanout_timeout = float(os.getenv('AMADEUS_FANOUT_TIMEOUT', '25'))
+        self.activity_tile_max_radius = float(os.getenv('ACTIVITY_TILE_MAX_RADIUS_KM', '20'))
+        self.activity_max_tiles = int(os.getenv('ACTIVITY_MAX_TILES', '16'))
+        self.flight_matrix_max_cells = int(os.getenv('FLIGHT_MATRIX_MAX_CELLS', '25'))
+        self.flight_matrix_offers_per_cell = int(os.getenv('FLIGHT_MATRIX_OFFERS_PER_CELL', '10'))
+        self.flight_matrix_best = int(os.getenv('FLIGHT_MATRIX_BEST', '3'))
+        self.multi_route_max_pairs = int(os.getenv('MULTI_ROUTE_MAX_PAIRS', '12'))
+        self.multi_route_offers_per_search = int(os.getenv('MULTI_ROUTE_OFFERS_PER_SEARCH', '20'))
+        self.multi_route_offers_per_route = int(os.getenv('MULTI_ROUTE_OFFERS_PER_ROUTE', '2'))
+        self.airport_routes_limit = int(os.getenv('AIRPORT_ROUTES_LIMIT', '50'))
+        self.connection_max_hubs = int(os.getenv('CONNECTION_MAX_HUBS', '20'))
+        self.connection_results_limit = int(os.getenv('CONNECTION_RESULTS_LIMIT', '5'))
+        self.route_graph = get_default_route_graph()
+        self.spatial_index = get_default_spatial_index()
+        
+        self.registry = ToolRegistry.from_instance(self, {
+            name: int(os.getenv(f'TOOL_CONCURRENCY_{name.upper()}', limit))
+            for name, limit in self.CONCURRENCY_LIMITS.items()
+        })
     
     # ==================== LOCATION / AIRPORT TOOLS ====================
     
+    @property
+    def gazetteer(self):
+        """Process-wide gazetteer, re-fetched so file reloads are picked up."""
+        return get_default_gazetteer()
+    
+    @tool(
+        description='Search for airports and cities by keyword. Use this to find airport codes.',
+        parameters={
+            'keyword': {'type': 'string', 'description': 'Search keyword (city name, airport name, etc.)'},
+            'subType': {
+                'type': 'string',
+                'description': 'Optional: Filter by type (AIRPORT, CITY)',
+                'enum': ['AIRPORT', 'CITY']
+            }
+        },
+        required=['keyword'],
+        cacheable=True,
+        timeout=10,
+        concurrency='reference'
+    )
     def airport_city_search(self, keyword: str, subType: Optional[str] = None) -> Dict[str, Any]:
         """
         Search for airports and cities by keyword.
@@ -28,11 +99,39 @@ class AmadeusToolService:
             keyword: Search keyword
             subType: Location subtype (AIRPORT, CITY, etc.)
         """
-        return self.base_service.search_locations(
+        # Answer exact codes and names from the local gazetteer; everything else goes to Amadeus
+        matches = self.gazetteer.match(keyword, sub_type=subType, limit=self.location_results_limit)
+        if matches:
+            return {'success': True, 'data': matches, 'meta': {'count': len(matches), 'source': 'gazetteer'}}
+        
+        result = self.base_service.search_locations(
             keyword=keyword,
             sub_type=[subType] if subType else None
         )
+        if result.get('success') and result['data']:
+            learn_locations(result['data'])
+            locations = [summarize_location(location) for location in result['data'][:self.location_results_limit]]
+            return self._with_staleness(
+                {'success': True, 'data': locations, 'meta': {'count': len(locations), 'source': 'amadeus'}}, [result]
+            )
+        
+        # Nothing matches: offer places starting with or spelled like the keyword, labelled as not being matches
+        suggestions = self.gazetteer.search(keyword, sub_type=subType, limit=5) or self.gazetteer.suggest(keyword, sub_type=subType)
+        if suggestions:
+            result = dict(result, suggestions=suggestions, note=(
+                f'No location matches "{keyword}". The suggestions are places with similar names and may be '
+                'different places; confirm with the user before using one.'
+            ))
+        return result
     
+    @tool(
+        description='Get all direct destinations from a departure airport.',
+        parameters={'departureAirportCode': {'type': 'string', 'description': 'Departure airport IATA code'}},
+        required=['departureAirportCode'],
+        cacheable=True,
+        timeout=10,
+        concurrency='reference'
+    )
     def airport_direct_destinations(self, departureAirportCode: str) -> Dict[str, Any]:
         """
         Get direct destinations from a departure airport.
@@ -40,8 +139,121 @@ class AmadeusToolService:
         Args:
             departureAirportCode: IATA code of departure airport
         """
-        return self.base_service.get_airport_routes(departureAirportCode)
+        result = self.base_service.get_airport_routes(departureAirportCode, max_results=self.airport_routes_limit)
+        if result.get('success'):
+            self.route_graph.set_destinations(
+                departureAirportCode, [route['iataCode'] for route in result['data'] if route.get('iataCode')],
+                # A list cut off at the limit may miss routes
+                partial=len(result['data']) >= self.airport_routes_limit
+            )
+        return result
+    
+    def _locate(self, code: str) -> Optional[Tuple[float, float]]:
+        """Coordinates of an airport (or city) code from the gazetteer."""
+        location = self.gazetteer.get(code, 'AIRPORT') or self.gazetteer.get(code, 'CITY')
+        return (location['latitude'], location['longitude']) if location else None
+    
+    def _refresh_routes(self, codes: List[str]) -> Tuple[int, List[Dict[str, Any]], List[BaseException]]:
+        """
+        Fetch direct destinations for the codes whose graph entry is stale.
+        
+        Returns:
+            Number of requests made, errors per code and raised exceptions
+        """
+        stale = self.route_graph.stale(codes)
+        errors, exceptions = [], []
+        for code, result, error in fan_out(self.airport_direct_destinations, stale, self.fanout_concurrency, self.fanout_timeout):
+            if error is not None:
+                exceptions.append(error)
+                errors.append({'airport': code, 'error': str(error)})
+            elif not result.get('success'):
+                errors.append({'airport': code, 'error': result.get('error')})
+        return len(stale), errors, exceptions
+    
+    @tool(
+        description=(
+            'Find how to fly between two airports with up to two stops, using known direct routes. '
+            'Returns the shortest connections by distance (e.g., CLJ-MUC-LIS). '
+            'Use this to discover connecting airports before searching flights; it does not check prices or dates.'
+        ),
+        parameters={
+            'originLocationCode': {'type': 'string', 'description': 'Origin airport IATA code'},
+            'destinationLocationCode': {'type': 'string', 'description': 'Destination airport IATA code'},
+            'maxStops': {'type': 'integer', 'description': 'Optional: Maximum number of stops, 0-2 (default 1)'},
+            'maxResults': {'type': 'integer', 'description': 'Optional: Number of connections to return (default 5)'}
+        },
+        required=['originLocationCode', 'destinationLocationCode'],
+        cacheable=True,
+        timeout=30,
+        concurrency='reference'
+    )
+    def flight_connections(
+        self,
+        originLocationCode: str,
+        destinationLocationCode: str,
+        maxStops: int = 1,
+        maxResults: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Find connections in the route graph.
+        
+        The direct destinations of origin and destination are enough for
+        one-stop connections (routes are assumed to run both ways). For two
+        stops, the origin's destinations with the smallest detour are
+        expanded too, at most CONNECTION_MAX_HUBS of them. Only stale graph
+        entries are fetched, concurrently through fan_out.
+        
+        Args:
+            originLocationCode: Origin IATA code
+            destinationLocationCode: Destination IATA code
+            maxStops: Maximum number of intermediate airports (0-2)
+            maxResults: Number of connections to return
+        """
+        origin = originLocationCode.strip().upper()
+        destination = destinationLocationCode.strip().upper()
+        if origin == destination:
+            return {'success': False, 'error': 'Origin and destination must differ.'}
+        try:
+            maxStops = int(maxStops)
+            maxResults = int(maxResults) if maxResults is not None else None
+        except (TypeError, ValueError):
+            return {'success': False, 'error': 'maxStops and maxResults must be integers.'}
+        if not 0 <= maxStops <= 2:
+            return {'success': False, 'error': 'maxStops must be between 0 and 2.'}
+        
+        requests, errors, exceptions = self._refresh_routes([origin, destination])
+        if not self.route_graph.is_fresh(origin) and not self.route_graph.is_fresh(destination):
+            if exceptions:
+                raise exceptions[0]
+            return {'success': False, 'error': errors[0]['error'], 'errors': errors}
+        if maxStops == 2:
+            hubs = self.route_graph.hubs(origin, destination, self._locate, self.connection_max_hubs)
+            hub_requests, hub_errors, _ = self._refresh_routes(hubs)
+            requests += hub_requests
+            errors += hub_errors
+        
+        connections = self.route_graph.connections(
+            origin, destination, self._locate,
+            max_stops=maxStops,
+            k=maxResults or self.connection_results_limit
+        )
+        response = {
+            'success': True,
+            'data': connections,
+            'meta': {'count': len(connections), 'requests': requests, 'failed_requests': len(errors)}
+        }
+        if errors:
+            response['errors'] = errors
+        return response
     
+    @tool(
+        description='Get all destinations served by an airline.',
+        parameters={'airlineCode': {'type': 'string', 'description': 'Airline IATA code (e.g., AA)'}},
+        required=['airlineCode'],
+        cacheable=True,
+        timeout=10,
+        concurrency='reference'
+    )
     def airline_destinations(self, airlineCode: str) -> Dict[str, Any]:
         """
         Get destinations served by an airline.
@@ -54,6 +266,26 @@ class AmadeusToolService:
     
     # ==================== FLIGHT TOOLS ====================
     
+    @tool(
+        description='Search for flight offers between two locations. Returns the cheapest offers as compact summaries with an offer handle.',
+        parameters={
+            'originLocationCode': {'type': 'string', 'description': 'Origin airport IATA code (e.g., JFK)'},
+            'destinationLocationCode': {'type': 'string', 'description': 'Destination airport IATA code (e.g., LAX)'},
+            'departureDate': {'type': 'string', 'description': 'Departure date in YYYY-MM-DD format'},
+            'adults': {'type': 'integer', 'description': 'Number of adult travelers'},
+            'returnDate': {'type': 'string', 'description': 'Optional: Return date in YYYY-MM-DD format'},
+            'children': {'type': 'integer', 'description': 'Optional: Number of children'},
+            'travelClass': {
+                'type': 'string',
+                'description': 'Optional: Travel class',
+                'enum': ['ECONOMY', 'PREMIUM_ECONOMY', 'BUSINESS', 'FIRST']
+            }
+        },
+        required=['originLocationCode', 'destinationLocationCode', 'departureDate', 'adults'],
+        cacheable=True,
+        timeout=30,
+        concurrency='search'
+    )
     def flight_offers_search(
         self,
         originLocationCode: str,
@@ -65,6 +297,9 @@ class AmadeusToolService:
         """
         Search for flight offers.
         
+        Returns compact, ranked summaries; each carries a `handle` that
+        resolves to the full offer (see flight_offers_price).
+        
         Args:
             originLocationCode: Origin IATA code
             destinationLocationCode: Destination IATA code
@@ -72,7 +307,7 @@ class AmadeusToolService:
             adults: Number of adults
             **optional: Optional parameters
         """
-        return self.base_service.search_flights(
+        result = self.base_service.search_flights(
             origin=originLocationCode,
             destination=destinationLocationCode,
             departure_date=departureDate,
@@ -85,7 +320,25 @@ class AmadeusToolService:
             currency=optional.get('currencyCode', 'USD'),
             max_results=optional.get('max', 250)
         )
+        if not result.get('success'):
+            return result
+        
+        projection = project_flight_offers(
+            result.get('data') or [],
+            self.offer_store,
+            limit=self.flight_offers_limit,
+            dictionaries=result.get('dictionaries')
+        )
+        return self._with_staleness({'success': True, 'data': projection['offers'], 'meta': projection['meta']}, [result])
     
+    @tool(
+        description='Get inspirational flight destinations from an origin.',
+        parameters={'origin': {'type': 'string', 'description': 'Origin airport IATA code'}},
+        required=['origin'],
+        cacheable=True,
+        timeout=20,
+        concurrency='search'
+    )
     def flight_inspiration_search(self, origin: str, **optional) -> Dict[str, Any]:
         """
         Get flight inspiration search (destinations from origin).
@@ -100,6 +353,17 @@ class AmadeusToolService:
             max_results=optional.get('max', 10)
         )
     
+    @tool(
+        description='Find the cheapest dates to fly between two locations.',
+        parameters={
+            'origin': {'type': 'string', 'description': 'Origin airport IATA code'},
+            'destination': {'type': 'string', 'description': 'Destination airport IATA code'}
+        },
+        required=['origin', 'destination'],
+        cacheable=True,
+        timeout=20,
+        concurrency='search'
+    )
     def flight_cheapest_date_search(
         self,
         origin: str,
@@ -121,22 +385,282 @@ class AmadeusToolService:
             one_way=optional.get('oneWay', False)
         )
     
-    def flight_offers_price(self, flight_offer: Dict[str, Any], include: Optional[str] = None) -> Dict[str, Any]:
+    @tool(
+        description=(
+            'Compare prices across nearby dates: searches every departure (and return) date within '
+            '+/- flexDays of the given dates and returns a price matrix plus the cheapest options with '
+            'offer handles. Use this instead of repeated flight_offers_search calls for flexible dates.'
+        ),
+        parameters={
+            'originLocationCode': {'type': 'string', 'description': 'Origin airport IATA code'},
+            'destinationLocationCode': {'type': 'string', 'description': 'Destination airport IATA code'},
+            'departureDate': {'type': 'string', 'description': 'Central departure date in YYYY-MM-DD format'},
+            'returnDate': {'type': 'string', 'description': 'Optional: Central return date in YYYY-MM-DD format'},
+            'flexDays': {'type': 'integer', 'description': 'Optional: Days searched before and after each date (default 2)'},
+            'adults': {'type': 'integer', 'description': 'Number of adult travelers'},
+            'children': {'type': 'integer', 'description': 'Optional: Number of children'},
+            'travelClass': {
+                'type': 'string',
+                'description': 'Optional: Travel class',
+                'enum': ['ECONOMY', 'PREMIUM_ECONOMY', 'BUSINESS', 'FIRST']
+            },
+            'nonStop': {'type': 'boolean', 'description': 'Optional: Only non-stop flights'}
+        },
+        required=['originLocationCode', 'destinationLocationCode', 'departureDate', 'adults'],
+        cacheable=True,
+        timeout=45,
+        concurrency='search'
+    )
+    def flight_date_matrix(
+        self,
+        originLocationCode: str,
+        destinationLocationCode: str,
+        departureDate: str,
+        adults: int,
+        returnDate: Optional[str] = None,
+        flexDays: int = 2,
+        **optional
+    ) -> Dict[str, Any]:
+        """
+        Search flight offers over a grid of departure (and return) dates.
+        
+        Every cell is a regular search_flights call, so cells are cached
+        individually and widening or shifting the window only fetches the
+        new cells. Cells run concurrently under the Amadeus rate limiter;
+        past dates and returns before departures are skipped.
+        
+        Args:
+            originLocationCode: Origin IATA code
+            destinationLocationCode: Destination IATA code
+            departureDate: Central departure date (YYYY-MM-DD)
+            adults: Number of adults
+            returnDate: Central return date (YYYY-MM-DD), omitted for one-way
+            flexDays: Days searched on each side of the central dates
+            **optional: Optional parameters
+        """
+        try:
+            departure = date.fromisoformat(departureDate)
+            ret = date.fromisoformat(returnDate) if returnDate else None
+        except ValueError:
+            return {'success': False, 'error': 'Dates must be in YYYY-MM-DD format.'}
+        flex = max(0, int(flexDays))
+        offsets = [timedelta(days=offset) for offset in range(-flex, flex + 1)]
+        today = date.today()
+        cells = [
+            ((departure + d).isoformat(), (ret + r).isoformat() if ret else None)
+            for d in offsets
+            for r in (offsets if ret else [None])
+            if departure + d >= today and (ret is None or ret + r >= departure + d)
+        ]
+        if not cells:
+            return {'success': False, 'error': 'No searchable dates: the window is entirely in the past.'}
+        if len(cells) > self.flight_matrix_max_cells:
+            return {
+                'success': False,
+                'error': f'Date window too wide: {len(cells)} date combinations (max {self.flight_matrix_max_cells}). Use fewer flexDays.'
+            }
+        
+        def search_cell(cell: Tuple[str, Optional[str]]) -> Dict[str, Any]:
+            return self.base_service.search_flights(
+                origin=originLocationCode,
+                destination=destinationLocationCode,
+                departure_date=cell[0],
+                adults=adults,
+                return_date=cell[1],
+                children=optional.get('children', 0),
+                travel_class=optional.get('travelClass'),
+                non_stop=optional.get('nonStop', False),
+                currency=optional.get('currencyCode', 'USD'),
+                max_results=self.flight_matrix_offers_per_cell
+            )
+        
+        searched, results, errors, exceptions = [], [], [], []
+        for cell, result, error in fan_out(search_cell, cells, self.fanout_concurrency, self.fanout_timeout):
+            if error is not None:
+                exceptions.append(error)
+                errors.append({'departureDate': cell[0], 'returnDate': cell[1], 'error': str(error)})
+            elif not result.get('success'):
+                errors.append({'departureDate': cell[0], 'returnDate': cell[1], 'error': result.get('error')})
+            else:
+                searched.append((cell[0], cell[1], result.get('data') or []))
+                results.append(result)
+        
+        if not searched and errors:
+            if exceptions:
+                raise exceptions[0]
+            return {'success': False, 'error': errors[0]['error'], 'errors': errors}
+        
+        matrix = project_date_matrix(searched, self.offer_store, best=self.flight_matrix_best)
+        response = {
+            'success': True,
+            'data': matrix,
+            'meta': {
+                'cells': len(cells),
+                'priced_cells': sum(price is not None for row in matrix['prices'] for price in row),
+                'failed_cells': len(errors)
+            }
+        }
+        if errors:
+            response['errors'] = errors
+        return self._with_staleness(response, results)
+    
+    @tool(
+        description=(
+            'Compare flights from any of several origins to any of several destinations on the same dates '
+            'in one call. Returns routes ranked by cheapest price, each with its best offers and handles. '
+            'Use this instead of one flight_offers_search per airport pair.'
+        ),
+        parameters={
+            'origins': {'type': 'array', 'items': {'type': 'string'}, 'description': 'Origin airport or city IATA codes'},
+            'destinations': {'type': 'array', 'items': {'type': 'string'}, 'description': 'Destination airport or city IATA codes'},
+            'departureDate': {'type': 'string', 'description': 'Departure date in YYYY-MM-DD format'},
+            'returnDate': {'type': 'string', 'description': 'Optional: Return date in YYYY-MM-DD format'},
+            'adults': {'type': 'integer', 'description': 'Number of adult travelers'},
+            'children': {'type': 'integer', 'description': 'Optional: Number of children'},
+            'travelClass': {
+                'type': 'string',
+                'description': 'Optional: Travel class',
+                'enum': ['ECONOMY', 'PREMIUM_ECONOMY', 'BUSINESS', 'FIRST']
+            },
+            'nonStop': {'type': 'boolean', 'description': 'Optional: Only non-stop flights'}
+        },
+        required=['origins', 'destinations', 'departureDate', 'adults'],
+        cacheable=True,
+        timeout=45,
+        concurrency='search'
+    )
+    def multi_route_flight_search(
+        self,
+        origins: List[str],
+        destinations: List[str],
+        departureDate: str,
+        adults: int,
+        returnDate: Optional[str] = None,
+        **optional
+    ) -> Dict[str, Any]:
+        """
+        Search every origin/destination pair concurrently and compare them.
+        
+        Each pair is a regular (cached) search_flights call; pairs run
+        through fan_out with bounded parallelism under the rate limiter.
+        
+        Args:
+            origins: Origin IATA codes
+            destinations: Destination IATA codes
+            departureDate: Departure date (YYYY-MM-DD)
+            adults: Number of adults
+            returnDate: Return date (YYYY-MM-DD), omitted for one-way
+            **optional: Optional parameters
+        """
+        origins = list(dict.fromkeys(code.strip().upper() for code in origins if code and code.strip()))
+        destinations = list(dict.fromkeys(code.strip().upper() for code in destinations if code and code.strip()))
+        pairs = [(origin, destination) for origin in origins for destination in destinations if origin != destination]
+        if not pairs:
+            return {'success': False, 'error': 'Provide at least one origin and one different destination.'}
+        if len(pairs) > self.multi_route_max_pairs:
+            return {
+                'success': False,
+                'error': f'Too many routes: {len(pairs)} origin/destination pairs (max {self.multi_route_max_pairs}).'
+            }
+        
+        def search_pair(pair: Tuple[str, str]) -> Dict[str, Any]:
+            return self.base_service.search_flights(
+                origin=pair[0],
+                destination=pair[1],
+                departure_date=departureDate,
+                adults=adults,
+                return_date=returnDate,
+                children=optional.get('children', 0),
+                travel_class=optional.get('travelClass'),
+                non_stop=optional.get('nonStop', False),
+                currency=optional.get('currencyCode', 'USD'),
+                max_results=self.multi_route_offers_per_search
+            )
+        
+        routes, results, errors, exceptions = [], [], [], []
+        for pair, result, error in fan_out(search_pair, pairs, self.fanout_concurrency, self.fanout_timeout):
+            if error is not None:
+                exceptions.append(error)
+                errors.append({'origin': pair[0], 'destination': pair[1], 'error': str(error)})
+            elif not result.get('success'):
+                errors.append({'origin': pair[0], 'destination': pair[1], 'error': result.get('error')})
+            else:
+                routes.append((pair[0], pair[1], result.get('data') or []))
+                results.append(result)
+        
+        if not routes and errors:
+            if exceptions:
+                raise exceptions[0]
+            return {'success': False, 'error': errors[0]['error'], 'errors': errors}
+        
+        comparison = project_route_comparison(routes, self.offer_store, offers_per_route=self.multi_route_offers_per_route)
+        response = {
+            'success': True,
+            'data': comparison['routes'],
+            'meta': {'routes': len(pairs), 'failed_routes': len(errors)}
+        }
+        if errors:
+            response['errors'] = errors
+        return self._with_staleness(response, results)
+    
+    @tool(
+        description='Get confirmed pricing for a specific flight offer.',
+        parameters={
+            'offer_handle': {'type': 'string', 'description': 'Offer handle from flight_offers_search results (e.g., F3)'},
+            'include': {'type': 'string', 'description': 'Optional fields to include in response'}
+        },
+        required=['offer_handle'],
+        cacheable=False,
+        timeout=20,
+        idempotent=False,
+        concurrency='pricing'
+    )
+    def flight_offers_price(
+        self,
+        offer_handle: Optional[str] = None,
+        flight_offer: Optional[Dict[str, Any]] = None,
+        include: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Get confirmed pricing for a specific flight offer.
         
         Args:
-            flight_offer: Flight offer object
+            offer_handle: Handle of an offer returned by flight_offers_search
+            flight_offer: Full flight offer object (used when no handle is given)
             include: Optional fields to include
         """
+        if offer_handle:
+            flight_offer = self.offer_store.get(offer_handle)
+            if flight_offer is None:
+                return {
+                    'success': False,
+                    'error': f"Unknown or expired offer handle '{offer_handle}'. Run flight_offers_search again."
+                }
+        if not flight_offer:
+            return {'success': False, 'error': 'Provide offer_handle from flight_offers_search.'}
+        
         # The base service doesn't have this, so we'll return the offer as-is
         # In production, you'd implement the pricing confirmation API
+        handle = offer_handle.strip().upper() if offer_handle else self.offer_store.put(flight_offer, 'F')
         return {
             'success': True,
-            'data': flight_offer,
+            'data': project_flight_offer(flight_offer, handle),
             'message': 'Flight pricing confirmation (mocked)'
         }
     
+    @tool(
+        description='Predict the purpose of a trip (business or leisure).',
+        parameters={
+            'originLocationCode': {'type': 'string', 'description': 'Origin airport IATA code'},
+            'destinationLocationCode': {'type': 'string', 'description': 'Destination airport IATA code'},
+            'departureDate': {'type': 'string', 'description': 'Departure date in YYYY-MM-DD format'},
+            'returnDate': {'type': 'string', 'description': 'Return date in YYYY-MM-DD format'}
+        },
+        required=['originLocationCode', 'destinationLocationCode', 'departureDate', 'returnDate'],
+        cacheable=True,
+        timeout=10,
+        concurrency='reference'
+    )
     def trip_purpose_prediction(
         self,
         originLocationCode: str,
@@ -166,6 +690,14 @@ class AmadeusToolService:
     
     # ==================== HOTEL TOOLS ====================
     
+    @tool(
+        description='Get list of hotels in a city.',
+        parameters={'cityCode': {'type': 'string', 'description': 'IATA city code (e.g., PAR for Paris)'}},
+        required=['cityCode'],
+        cacheable=True,
+        timeout=15,
+        concurrency='reference'
+    )
     def hotel_list(self, cityCode: str, **filters) -> Dict[str, Any]:
         """
         Get list of hotels in a city.
@@ -180,6 +712,19 @@ class AmadeusToolService:
             sub_type=['HOTEL_LEISURE', 'HOTEL_GDS']
         )
     
+    @tool(
+        description='Search for hotel offers. Accepts any number of hotel IDs; returns hotels ranked by price with offer handles.',
+        parameters={
+            'hotelIds': {'type': 'array', 'items': {'type': 'string'}, 'description': 'Array of hotel IDs'},
+            'checkInDate': {'type': 'string', 'description': 'Check-in date in YYYY-MM-DD format'},
+            'checkOutDate': {'type': 'string', 'description': 'Check-out date in YYYY-MM-DD format'},
+            'adults': {'type': 'integer', 'description': 'Number of adults'}
+        },
+        required=['hotelIds', 'checkInDate', 'checkOutDate', 'adults'],
+        cacheable=True,
+        timeout=30,
+        concurrency='search'
+    )
     def hotel_search(
         self,
         hotelIds: List[str],
@@ -189,7 +734,9 @@ class AmadeusToolService:
         **filters
     ) -> Dict[str, Any]:
         """
-        Search for hotel offers.
+        Search for hotel offers. IDs are fetched in chunks of
+        `hotel_ids_per_request`, concurrently; offers from all chunks are
+        ranked together and chunks that failed are listed under `errors`.
         
         Args:
             hotelIds: Array of hotel IDs
@@ -198,25 +745,94 @@ class AmadeusToolService:
             adults: Number of adults
             **filters: Optional filters
         """
-        return self.base_service.search_hotels_by_hotels(
-            hotel_ids=hotelIds,
-            check_in_date=checkInDate,
-            check_out_date=checkOutDate,
-            adults=adults,
-            room_quantity=filters.get('roomQuantity', 1),
-            currency=filters.get('currency', 'USD')
-        )
+        # Amadeus caps the IDs per request: fetch sorted chunks (stable cache keys) concurrently
+        hotel_ids = sorted({hotel_id.strip().upper() for hotel_id in hotelIds if hotel_id and hotel_id.strip()})
+        chunks = [hotel_ids[i:i + self.hotel_ids_per_request] for i in range(0, len(hotel_ids), self.hotel_ids_per_request)]
+        
+        def search_chunk(chunk: List[str]) -> Dict[str, Any]:
+            return self.base_service.search_hotels_by_hotels(
+                hotel_ids=chunk,
+                check_in_date=checkInDate,
+                check_out_date=checkOutDate,
+                adults=adults,
+                room_quantity=filters.get('roomQuantity', 1),
+                currency=filters.get('currency', 'USD')
+            )
+        
+        hotels, results, errors, exceptions = [], [], [], []
+        for chunk, result, error in fan_out(search_chunk, chunks, self.fanout_concurrency, self.fanout_timeout):
+            if error is not None:
+                exceptions.append(error)
+                errors.append({'hotelIds': chunk, 'error': str(error)})
+            elif not result.get('success'):
+                errors.append({'hotelIds': chunk, 'error': result.get('error')})
+            else:
+                hotels.extend(result.get('data') or [])
+                results.append(result)
+        
+        if not hotels and errors:
+            if exceptions:
+                raise exceptions[0]
+            return {'success': False, 'error': errors[0]['error'], 'errors': errors}
+        
+        projection = project_hotel_offers(hotels, self.offer_store, limit=self.hotel_results_limit)
+        response = {
+            'success': True,
+            'data': projection['hotels'],
+            'meta': dict(projection['meta'], requests=len(chunks), failed_requests=len(errors))
+        }
+        if errors:
+            response['errors'] = errors
+        return self._with_staleness(response, results)
     
-    def hotel_offers_by_hotel(self, hotelId: str, **fields) -> Dict[str, Any]:
+    @tool(
+        description='Get offers for a specific hotel, or the current details of an offer from hotel_search.',
+        parameters={
+            'hotelId': {'type': 'string', 'description': 'Hotel ID'},
+            'offer_handle': {'type': 'string', 'description': 'Offer handle from hotel_search results (e.g., H2)'}
+        },
+        required=[],
+        cacheable=False,
+        timeout=20,
+        idempotent=False,
+        concurrency='pricing'
+    )
+    def hotel_offers_by_hotel(
+        self,
+        hotelId: Optional[str] = None,
+        offer_handle: Optional[str] = None,
+        **fields
+    ) -> Dict[str, Any]:
         """
         Get offers for a specific hotel.
         
         Args:
             hotelId: Hotel ID
+            offer_handle: Handle of a hotel offer returned by hotel_search
             **fields: Optional fields
         """
+        if offer_handle:
+            offer = self.offer_store.get(offer_handle)
+            if offer is None:
+                return {
+                    'success': False,
+                    'error': f"Unknown or expired offer handle '{offer_handle}'. Run hotel_search again."
+                }
+            return self.base_service.get_hotel_offer(offer['id'])
+        if not hotelId:
+            return {'success': False, 'error': 'Provide hotelId or offer_handle.'}
         return self.base_service.get_hotel_offer(hotelId)
     
+    @tool(
+        description='Get hotel ratings and sentiment analysis.',
+        parameters={
+            'hotelIds': {'type': 'array', 'items': {'type': 'string'}, 'description': 'Array of hotel IDs (max 3)'}
+        },
+        required=['hotelIds'],
+        cacheable=True,
+        timeout=15,
+        concurrency='reference'
+    )
     def hotel_ratings(self, hotelIds: List[str]) -> Dict[str, Any]:
         """
         Get hotel ratings (sentiment analysis).
@@ -228,21 +844,56 @@ class AmadeusToolService:
     
     # ==================== ACTIVITIES / TOURS TOOLS ====================
     
+    @tool(
+        description='Search for tours and activities by coordinates.',
+        parameters={
+            'latitude': {'type': 'number', 'description': 'Latitude coordinate'},
+            'longitude': {'type': 'number', 'description': 'Longitude coordinate'},
+            'radius': {'type': 'number', 'description': 'Search radius in km (default: 1)'}
+        },
+        required=['latitude', 'longitude'],
+        cacheable=True,
+        timeout=20,
+        concurrency='search'
+    )
     def tours_and_activities(self, latitude: float, longitude: float, radius: int = 1) -> Dict[str, Any]:
         """
         Search for tours and activities by coordinates.
         
+        Answered from the spatial index when an earlier search covered the
+        circle; otherwise the circle is fetched and indexed first.
+        
         Args:
             latitude: Latitude
             longitude: Longitude
             radius: Search radius in km
         """
-        return self.base_service.search_activities(
-            latitude=latitude,
-            longitude=longitude,
-            radius=radius
+        circle = {'latitude': latitude, 'longitude': longitude, 'radius': radius or 1}
+        requests, errors, exceptions = self._fetch_areas(
+            'activity', self._uncovered('activity', [circle]), self.base_service.search_activities
         )
+        if errors:
+            if exceptions:
+                raise exceptions[0]
+            return {'success': False, 'error': errors[0]['error']}
+        
+        nearby = self.spatial_index.within_radius('activity', latitude, longitude, circle['radius'])
+        projection = project_activities([activity for _, activity in nearby], self.offer_store, limit=self.activity_results_limit)
+        return {'success': True, 'data': projection['activities'], 'meta': dict(projection['meta'], requests=requests)}
     
+    @tool(
+        description='Search for tours and activities inside a bounding box (any size up to a large city).',
+        parameters={
+            'north': {'type': 'number', 'description': 'North boundary'},
+            'west': {'type': 'number', 'description': 'West boundary'},
+            'south': {'type': 'number', 'description': 'South boundary'},
+            'east': {'type': 'number', 'description': 'East boundary'}
+        },
+        required=['north', 'west', 'south', 'east'],
+        cacheable=True,
+        timeout=30,
+        concurrency='search'
+    )
     def tours_and_activities_by_square(
         self,
         north: float,
@@ -253,34 +904,174 @@ class AmadeusToolService:
         """
         Search for tours and activities by bounding box.
         
+        The box is covered with lattice-aligned radius searches (see
+        geo_tiling.cover_box). Tiles not covered by earlier searches are
+        fetched concurrently into the spatial index, and the box is then
+        answered from the index.
+        
         Args:
             north: North boundary
             west: West boundary
             south: South boundary
             east: East boundary
         """
-        # The base service doesn't support bounding box search directly
-        # We'll use the center point and calculate radius
-        center_lat = (north + south) / 2
-        center_lon = (east + west) / 2
-        
-        # Approximate radius in km
-        import math
-        lat_diff = abs(north - south)
-        lon_diff = abs(east - west)
-        radius = int(math.sqrt(lat_diff**2 + lon_diff**2) * 111 / 2)  # rough conversion to km
-        
-        return self.base_service.search_activities(
-            latitude=center_lat,
-            longitude=center_lon,
-            radius=min(radius, 20)  # Max 20km
-        )
+        try:
+            tiles = cover_box(
+                north, west, south, east,
+                max_radius_km=self.activity_tile_max_radius,
+                max_tiles=self.activity_max_tiles
+            )
+        except TooManyTiles as e:
+            return {
+                'success': False,
+                'error': f'Bounding box too large: it needs at least {e.tiles} searches (max {e.max_tiles}). Use a smaller area.'
+            }
+        tiles = self._uncovered('activity', tiles)
+        
+        requests, errors, exceptions = self._fetch_areas('activity', tiles, self.base_service.search_activities)
+        activities = self.spatial_index.within_box('activity', north, west, south, east)
+        if not activities and errors:
+            if exceptions:
+                raise exceptions[0]
+            return {'success': False, 'error': errors[0]['error'], 'errors': errors}
+        
+        projection = project_activities(activities, self.offer_store, limit=self.activity_results_limit)
+        response = {
+            'success': True,
+            'data': projection['activities'],
+            'meta': dict(projection['meta'], requests=requests, failed_requests=len(errors))
+        }
+        if errors:
+            response['errors'] = errors
+        return response
     
+    @tool(
+        description='Get details of a specific activity.',
+        parameters={
+            'activityId': {
+                'type': 'string',
+                'description': 'Activity handle from tours_and_activities results (e.g., A3) or activity ID'
+            }
+        },
+        required=['activityId'],
+        cacheable=True,
+        timeout=10,
+        concurrency='reference'
+    )
     def get_activity_details(self, activityId: str) -> Dict[str, Any]:
         """
         Get details of a specific activity.
         
         Args:
-            activityId: Activity ID
+            activityId: Activity handle from a tours_and_activities search (e.g. A3) or Amadeus activity ID
         """
+        activity = self.offer_store.get(activityId)
+        if activity is not None:
+            return {'success': True, 'data': activity}
         return self.base_service.get_activity_details(activityId)
+    
+    @tool(
+        description=(
+            'Find points of interest (sights, restaurants, shopping, nightlife) near coordinates, nearest first. '
+            'Use this for "what is near X" questions.'
+        ),
+        parameters={
+            'latitude': {'type': 'number', 'description': 'Latitude coordinate'},
+            'longitude': {'type': 'number', 'description': 'Longitude coordinate'},
+            'radius': {'type': 'number', 'description': 'Search radius in km, 1-20 (default: 1)'},
+            'categories': {
+                'type': 'array',
+                'items': {'type': 'string', 'enum': ['SIGHTS', 'BEACH_PARK', 'HISTORICAL', 'NIGHTLIFE', 'RESTAURANT', 'SHOPPING']},
+                'description': 'Optional: Only these categories'
+            }
+        },
+        required=['latitude', 'longitude'],
+        cacheable=True,
+        timeout=20,
+        concurrency='search'
+    )
+    def points_of_interest(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: int = 1,
+        categories: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Search for points of interest around coordinates.
+        
+        Coverage is tracked per category filter; results are answered from
+        the spatial index, filtered to the requested categories.
+        
+        Args:
+            latitude: Latitude
+            longitude: Longitude
+            radius: Search radius in km
+            categories: POI categories to include (all when omitted)
+        """
+        categories = sorted({category.upper() for category in categories or []})
+        circle = {'latitude': latitude, 'longitude': longitude, 'radius': radius or 1}
+        
+        def search(**area: float) -> Dict[str, Any]:
+            return self.base_service.search_points_of_interest(categories=categories or None, **area)
+        
+        key = ','.join(categories) or None
+        requests, errors, exceptions = self._fetch_areas('poi', self._uncovered('poi', [circle], key), search, key)
+        if errors:
+            if exceptions:
+                raise exceptions[0]
+            return {'success': False, 'error': errors[0]['error']}
+        
+        nearby = [
+            (distance, poi) for distance, poi in self.spatial_index.within_radius('poi', latitude, longitude, circle['radius'])
+            if not categories or poi.get('category') in categories
+        ]
+        projection = project_points_of_interest(nearby, limit=self.poi_results_limit)
+        return {'success': True, 'data': projection['points_of_interest'], 'meta': dict(projection['meta'], requests=requests)}
+    
+    def _uncovered(self, kind: str, areas: List[Dict[str, float]], key: Optional[str] = None) -> List[Dict[str, float]]:
+        """Search circles (latitude, longitude, radius) not covered by earlier searches of this kind."""
+        return [
+            area for area in areas
+            if not self.spatial_index.is_covered(kind, area['latitude'], area['longitude'], area['radius'], key)
+        ]
+    
+    def _fetch_areas(
+        self,
+        kind: str,
+        areas: List[Dict[str, float]],
+        search: Callable[..., Dict[str, Any]],
+        key: Optional[str] = None
+    ) -> Tuple[int, List[Dict[str, Any]], List[BaseException]]:
+        """
+        Run `search(**area)` for each circle concurrently, indexing results and marking the circles covered.
+        
+        Returns:
+            Number of requests made, errors per circle and raised exceptions
+        """
+        errors, exceptions = [], []
+        for area, result, error in fan_out(lambda area: search(**area), areas, self.fanout_concurrency, self.fanout_timeout):
+            if error is not None:
+                exceptions.append(error)
+                errors.append(dict(area, error=str(error)))
+            elif not result.get('success'):
+                errors.append(dict(area, error=result.get('error')))
+            else:
+                self.spatial_index.add(kind, result.get('data') or [])
+                if not result.get('stale'):
+                    self.spatial_index.cover(kind, area['latitude'], area['longitude'], area['radius'], key)
+        return len(areas), errors, exceptions
+    
+    @staticmethod
+    def _with_staleness(response: Dict[str, Any], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Carry serve-stale markers of the upstream results (cached responses
+        returned while Amadeus' circuit is open) into a tool response, at the
+        top level and in `meta`, with the age of the oldest one.
+        """
+        ages = [result.get('stale_age_seconds', 0) for result in results if result.get('stale')]
+        if ages:
+            response['stale'] = True
+            response['stale_age_seconds'] = max(ages)
+            response['meta'] = dict(response.get('meta') or {}, stale=True, stale_age_seconds=max(ages))
+        return response
@@ -3,13 +3,22 @@ Chatbot Service with Tool-Calling Orchestration
 Manages conversation history, state, and tool execution
 """
 
+import os
 import json
+import time
+import asyncio
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Optional
-from services.openrouter_service import OpenRouterService
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
+from asgiref.sync import async_to_sync
+from services.openrouter_service import OpenRouterService, AsyncOpenRouterService, StreamAccumulator
 from services.amadeus_tool_service import AmadeusToolService
-from apps.chat.models import ChatSession
+from services.session_store import LocalSessionStore
+from services.offer_store import offer_scope
+from services.circuit_breaker import CircuitOpenError
+from services.prompt_builder import PromptBuilder
+from services.session_backends import SessionConflict, get_session_backend
 
 
 class ChatbotService:
@@ -17,55 +26,171 @@ class ChatbotService:
     Main chatbot service for travel planning with LLM tool-calling.
     """
     
+    FALLBACK_REPLY = "I apologize, but I'm having trouble completing this request. Please try rephrasing your question."
+    UNAVAILABLE_REPLY = "The travel assistant is temporarily unavailable. Please try again in a minute."
+    
+    SYSTEM_PROMPT = """Ești un asistent prietenos pentru planificarea călătoriilor, cu acces la date în timp real despre zboruri, hoteluri și activități prin API-ul Amadeus.
+
+Obiectivul tău este să ajuți utilizatorii să-și planifice călătoriile prin:
+1. Înțelegerea preferințelor lor de călătorie (origine, destinație, date, număr de călători)
+2. Căutarea de zboruri, hoteluri și activități folosind instrumentele disponibile
+3. Oferirea de recomandări complete de călătorie
+
+Când ai nevoie de informații precum zboruri sau hoteluri, folosește instrumentele corespunzătoare. Fii întotdeauna de ajutor și oferă informații detaliate și precise bazate pe rezultatele API-ului.
+
+Important: Extrage și ține minte detaliile călătoriei din conversație pentru a actualiza starea. Răspunde ÎNTOTDEAUNA în limba română."""
+    
+    STATE_PROMPT = """Starea conversației curente:
+- Aeroport de origine: {origin_airport}
+- Aeroport de destinație: {destination_airport}
+- Data plecării: {departure_date}
+- Data întoarcerii: {return_date}
+- Adulți: {adults}
+- Copii: {children}"""
+    
     def __init__(self):
         """Initialize chatbot service."""
         self.openrouter = OpenRouterService()
+        self.async_openrouter = AsyncOpenRouterService(api_key=self.openrouter.api_key)
         self.amadeus = AmadeusToolService()
+        self.max_iterations = 10
+        self.prompt_builder = PromptBuilder()
+        
+        # Built once: the schema, its JSON (for prompt sizing) and the static system message
+        self.tools = self.amadeus.registry.definitions()
+        self.tools_json = json.dumps(self.tools)
+        self.system_message = {'role': 'system', 'content': self.SYSTEM_PROMPT}
         
-        # In-memory sessions (ephemeral). For persistence consider Redis later.
-        self.sessions: Dict[str, Dict[str, Any]] = {}
+        # Tool calls of all conversations share one pool; each turn runs at
+        # most `tool_max_workers` of its calls at once so a single turn cannot
+        # take every thread. A call cancelled at its deadline keeps its thread
+        # until the tool's own HTTP timeout ends, so the pool is sized with
+        # headroom for those: TOOL_POOL_WORKERS bounds tool calls in flight
+        # across the process, TOOL_MAX_WORKERS per turn.
+        self.tool_max_workers = int(os.getenv('TOOL_MAX_WORKERS', '4'))
+        self.tool_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('TOOL_POOL_WORKERS', '32')),
+            thread_name_prefix='tool-call'
+        )
+        # Default per-call timeout, for tools that don't declare their own
+        self.tool_call_timeout = float(os.getenv('TOOL_CALL_TIMEOUT', '30'))
+        self.tool_turn_timeout = float(os.getenv('TOOL_TURN_TIMEOUT', '45'))
+        
+        # Shared session backend (DB or Redis) with optimistic versioning,
+        # fronted by a bounded in-memory cache of the latest saved versions.
+        self.session_backend = get_session_backend()
+        self.sessions = LocalSessionStore(
+            max_entries=int(os.getenv('CHAT_SESSION_CACHE_MAX_ENTRIES', '1000')),
+            max_bytes=int(float(os.getenv('CHAT_SESSION_CACHE_MAX_MB', '64')) * 1024 * 1024),
+            idle_ttl=float(os.getenv('CHAT_SESSION_IDLE_TTL', '1800')),
+            on_evict=self._on_session_evicted
+        )
     
     def get_or_create_session(self, session_id: Optional[str] = None) -> Dict[str, Any]:
-        """Return existing or new session dict, persisting state in DB."""
-        if session_id and session_id in self.sessions:
-            return self.sessions[session_id]
+        """
+        Return a working copy of an existing session, or a new one.
+        
+        Pass the copy's `version` back to `_persist_session` so a concurrent
+        turn on another worker is detected rather than overwritten.
+        """
+        session = self._load_session(session_id) if session_id else None
+        if session:
+            return session
         new_id = session_id or str(uuid.uuid4())
-        db_session = ChatSession.objects.filter(session_id=new_id).first()
-        if not db_session:
-            db_session = ChatSession.objects.create(
-                session_id=new_id,
-                workflow_state={
-                    'origin_airport': None,
-                    'destination_airport': None,
-                    'departure_date': None,
-                    'return_date': None,
-                    'adults': None,
-                    'children': None,
-                    'flight_selection': None,
-                    'hotel_selection': None,
-                    'activities_selection': [],
-                    'itinerary': None,
-                    'progress_stage': 'initial'
-                }
-            )
-        session = {
-            'id': new_id,
-            'history': [],  # messages remain ephemeral
-            'state': db_session.workflow_state or {}
+        session = self.session_backend.create(new_id, self._initial_state())
+        self.sessions.put(new_id, session)
+        return self._working_copy(session)
+    
+    async def aget_or_create_session(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Async variant of get_or_create_session."""
+        session = await self._aload_session(session_id) if session_id else None
+        if session:
+            return session
+        new_id = session_id or str(uuid.uuid4())
+        session = await self.session_backend.acreate(new_id, self._initial_state())
+        self.sessions.put(new_id, session)
+        return self._working_copy(session)
+    
+    def _load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a working copy of a session, reusing the local copy only if it
+        is still at the shared backend's current version.
+        """
+        cached = self.sessions.get(session_id)
+        if cached is not None and cached['version'] == self.session_backend.version(session_id):
+            return self._working_copy(cached)
+        session = self.session_backend.load(session_id)
+        return self._cache_loaded(session_id, session)
+    
+    async def _aload_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        cached = self.sessions.get(session_id)
+        if cached is not None and cached['version'] == await self.session_backend.aversion(session_id):
+            return self._working_copy(cached)
+        session = await self.session_backend.aload(session_id)
+        return self._cache_loaded(session_id, session)
+    
+    def _cache_loaded(self, session_id: str, session: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if session is None:
+            self.sessions.pop(session_id)
+            return None
+        self.sessions.put(session_id, session)
+        return self._working_copy(session)
+    
+    def _working_copy(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy a cached session so a turn's changes only become visible once saved."""
+        return dict(session, history=list(session['history']), state=dict(session['state']))
+    
+    def _initial_state(self) -> Dict[str, Any]:
+        return {
+            'origin_airport': None,
+            'destination_airport': None,
+            'departure_date': None,
+            'return_date': None,
+            'adults': None,
+            'children': None,
+            'flight_selection': None,
+            'hotel_selection': None,
+            'activities_selection': [],
+            'itinerary': None,
+            'progress_stage': 'initial'
         }
-        self.sessions[new_id] = session
-        return session
+    
+    def _on_session_evicted(self, session: Dict[str, Any]):
+        """Flush an evicted session's unsaved history to the backend (cached copies are normally clean)."""
+        if session['persisted'] >= len(session['history']):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._flush_evicted(session)
+        else:
+            # The sync ORM may not run on the event loop thread
+            loop.run_in_executor(None, self._flush_evicted, session)
+    
+    def _flush_evicted(self, session: Dict[str, Any]):
+        try:
+            self.session_backend.save(session, session['version'])
+        except SessionConflict:
+            pass  # a newer version was saved elsewhere; this copy is stale
     
     def reset_session(self, session_id: str):
         """Remove in-memory session and clear persistent workflow state."""
-        ChatSession.objects.filter(session_id=session_id).delete()
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        self.session_backend.delete(session_id)
+        self.sessions.pop(session_id)
+        self.amadeus.offer_store.discard(session_id)
     
     def process_message(self, message: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Sync wrapper around aprocess_message for callers without an event loop."""
+        return async_to_sync(self.aprocess_message)(message, session_id)
+    
+    async def aprocess_message(self, message: str, session_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Process a chat message with tool-calling orchestration.
         
+        LLM calls go through the async OpenRouter client, tool calls run on the
+        tool pool without blocking the event loop, and session state is read
+        and written with the async ORM.
+        
         Args:
             message: User message
             session_id: Optional session identifier
@@ -73,186 +198,400 @@ class ChatbotService:
         Returns:
             Response with reply, state, and history
         """
-        session = self.get_or_create_session(session_id)
-        
-        # Add user message with timestamp
-        session['history'].append({'role': 'user', 'content': message, 'created_at': self._now()})
+        session = await self.aget_or_create_session(session_id)
+        self.sessions.pin(session['id'])
+        try:
+            async for event, data in self._turn(session, message, stream=False):
+                if event == 'final':
+                    return data
+        finally:
+            self.sessions.unpin(session['id'])
+    
+    async def astream_message(self, message: str, session_id: Optional[str] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming variant of aprocess_message for server-sent events.
         
-        # Prepare messages for OpenRouter
-        messages = self._prepare_messages(session)
+        Yields (event, data) pairs:
+            session             {'session_id'} once, first
+            token               {'content'} for each assistant text delta
+            tool_call_started   {'tool_call_id', 'name'} before a tool runs
+            tool_call_finished  {'tool_call_id', 'name', 'status', 'duration_ms'} as each tool completes
+            final               the same payload aprocess_message returns
         
-        # Get tools definition
-        tools = self._get_tools_definition()
+        Args:
+            message: User message
+            session_id: Optional session identifier
+        """
+        session = await self.aget_or_create_session(session_id)
+        self.sessions.pin(session['id'])
+        try:
+            async for event in self._turn(session, message, stream=True):
+                yield event
+        finally:
+            self.sessions.unpin(session['id'])
+    
+    async def _turn(self, session: Dict[str, Any], message: str, stream: bool) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Run the tool-calling loop for one user message, yielding the events
+        astream_message documents; `token` events are only produced when
+        `stream` is set.
+        """
+        session['history'].append({'role': 'user', 'content': message, 'created_at': self._now()})
+        yield 'session', {'session_id': session['id']}
         
-        # Tool execution loop
-        max_iterations = 10
-        iteration = 0
+        tools = self.tools
+        tool_timings: List[Dict[str, Any]] = []
+        prompt_stats: List[Dict[str, Any]] = []
         
-        while iteration < max_iterations:
-            iteration += 1
-            
-            # Call OpenRouter
-            response = self.openrouter.chat_completion(messages, tools, 'auto')
-            assistant_message = self.openrouter.extract_message(response)
+        for _ in range(self.max_iterations):
+            messages, stats = self._prepare_messages(session, tools)
+            try:
+                if stream:
+                    accumulator = StreamAccumulator()
+                    async for chunk in self.async_openrouter.stream_chat_completion(messages, tools, 'auto'):
+                        content = accumulator.add(chunk)
+                        if content:
+                            yield 'token', {'content': content}
+                    usage, assistant_message = accumulator.usage, accumulator.message()
+                else:
+                    response = await self.async_openrouter.chat_completion(messages, tools, 'auto')
+                    usage, assistant_message = response.get('usage'), self.async_openrouter.extract_message(response)
+            except CircuitOpenError:
+                # OpenRouter is failing: answer now instead of waiting out its timeouts
+                self._record_reply(session, self.UNAVAILABLE_REPLY)
+                await self._apersist_session(session)
+                yield 'final', self._response_payload(session, self.UNAVAILABLE_REPLY, tool_timings=tool_timings, prompt_stats=prompt_stats)
+                return
+            except Exception:
+                # Streamed tokens may already be on screen: keep the turn before the caller reports the error
+                await self._asave_interrupted(session, ''.join(accumulator.content_parts) if stream else '')
+                raise
+            prompt_stats.append(self._with_usage(stats, usage))
             
-            # Check if there are tool calls
-            if self.openrouter.has_tool_calls(assistant_message):
-                # Add assistant message with tool calls to history
-                session['history'].append({
-                    'role': 'assistant',
-                    'content': assistant_message.get('content') or '',
-                    'tool_calls': assistant_message['tool_calls']
-                })
-                
-                # Execute tool calls
-                tool_results = self._execute_tool_calls(assistant_message['tool_calls'])
-                
-                # Add tool results to history
-                for result in tool_results:
-                    session['history'].append({
-                        'role': 'tool',
+            if self.async_openrouter.has_tool_calls(assistant_message):
+                tool_calls = assistant_message['tool_calls']
+                for tool_call in tool_calls:
+                    yield 'tool_call_started', {'tool_call_id': tool_call['id'], 'name': tool_call['function']['name']}
+                tool_results: List[Optional[Dict[str, Any]]] = [None] * len(tool_calls)
+                async for index, result in self._aiter_tool_results(tool_calls, session['id']):
+                    tool_results[index] = result
+                    yield 'tool_call_finished', {
                         'tool_call_id': result['tool_call_id'],
                         'name': result['name'],
-                        'content': json.dumps(result['content'])
-                    })
-                
-                # Update messages for next iteration
-                messages = self._prepare_messages(session)
+                        'status': result['status'],
+                        'duration_ms': result['duration_ms']
+                    }
+                self._record_tool_round(session, assistant_message, tool_results, tool_timings)
             else:
                 # No tool calls, this is the final answer
-                session['history'].append({
-                    'role': 'assistant',
-                    'content': assistant_message['content'],
-                    'created_at': self._now()
-                })
-                return self._build_response(session)
+                self._record_reply(session, assistant_message['content'])
+                await self._apersist_session(session)
+                yield 'final', self._response_payload(session, tool_timings=tool_timings, prompt_stats=prompt_stats)
+                return
         
         # Max iterations reached
-        final_message = "I apologize, but I'm having trouble completing this request. Please try rephrasing your question."
+        self._record_reply(session, self.FALLBACK_REPLY)
+        await self._apersist_session(session)
+        yield 'final', self._response_payload(session, self.FALLBACK_REPLY, tool_timings=tool_timings, prompt_stats=prompt_stats)
+    
+    def _record_tool_round(
+        self,
+        session: Dict[str, Any],
+        assistant_message: Dict[str, Any],
+        tool_results: List[Dict[str, Any]],
+        tool_timings: List[Dict[str, Any]]
+    ):
+        """Append an assistant tool-call message and its tool results to history."""
         session['history'].append({
             'role': 'assistant',
-            'content': final_message,
+            'content': assistant_message.get('content') or '',
+            'tool_calls': assistant_message['tool_calls']
+        })
+        
+        for result in tool_results:
+            tool_timings.append({
+                'tool_call_id': result['tool_call_id'],
+                'name': result['name'],
+                'duration_ms': result['duration_ms'],
+                'status': result['status']
+            })
+            session['history'].append({
+                'role': 'tool',
+                'tool_call_id': result['tool_call_id'],
+                'name': result['name'],
+                'content': json.dumps(result['content'])
+            })
+    
+    def _record_reply(self, session: Dict[str, Any], content: str):
+        """Append the final assistant reply of a turn to history."""
+        session['history'].append({
+            'role': 'assistant',
+            'content': content,
             'created_at': self._now()
         })
-        return self._build_response(session, final_message)
 
-    def _build_response(self, session: Dict[str, Any], reply_override: Optional[str] = None) -> Dict[str, Any]:
+    async def _asave_interrupted(self, session: Dict[str, Any], partial: str):
+        """
+        Save the turn so far after the LLM call failed: the user message, any
+        tool rounds and, if some text was streamed, the partial reply marked
+        `interrupted`.
+        """
+        if partial:
+            session['history'].append({
+                'role': 'assistant',
+                'content': partial,
+                'created_at': self._now(),
+                'interrupted': True
+            })
+        try:
+            await self._apersist_session(session)
+        except SessionConflict:
+            pass  # another turn was saved first; the caller still reports the original error
+
+    def _response_payload(
+        self,
+        session: Dict[str, Any],
+        reply_override: Optional[str] = None,
+        tool_timings: Optional[List[Dict[str, Any]]] = None,
+        prompt_stats: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
         history = session['history']
-        self._persist_state(session)
         return {
             'reply': reply_override or (history[-1]['content'] if history else ''),
             'state': session['state'],
             'history': history,
-            'session_id': session['id']
+            'session_id': session['id'],
+            'metadata': {'tool_timings': tool_timings or [], 'prompt_stats': prompt_stats or []}
         }
 
+    def _with_usage(self, stats: Dict[str, Any], usage: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Add the provider-reported prompt/completion token counts to a prompt stats entry."""
+        usage = usage or {}
+        return dict(stats, prompt_tokens=usage.get('prompt_tokens'), completion_tokens=usage.get('completion_tokens'))
+
     def _now(self) -> str:
         return datetime.now(timezone.utc).isoformat()
 
     def get_session_data(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Public accessor to build a response for an existing session id."""
-        session = self.sessions.get(session_id)
+        session = self._load_session(session_id)
         if not session:
-            db_session = ChatSession.objects.filter(session_id=session_id).first()
-            if not db_session:
-                return None
-            self.sessions[session_id] = {
-                'id': session_id,
-                'history': [],
-                'state': db_session.workflow_state or {}
-            }
-            session = self.sessions[session_id]
-        return self._build_response(session)
-
-    def _persist_state(self, session: Dict[str, Any]):
-        ChatSession.objects.filter(session_id=session['id']).update(workflow_state=session['state'])
+            return None
+        return self._response_payload(session)
 
-    def update_state(self, session_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        session = self.sessions.get(session_id)
+    async def aget_session_data(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Async variant of get_session_data."""
+        session = await self._aload_session(session_id)
         if not session:
             return None
-        session['state'].update(updates)
-        self._persist_state(session)
-        return session['state']
+        return self._response_payload(session)
+
+    def _persist_session(self, session: Dict[str, Any]):
+        """
+        Save state and new history if nobody else saved the session since it was loaded.
+        
+        Raises:
+            SessionConflict: if another turn on this session was saved first
+        """
+        try:
+            self.session_backend.save(session, session['version'])
+        except SessionConflict:
+            self.sessions.pop(session['id'])
+            raise
+        self.sessions.put(session['id'], session)
+
+    async def _apersist_session(self, session: Dict[str, Any]):
+        try:
+            await self.session_backend.asave(session, session['version'])
+        except SessionConflict:
+            self.sessions.pop(session['id'])
+            raise
+        self.sessions.put(session['id'], session)
+
+    def update_state(self, session_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Apply a partial state update, reloading and retrying if a concurrent save wins."""
+        for attempt in range(3):
+            session = self._load_session(session_id)
+            if not session:
+                return None
+            session['state'].update(updates)
+            try:
+                self._persist_session(session)
+            except SessionConflict:
+                if attempt == 2:
+                    raise
+                continue
+            return session['state']
     
-    def _prepare_messages(self, session: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _prepare_messages(
+        self,
+        session: Dict[str, Any],
+        tools: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """
-        Prepare messages for OpenRouter with system message.
+        Prepare messages for OpenRouter with system message, compacting
+        history to fit the prompt-token budget.
         
         Args:
             session: Session object
+            tools: Tool definitions sent with the call
             
         Returns:
-            List of messages
+            Tuple of (messages, prompt size stats)
         """
         state = session['state']
-        system_message = {
+        state_message = {
             'role': 'system',
-            'content': f"""Ești un asistent prietenos pentru planificarea călătoriilor, cu acces la date în timp real despre zboruri, hoteluri și activități prin API-ul Amadeus.
-
-Obiectivul tău este să ajuți utilizatorii să-și planifice călătoriile prin:
-1. Înțelegerea preferințelor lor de călătorie (origine, destinație, date, număr de călători)
-2. Căutarea de zboruri, hoteluri și activități folosind instrumentele disponibile
-3. Oferirea de recomandări complete de călătorie
-
-Starea conversației curente:
-- Aeroport de origine: {state.get('origin_airport') or 'nesetat'}
-- Aeroport de destinație: {state.get('destination_airport') or 'nesetat'}
-- Data plecării: {state.get('departure_date') or 'nesetat'}
-- Data întoarcerii: {state.get('return_date') or 'nesetat'}
-- Adulți: {state.get('adults') or 'nesetat'}
-- Copii: {state.get('children') or 'nesetat'}
-
-Când ai nevoie de informații precum zboruri sau hoteluri, folosește instrumentele corespunzătoare. Fii întotdeauna de ajutor și oferă informații detaliate și precise bazate pe rezultatele API-ului.
-
-Important: Extrage și ține minte detaliile călătoriei din conversație pentru a actualiza starea. Răspunde ÎNTOTDEAUNA în limba română."""
+            'content': self.STATE_PROMPT.format(**{
+                key: state.get(key) or 'nesetat'
+                for key in ('origin_airport', 'destination_airport', 'departure_date', 'return_date', 'adults', 'children')
+            })
         }
         
-        return [system_message] + session['history']
+        # The static prompt leads so tools + system prompt form a cacheable
+        # prefix; the state block only changes when the trip details do
+        return self.prompt_builder.build(
+            [self.system_message, state_message],
+            session['history'],
+            tools_json=self.tools_json if tools else None
+        )
     
-    def _execute_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    async def _aiter_tool_results(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
         """
-        Execute tool calls from the LLM.
+        Run tool calls concurrently on the tool pool and yield results as they finish.
+        
+        At most `tool_max_workers` calls of the batch run at once. Each call
+        gets at most its tool's timeout (`tool_call_timeout` unless the tool
+        declares one) and the whole batch at most `tool_turn_timeout` seconds;
+        calls still running or waiting at their deadline are cancelled and
+        yielded as timeouts. Identical calls to an idempotent tool run once;
+        the result is yielded for each of them.
         
         Args:
             tool_calls: List of tool call objects
+            session_id: Session whose offer registry the tools use
             
-        Returns:
-            List of tool results
+        Yields:
+            Tuples of (index in `tool_calls`, tool result)
         """
-        results = []
+        loop = asyncio.get_running_loop()
+        submitted_at = time.monotonic()
+        turn_deadline = submitted_at + self.tool_turn_timeout
+        deadlines = [min(submitted_at + self._tool_timeout(tool_call), turn_deadline) for tool_call in tool_calls]
+        copies = self._duplicate_calls(tool_calls)
+        duplicates = {index for indexes in copies.values() for index in indexes}
+        slots = asyncio.Semaphore(self.tool_max_workers)
         
-        for tool_call in tool_calls:
-            tool_id = tool_call['id']
-            function_name = tool_call['function']['name']
-            
-            # Parse arguments
+        async def run(tool_call: Dict[str, Any]) -> Dict[str, Any]:
+            async with slots:
+                return await loop.run_in_executor(self.tool_executor, self._run_tool_call, tool_call, session_id)
+        
+        pending = {
+            asyncio.ensure_future(run(tool_call)): index
+            for index, tool_call in enumerate(tool_calls)
+            if index not in duplicates
+        }
+        while pending:
+            now = time.monotonic()
+            finished = []
+            for future, index in [(f, i) for f, i in pending.items() if deadlines[i] <= now]:
+                del pending[future]
+                future.cancel()
+                finished.append((index, self._timeout_result(tool_calls[index], submitted_at)))
+            if pending and not finished:
+                remaining = min(deadlines[index] for index in pending.values()) - now
+                done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                finished.extend((pending.pop(future), future.result()) for future in done)
+            for index, result in finished:
+                yield index, result
+                for copy in copies.get(index, ()):
+                    yield copy, dict(result, tool_call_id=tool_calls[copy]['id'])
+    
+    def _duplicate_calls(self, tool_calls: List[Dict[str, Any]]) -> Dict[int, List[int]]:
+        """
+        Group repeated calls to idempotent tools (same name and arguments).
+        
+        Returns:
+            Index of the first call of each group -> indexes of its repeats
+        """
+        first: Dict[Tuple[str, str], int] = {}
+        copies: Dict[int, List[int]] = {}
+        for index, tool_call in enumerate(tool_calls):
+            name = tool_call['function']['name']
+            spec = self.amadeus.registry.get(name)
+            if spec is None or not spec.idempotent:
+                continue
             try:
-                arguments = json.loads(tool_call['function']['arguments'])
-            except json.JSONDecodeError:
-                results.append({
-                    'tool_call_id': tool_id,
-                    'name': function_name,
-                    'content': {'error': 'Invalid arguments format'}
-                })
+                key = (name, json.dumps(json.loads(tool_call['function']['arguments']), sort_keys=True))
+            except (json.JSONDecodeError, TypeError):
                 continue
+            if key in first:
+                copies.setdefault(first[key], []).append(index)
+            else:
+                first[key] = index
+        return copies
+    
+    def _tool_timeout(self, tool_call: Dict[str, Any]) -> float:
+        """Timeout declared by the called tool, or `tool_call_timeout`."""
+        spec = self.amadeus.registry.get(tool_call['function']['name'])
+        return spec.timeout if spec is not None and spec.timeout else self.tool_call_timeout
+    
+    def _timeout_result(self, tool_call: Dict[str, Any], submitted_at: float) -> Dict[str, Any]:
+        """Tool result reported to the model for a call that missed its deadline."""
+        return {
+            'tool_call_id': tool_call['id'],
+            'name': tool_call['function']['name'],
+            'content': {'error': 'Tool call timed out'},
+            'status': 'timeout',
+            'duration_ms': round((time.monotonic() - submitted_at) * 1000, 1)
+        }
+    
+    def _run_tool_call(self, tool_call: Dict[str, Any], session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Parse arguments for and execute a single tool call, timing it.
+        
+        Offers returned or referenced by the tool are registered in and
+        resolved from `session_id`'s offer registry.
+        
+        Args:
+            tool_call: Tool call object
+            session_id: Session the call belongs to
             
+        Returns:
+            Tool result with content, status and duration_ms
+        """
+        started = time.monotonic()
+        tool_id = tool_call['id']
+        function_name = tool_call['function']['name']
+        
+        # Parse arguments
+        try:
+            arguments = json.loads(tool_call['function']['arguments'])
+        except json.JSONDecodeError:
+            content, status = {'error': 'Invalid arguments format'}, 'error'
+        else:
             # Execute the tool
             try:
-                result = self._call_amadeus_tool(function_name, arguments)
-                results.append({
-                    'tool_call_id': tool_id,
-                    'name': function_name,
-                    'content': result
-                })
+                with offer_scope(session_id):
+                    content, status = self._call_amadeus_tool(function_name, arguments), 'ok'
+            except CircuitOpenError as e:
+                # Fast-fail result the model can relay instead of retrying
+                content = {'success': False, 'error': str(e), 'retry_after_seconds': round(e.retry_in)}
+                status = 'unavailable'
             except Exception as e:
-                results.append({
-                    'tool_call_id': tool_id,
-                    'name': function_name,
-                    'content': {'error': str(e)}
-                })
+                content, status = {'error': str(e)}, 'error'
         
-        return results
+        return {
+            'tool_call_id': tool_id,
+            'name': function_name,
+            'content': content,
+            'status': status,
+            'duration_ms': round((time.monotonic() - started) * 1000, 1)
+        }
     
     def _call_amadeus_tool(self, function_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -265,373 +604,4 @@ Important: Extrage și ține minte detaliile călătoriei din conversație pentr
         Returns:
             Function result
         """
-        # Map function names to Amadeus service methods
-        if function_name == 'airport_city_search':
-            return self.amadeus.airport_city_search(**arguments)
-        elif function_name == 'flight_offers_search':
-            return self.amadeus.flight_offers_search(**arguments)
-        elif function_name == 'flight_inspiration_search':
-            return self.amadeus.flight_inspiration_search(**arguments)
-        elif function_name == 'flight_cheapest_date_search':
-            return self.amadeus.flight_cheapest_date_search(**arguments)
-        elif function_name == 'flight_offers_price':
-            return self.amadeus.flight_offers_price(**arguments)
-        elif function_name == 'airport_direct_destinations':
-            return self.amadeus.airport_direct_destinations(**arguments)
-        elif function_name == 'airline_destinations':
-            return self.amadeus.airline_destinations(**arguments)
-        elif function_name == 'hotel_list':
-            return self.amadeus.hotel_list(**arguments)
-        elif function_name == 'hotel_search':
-            return self.amadeus.hotel_search(**arguments)
-        elif function_name == 'hotel_offers_by_hotel':
-            return self.amadeus.hotel_offers_by_hotel(**arguments)
-        elif function_name == 'hotel_ratings':
-            return self.amadeus.hotel_ratings(**arguments)
-        elif function_name == 'tours_and_activities':
-            return self.amadeus.tours_and_activities(**arguments)
-        elif function_name == 'tours_and_activities_by_square':
-            return self.amadeus.tours_and_activities_by_square(**arguments)
-        elif function_name == 'get_activity_details':
-            return self.amadeus.get_activity_details(**arguments)
-        elif function_name == 'trip_purpose_prediction':
-            return self.amadeus.trip_purpose_prediction(**arguments)
-        else:
-            raise ValueError(f"Unknown function: {function_name}")
-    
-    def _get_tools_definition(self) -> List[Dict[str, Any]]:
-        """
-        Get tools definition for OpenRouter in OpenAI function-calling format.
-        
-        Returns:
-            List of tool definitions
-        """
-        return [
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'airport_city_search',
-                    'description': 'Search for airports and cities by keyword. Use this to find airport codes.',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'keyword': {
-                                'type': 'string',
-                                'description': 'Search keyword (city name, airport name, etc.)'
-                            },
-                            'subType': {
-                                'type': 'string',
-                                'description': 'Optional: Filter by type (AIRPORT, CITY)',
-                                'enum': ['AIRPORT', 'CITY']
-                            }
-                        },
-                        'required': ['keyword']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'flight_offers_search',
-                    'description': 'Search for flight offers between two locations.',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'originLocationCode': {
-                                'type': 'string',
-                                'description': 'Origin airport IATA code (e.g., JFK)'
-                            },
-                            'destinationLocationCode': {
-                                'type': 'string',
-                                'description': 'Destination airport IATA code (e.g., LAX)'
-                            },
-                            'departureDate': {
-                                'type': 'string',
-                                'description': 'Departure date in YYYY-MM-DD format'
-                            },
-                            'adults': {
-                                'type': 'integer',
-                                'description': 'Number of adult travelers'
-                            },
-                            'returnDate': {
-                                'type': 'string',
-                                'description': 'Optional: Return date in YYYY-MM-DD format'
-                            },
-                            'children': {
-                                'type': 'integer',
-                                'description': 'Optional: Number of children'
-                            },
-                            'travelClass': {
-                                'type': 'string',
-                                'description': 'Optional: Travel class',
-                                'enum': ['ECONOMY', 'PREMIUM_ECONOMY', 'BUSINESS', 'FIRST']
-                            }
-                        },
-                        'required': ['originLocationCode', 'destinationLocationCode', 'departureDate', 'adults']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'flight_inspiration_search',
-                    'description': 'Get inspirational flight destinations from an origin.',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'origin': {
-                                'type': 'string',
-                                'description': 'Origin airport IATA code'
-                            }
-                        },
-                        'required': ['origin']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'flight_cheapest_date_search',
-                    'description': 'Find the cheapest dates to fly between two locations.',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'origin': {
-                                'type': 'string',
-                                'description': 'Origin airport IATA code'
-                            },
-                            'destination': {
-                                'type': 'string',
-                                'description': 'Destination airport IATA code'
-                            }
-                        },
-                        'required': ['origin', 'destination']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'flight_offers_price',
-                    'description': 'Get confirmed pricing for a specific flight offer.',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'flight_offer': {
-                                'type': 'object',
-                                'description': 'Flight offer object from flight_offers_search'
-                            },
-                            'include': {
-                                'type': 'string',
-                                'description': 'Optional fields to include in response'
-                            }
-                        },
-                        'required': ['flight_offer']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'airport_direct_destinations',
-                    'description': 'Get all direct destinations from a departure airport.',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'departureAirportCode': {
-                                'type': 'string',
-                                'description': 'Departure airport IATA code'
-                            }
-                        },
-                        'required': ['departureAirportCode']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'airline_destinations',
-                    'description': 'Get all destinations served by an airline.',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'airlineCode': {
-                                'type': 'string',
-                                'description': 'Airline IATA code (e.g., AA)'
-                            }
-                        },
-                        'required': ['airlineCode']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'hotel_list',
-                    'description': 'Get list of hotels in a city.',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'cityCode': {
-                                'type': 'string',
-                                'description': 'IATA city code (e.g., PAR for Paris)'
-                            }
-                        },
-                        'required': ['cityCode']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'hotel_search',
-                    'description': 'Search for hotel offers.',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'hotelIds': {
-                                'type': 'array',
-                                'items': {'type': 'string'},
-                                'description': 'Array of hotel IDs'
-                            },
-                            'checkInDate': {
-                                'type': 'string',
-                                'description': 'Check-in date in YYYY-MM-DD format'
-                            },
-                            'checkOutDate': {
-                                'type': 'string',
-                                'description': 'Check-out date in YYYY-MM-DD format'
-                            },
-                            'adults': {
-                                'type': 'integer',
-                                'description': 'Number of adults'
-                            }
-                        },
-                        'required': ['hotelIds', 'checkInDate', 'checkOutDate', 'adults']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'hotel_offers_by_hotel',
-                    'description': 'Get offers for a specific hotel.',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'hotelId': {
-                                'type': 'string',
-                                'description': 'Hotel ID'
-                            }
-                        },
-                        'required': ['hotelId']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'hotel_ratings',
-                    'description': 'Get hotel ratings and sentiment analysis.',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'hotelIds': {
-                                'type': 'array',
-                                'items': {'type': 'string'},
-                                'description': 'Array of hotel IDs (max 3)'
-                            }
-                        },
-                        'required': ['hotelIds']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'tours_and_activities',
-                    'description': 'Search for tours and activities by coordinates.',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'latitude': {
-                                'type': 'number',
-                                'description': 'Latitude coordinate'
-                            },
-                            'longitude': {
-                                'type': 'number',
-                                'description': 'Longitude coordinate'
-                            },
-                            'radius': {
-                                'type': 'number',
-                                'description': 'Search radius in km (default: 1)'
-                            }
-                        },
-                        'required': ['latitude', 'longitude']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'tours_and_activities_by_square',
-                    'description': 'Search for tours and activities by bounding box.',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'north': {'type': 'number', 'description': 'North boundary'},
-                            'west': {'type': 'number', 'description': 'West boundary'},
-                            'south': {'type': 'number', 'description': 'South boundary'},
-                            'east': {'type': 'number', 'description': 'East boundary'}
-                        },
-                        'required': ['north', 'west', 'south', 'east']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'get_activity_details',
-                    'description': 'Get details of a specific activity.',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'activityId': {
-                                'type': 'string',
-                                'description': 'Activity ID'
-                            }
-                        },
-                        'required': ['activityId']
-                    }
-                }
-            },
-            {
-                'type': 'function',
-                'function': {
-                    'name': 'trip_purpose_prediction',
-                    'description': 'Predict the purpose of a trip (business or leisure).',
-                    'parameters': {
-                        'type': 'object',
-                        'properties': {
-                            'originLocationCode': {
-                                'type': 'string',
-                                'description': 'Origin airport IATA code'
-                            },
-                            'destinationLocationCode': {
-                                'type': 'string',
-                                'description': 'Destination airport IATA code'
-                            },
-                            'departureDate': {
-                                'type': 'string',
-                                'description': 'Departure date in YYYY-MM-DD format'
-                            },
-                            'returnDate': {
-                                'type': 'string',
-                                'description': 'Return date in YYYY-MM-DD format'
-                            }
-                        },
-                        'required': ['originLocationCode', 'destinationLocationCode', 'departureDate', 'returnDate']
-                    }
-                }
-            }
-        ]
+        return self.amadeus.registry.dispatch(function_name, arguments)
@@ -0,0 +1,182 @@
+"""
+Circuit Breakers for upstream APIs (OpenRouter, Amadeus)
+Fail fast while an upstream is degraded instead of waiting out its timeouts
+
+A breaker opens when the failure rate over a sliding window crosses a
+threshold, rejects calls while open, then lets a few probe calls through
+(half-open) and closes again once they succeed.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} is temporarily unavailable (circuit open, retry in {retry_in:.0f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker over a sliding time window of call outcomes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        window: float = 60.0,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1
+    ):
+        """
+        Initialize a closed breaker.
+
+        Args:
+            name: Upstream name, used in errors and stats
+            failure_rate: Failure ratio within the window that opens the circuit
+            min_calls: Calls needed in the window before the ratio is evaluated
+            window: Sliding window length in seconds
+            open_seconds: Time the circuit stays open before probing
+            half_open_calls: Concurrent probe calls allowed while half-open
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._times_opened = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._advance(time.monotonic())
+            return self._state
+
+    def _advance(self, now: float):
+        """Move an open circuit to half-open once it cooled down. Caller holds the lock."""
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+
+    def allow(self):
+        """
+        Admit a call or fail fast. Every admitted call must be followed by
+        record_success, record_failure or release.
+
+        Raises:
+            CircuitOpenError: while the circuit is open, or half-open with all probe slots taken
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return
+            self._rejected += 1
+            retry_in = max(self.open_seconds - (now - self._opened_at), 0.0)
+        raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._outcomes.clear()
+            self._record(time.monotonic(), True)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._open(now)
+                return
+            self._record(now, False)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if (self._state == CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._open(now)
+
+    def release(self):
+        """End an admitted call without a verdict (e.g. cancelled or failed locally)."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def _record(self, now: float, ok: bool):
+        self._outcomes.append((now, ok))
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self._times_opened += 1
+        self._outcomes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the state, window counts and how often the circuit opened or rejected calls."""
+        with self._lock:
+            self._advance(time.monotonic())
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                'state': self._state,
+                'calls': len(self._outcomes),
+                'failures': failures,
+                'times_opened': self._times_opened,
+                'rejected': self._rejected
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """
+    Return the process-wide breaker for an upstream, configured from the
+    environment (<NAME> is the upper-cased upstream name, e.g. AMADEUS):
+        CIRCUIT_<NAME>_FAILURE_RATE (default 0.5)
+        CIRCUIT_<NAME>_MIN_CALLS (default 5)
+        CIRCUIT_<NAME>_WINDOW seconds (default 60)
+        CIRCUIT_<NAME>_OPEN_SECONDS (default 30)
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            prefix = f'CIRCUIT_{name.upper()}_'
+            breaker = _breakers[name] = CircuitBreaker(
+                name,
+                failure_rate=float(os.getenv(prefix + 'FAILURE_RATE', '0.5')),
+                min_calls=int(os.getenv(prefix + 'MIN_CALLS', '5')),
+                window=float(os.getenv(prefix + 'WINDOW', '60')),
+                open_seconds=float(os.getenv(prefix + 'OPEN_SECONDS', '30'))
+            )
+        return breaker
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.stats() for name, breaker in breakers.items()}
@@ -0,0 +1,104 @@
+"""
+Fan-out helper for concurrent upstream calls
+Runs one function over many inputs on a shared, bounded thread pool
+
+Used by tools that split one request into several Amadeus calls (hotel ID
+chunks, search tiles, date cells). Each task runs in a copy of the caller's
+context, so context variables such as the session's offer scope carry over
+into the worker threads. Results come back in input order, with failures
+reported per input instead of failing the whole batch.
+"""
+
+import os
+import time
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class FanOutTimeout(Exception):
+    """Reported for inputs whose call did not finish before the fan-out deadline."""
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_fanout_executor() -> ThreadPoolExecutor:
+    """
+    Return the process-wide fan-out pool (FANOUT_MAX_WORKERS threads,
+    default 16). It is separate from the tool-call pool, so a tool can fan
+    out without waiting on its own pool; fanned-out calls must not fan out
+    again.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('FANOUT_MAX_WORKERS', '16')),
+                thread_name_prefix='fan-out'
+            )
+        return _executor
+
+
+def fan_out(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_concurrency: int = 4,
+    timeout: Optional[float] = None
+) -> List[Tuple[Any, Any, Optional[BaseException]]]:
+    """
+    Call `fn(item)` for every item concurrently, at most `max_concurrency` at a time.
+
+    Args:
+        fn: Function of one item
+        items: Inputs
+        max_concurrency: Maximum number of calls in flight for this fan-out
+        timeout: Seconds until calls still pending are abandoned and reported as FanOutTimeout
+
+    Returns:
+        `(item, result, error)` per item, in input order; `error` is None on success
+    """
+    items = list(items)
+    outcomes: List[Tuple[Any, Any, Optional[BaseException]]] = [(item, None, None) for item in items]
+    if not items:
+        return outcomes
+    if len(items) == 1:
+        try:
+            return [(items[0], fn(items[0]), None)]
+        except Exception as e:
+            return [(items[0], None, e)]
+
+    executor = get_fanout_executor()
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    pending = iter(enumerate(items))
+    running: Dict[Future, int] = {}
+
+    def submit_next() -> bool:
+        for index, item in pending:
+            context = contextvars.copy_context()
+            running[executor.submit(context.run, fn, item)] = index
+            return True
+        return False
+
+    while len(running) < max(max_concurrency, 1) and submit_next():
+        pass
+    while running:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            break
+        done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = running.pop(future)
+            error = future.exception()
+            outcomes[index] = (items[index], None if error else future.result(), error)
+            submit_next()
+
+    # Deadline reached: abandon calls still running and never start the rest
+    for future, index in running.items():
+        future.cancel()
+        outcomes[index] = (items[index], None, FanOutTimeout(f"Timed out after {timeout}s"))
+    for index, item in pending:
+        outcomes[index] = (item, None, FanOutTimeout(f"Timed out after {timeout}s"))
+    return outcomes
@@ -0,0 +1,352 @@
+"""
+Airport/City Gazetteer for location lookups
+Answers airport and city searches locally, before asking Amadeus
+
+Airports are loaded from a bundled CSV (services/data/airports.csv, or
+GAZETTEER_PATH) into parallel arrays; cities are derived from their
+airports' city codes. Names are folded (lower case, no diacritics), so
+"Bucuresti", "bucurești" and "BUCUREȘTI" all match "București". Only exact
+codes and names are answers (the table is far from complete, so "SAL"
+must not resolve to whatever starts with it); a sorted prefix index (a
+flattened trie) and a trigram index offer suggestions, which callers must
+not treat as matches.
+Locations Amadeus returns on a miss are added, and the file is reloaded
+when it changes on disk.
+"""
+
+import os
+import csv
+import time
+import bisect
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), 'data', 'airports.csv')
+
+# Letters NFKD does not decompose into a base letter plus combining marks
+_FOLD_TABLE = str.maketrans({'ø': 'o', 'æ': 'ae', 'œ': 'oe', 'ł': 'l', 'đ': 'd', 'ı': 'i', 'þ': 'th'})
+
+
+def fold(text: str) -> str:
+    """Lower-case `text`, strip diacritics and reduce punctuation to single spaces."""
+    decomposed = unicodedata.normalize('NFKD', text.casefold().translate(_FOLD_TABLE))
+    stripped = ''.join(ch if ch.isalnum() else ' ' for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.split())
+
+
+def trigrams(text: str) -> List[str]:
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class Gazetteer:
+    """
+    In-memory airport and city index. Entries are stored column-wise
+    (parallel lists indexed by entry id); the prefix and trigram indexes
+    hold entry ids only.
+    """
+
+    def __init__(self, rows: Iterable[Dict[str, str]] = ()):
+        """
+        Build the index.
+
+        Args:
+            rows: Airport rows with iata, name, city, city_code, country,
+                latitude, longitude and optional '|'-separated aliases
+        """
+        self.sub_types: List[str] = []
+        self.codes: List[str] = []
+        self.names: List[str] = []
+        self.cities: List[str] = []
+        self.city_codes: List[str] = []
+        self.countries: List[str] = []
+        self.latitudes = array('d')
+        self.longitudes = array('d')
+        self._by_code: Dict[Tuple[str, str], int] = {}
+        # Folded full names, city names and aliases -> entry ids
+        self._exact: Dict[str, List[int]] = defaultdict(list)
+        # Sorted (folded key, entry id) pairs; a prefix query is a bisect plus a scan
+        self._prefix: List[Tuple[str, int]] = []
+        self._keys: Dict[int, List[str]] = defaultdict(list)
+        self._trigrams: Dict[str, array] = defaultdict(lambda: array('I'))
+        self._lock = threading.Lock()
+
+        rows = list(rows)
+        cities: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            aliases = [alias for alias in (row.get('aliases') or '').split('|') if alias]
+            self.add(
+                'AIRPORT', row['iata'], row['name'], row['city'], row['city_code'], row['country'],
+                float(row['latitude']), float(row['longitude']), aliases
+            )
+            city = cities.setdefault(row['city_code'], {
+                'name': row['city'], 'country': row['country'], 'points': [], 'aliases': []
+            })
+            city['points'].append((float(row['latitude']), float(row['longitude'])))
+            city['aliases'].extend(alias for alias in aliases if alias not in city['aliases'])
+        for code, city in cities.items():
+            latitude = sum(point[0] for point in city['points']) / len(city['points'])
+            longitude = sum(point[1] for point in city['points']) / len(city['points'])
+            self.add('CITY', code, city['name'], city['name'], code, city['country'], latitude, longitude, city['aliases'])
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'Gazetteer':
+        with open(path, newline='', encoding='utf-8') as handle:
+            return cls(csv.DictReader(handle))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def add(
+        self,
+        sub_type: str,
+        code: str,
+        name: str,
+        city: str,
+        city_code: str,
+        country: str,
+        latitude: float,
+        longitude: float,
+        aliases: Iterable[str] = ()
+    ) -> int:
+        """Add (or return the existing) entry for a sub type and IATA code, indexing its names; returns its id."""
+        code = code.upper()
+        with self._lock:
+            existing = self._by_code.get((sub_type, code))
+            if existing is not None:
+                return existing
+            entry_id = len(self.codes)
+            self.sub_types.append(sub_type)
+            self.codes.append(code)
+            self.names.append(name)
+            self.cities.append(city)
+            self.city_codes.append(city_code.upper())
+            self.countries.append(country.upper())
+            self.latitudes.append(latitude)
+            self.longitudes.append(longitude)
+            self._by_code[(sub_type, code)] = entry_id
+
+            keys = {fold(code)}
+            for text in (name, city, *aliases):
+                folded = fold(text)
+                if folded:
+                    keys.add(folded)
+                    keys.update(word for word in folded.split() if len(word) > 2)
+                    if entry_id not in self._exact[folded]:
+                        self._exact[folded].append(entry_id)
+            for key in keys:
+                bisect.insort(self._prefix, (key, entry_id))
+                self._keys[entry_id].append(key)
+                for gram in set(trigrams(key)):
+                    self._trigrams[gram].append(entry_id)
+            return entry_id
+
+    def entry(self, entry_id: int) -> Dict[str, Any]:
+        """Compact location summary, in the shape returned to the LLM."""
+        return {
+            'subType': self.sub_types[entry_id],
+            'iataCode': self.codes[entry_id],
+            'name': self.names[entry_id],
+            'cityName': self.cities[entry_id],
+            'cityCode': self.city_codes[entry_id],
+            'countryCode': self.countries[entry_id],
+            'latitude': self.latitudes[entry_id],
+            'longitude': self.longitudes[entry_id]
+        }
+
+    def get(self, code: str, sub_type: str = 'AIRPORT') -> Optional[Dict[str, Any]]:
+        entry_id = self._by_code.get((sub_type, code.strip().upper()))
+        return self.entry(entry_id) if entry_id is not None else None
+
+    def match(self, keyword: str, sub_type: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Airports and cities whose IATA code, name, city name or alias equals
+        a keyword, cities first. Keywords of up to three letters only match
+        codes, since they are usually codes.
+
+        Args:
+            keyword: Code, city, airport name or alias, with or without diacritics
+            sub_type: 'AIRPORT' or 'CITY' to restrict results
+            limit: Maximum number of results
+        """
+        query = fold(keyword)
+        if not query:
+            return []
+        if len(query) <= 3 and query.isalpha():
+            code = query.upper()
+            ordered = [
+                entry_id for entry_id in (self._by_code.get(('CITY', code)), self._by_code.get(('AIRPORT', code)))
+                if entry_id is not None
+            ]
+        else:
+            ordered = sorted(self._exact.get(query, ()), key=lambda i: (self.sub_types[i] != 'CITY', self.codes[i]))
+        return self._entries(ordered, sub_type, limit)
+
+    def search(self, keyword: str, sub_type: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Find airports and cities whose code, name or alias starts with a
+        keyword. Prefix matches may be different places than the one meant,
+        so these are suggestions, not answers (see match).
+
+        Ranking: exact IATA code, then exact names, then name prefixes
+        (shortest first), cities before their airports within each group.
+
+        Args:
+            keyword: Code, city, airport name or alias, with or without diacritics
+            sub_type: 'AIRPORT' or 'CITY' to restrict results
+            limit: Maximum number of results
+        """
+        query = fold(keyword)
+        if not query:
+            return []
+
+        scores: Dict[int, Tuple[int, int]] = {}
+        start = bisect.bisect_left(self._prefix, (query, -1))
+        for key, entry_id in self._prefix[start:]:
+            if not key.startswith(query):
+                break
+            if key == query:
+                rank = 0 if len(query) == 3 and self.codes[entry_id] == query.upper() else 1
+            else:
+                rank = 2
+            score = (rank, len(key))
+            if entry_id not in scores or score < scores[entry_id]:
+                scores[entry_id] = score
+
+        ordered = sorted(scores, key=lambda i: (scores[i], self.sub_types[i] != 'CITY', self.codes[i]))
+        return self._entries(ordered, sub_type, limit)
+
+    def suggest(self, keyword: str, sub_type: Optional[str] = None, limit: int = 5, min_similarity: float = 0.45) -> List[Dict[str, Any]]:
+        """
+        Airports and cities with names similar to a keyword (trigram
+        similarity, best first). Similar is not the same: "Graz" is close to
+        "Gran Canaria", so these are only suggestions for when nothing matches.
+
+        Args:
+            keyword: Possibly misspelled code, name or alias
+            sub_type: 'AIRPORT' or 'CITY' to restrict results
+            limit: Maximum number of results
+            min_similarity: Lowest trigram similarity (0..1) accepted
+        """
+        query = fold(keyword)
+        if not query:
+            return []
+        return self._entries(self._fuzzy(query, min_similarity), sub_type, limit)
+
+    def _entries(self, ordered: Iterable[int], sub_type: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        results = []
+        for entry_id in ordered:
+            if sub_type and self.sub_types[entry_id] != sub_type:
+                continue
+            results.append(self.entry(entry_id))
+            if len(results) >= limit:
+                break
+        return results
+
+    def _fuzzy(self, query: str, min_similarity: float) -> List[int]:
+        """Entry ids whose best key shares enough trigrams with the query (Dice coefficient), best first."""
+        grams = set(trigrams(query))
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for entry_id in set(self._trigrams.get(gram, ())):
+                shared[entry_id] += 1
+
+        scored = []
+        for entry_id, count in shared.items():
+            if 2 * count / (len(grams) + count) < min_similarity:
+                continue  # even a key made only of the shared trigrams would score too low
+            best = max(
+                2 * len(grams & set(trigrams(key))) / (len(grams) + len(set(trigrams(key))))
+                for key in self._keys[entry_id]
+            )
+            if best >= min_similarity:
+                scored.append((-best, self.sub_types[entry_id] != 'CITY', entry_id))
+        scored.sort()
+        return [entry_id for _, _, entry_id in scored]
+
+    def learn(self, locations: Iterable[Dict[str, Any]]):
+        """Add Amadeus reference-data locations (e.g. from a fallback search) so later lookups hit locally."""
+        for location in locations:
+            sub_type = location.get('subType')
+            code = location.get('iataCode')
+            geo = location.get('geoCode') or {}
+            address = location.get('address') or {}
+            if sub_type not in ('AIRPORT', 'CITY') or not code or 'latitude' not in geo:
+                continue
+            name = (location.get('name') or code).title()
+            self.add(
+                sub_type, code, name,
+                (address.get('cityName') or name).title(), address.get('cityCode') or code,
+                address.get('countryCode') or '', float(geo['latitude']), float(geo['longitude'])
+            )
+
+
+def summarize_location(location: Dict[str, Any]) -> Dict[str, Any]:
+    """Amadeus reference-data location in the Gazetteer.entry shape."""
+    geo = location.get('geoCode') or {}
+    address = location.get('address') or {}
+    return {
+        'subType': location.get('subType'),
+        'iataCode': location.get('iataCode'),
+        'name': location.get('detailedName') or location.get('name'),
+        'cityName': address.get('cityName'),
+        'cityCode': address.get('cityCode'),
+        'countryCode': address.get('countryCode'),
+        'latitude': geo.get('latitude'),
+        'longitude': geo.get('longitude')
+    }
+
+
+_default_gazetteer: Optional[Gazetteer] = None
+_default_mtime: float = 0.0
+_default_checked: float = 0.0
+# Locations learned from Amadeus by (subType, iataCode), oldest first
+_default_learned: 'OrderedDict[Tuple[str, str], Dict[str, Any]]' = OrderedDict()
+_default_lock = threading.Lock()
+
+
+def get_default_gazetteer() -> Gazetteer:
+    """
+    Return the process-wide gazetteer, reloading it when the file changed,
+    configured from the environment:
+        GAZETTEER_PATH airports CSV (default services/data/airports.csv)
+        GAZETTEER_REFRESH_SECONDS between checks of the file's mtime (default 300)
+    """
+    global _default_gazetteer, _default_mtime, _default_checked
+    now = time.monotonic()
+    if _default_gazetteer is not None and now - _default_checked < float(os.getenv('GAZETTEER_REFRESH_SECONDS', '300')):
+        return _default_gazetteer
+    with _default_lock:
+        path = os.getenv('GAZETTEER_PATH', DEFAULT_PATH)
+        _default_checked = now
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = _default_mtime
+        if _default_gazetteer is None or mtime != _default_mtime:
+            gazetteer = Gazetteer.from_csv(path) if os.path.exists(path) else Gazetteer()
+            gazetteer.learn(list(_default_learned.values()))
+            _default_gazetteer, _default_mtime = gazetteer, mtime
+        return _default_gazetteer
+
+
+def learn_locations(locations: List[Dict[str, Any]]):
+    """
+    Add Amadeus locations to the default gazetteer, keeping them across
+    reloads (at most GAZETTEER_MAX_LEARNED, default 5000, oldest dropped first).
+    """
+    max_learned = int(os.getenv('GAZETTEER_MAX_LEARNED', '5000'))
+    with _default_lock:
+        for location in locations:
+            key = (location.get('subType'), location.get('iataCode'))
+            if not all(key):
+                continue
+            _default_learned.pop(key, None)
+            _default_learned[key] = location
+        while len(_default_learned) > max_learned:
+            _default_learned.popitem(last=False)
+    get_default_gazetteer().learn(locations)
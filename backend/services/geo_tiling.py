@@ -0,0 +1,156 @@
+"""
+Geo Tiling for radius-based searches
+Covers a bounding box with circles on a globally aligned lattice
+
+Amadeus location searches take a center and a radius (capped, e.g. 20 km
+for activities), not a box. A box is covered with lattice tiles whose
+circumscribed circles become the radius queries. Tile edges are powers of
+two degrees anchored at 0/0, so every box that touches a tile produces the
+exact same query for it and cached tile results are reused across
+overlapping searches.
+"""
+
+import math
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Finest tile edge used: 2**-10 degrees (about 110 m of latitude)
+MIN_LEVEL = -10
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def in_box(latitude: float, longitude: float, north: float, west: float, south: float, east: float) -> bool:
+    """True if the point lies in the box; west > east means the box crosses the antimeridian."""
+    if not south <= latitude <= north:
+        return False
+    if west <= east:
+        return west <= longitude <= east
+    return longitude >= west or longitude <= east
+
+
+def _lon_step(lat_step: float, lat_south: float) -> float:
+    """Longitude edge for a tile row: the power-of-two multiple of lat_step keeping tiles roughly square."""
+    lat_mid = min(abs(lat_south), abs(lat_south + lat_step))
+    ratio = 1 / max(math.cos(math.radians(lat_mid)), 1e-6)
+    return min(lat_step * 2 ** max(0, round(math.log2(ratio))), 360.0)
+
+
+def _tile_radius_km(lat_south: float, lon_west: float, lat_step: float, lon_step: float) -> float:
+    """Radius of the circle centered on the tile that contains all of it."""
+    center_lat, center_lon = lat_south + lat_step / 2, lon_west + lon_step / 2
+    return max(
+        haversine_km(center_lat, center_lon, lat, lon)
+        for lat in (lat_south, lat_south + lat_step)
+        for lon in (lon_west, lon_west + lon_step)
+    )
+
+
+def _count_tiles(north: float, west: float, south: float, east: float, lat_step: float) -> int:
+    """Number of tiles _tiles would yield, counted per row without listing them."""
+    count = 0
+    row = math.floor(south / lat_step) * lat_step
+    while row < north or row == south:
+        lon_step = _lon_step(lat_step, row)
+        column = math.floor(west / lon_step) * lon_step
+        count += max(1, math.ceil((east - column) / lon_step))
+        row += lat_step
+    return count
+
+
+def _tiles(north: float, west: float, south: float, east: float, lat_step: float) -> Iterator[Tuple[float, float, float, float]]:
+    """Lattice tiles `(south, west, lat_step, lon_step)` intersecting a box that does not cross the antimeridian."""
+    row = math.floor(south / lat_step) * lat_step
+    while row < north or row == south:
+        lon_step = _lon_step(lat_step, row)
+        column = math.floor(west / lon_step) * lon_step
+        while column < east or column == west:
+            yield row, column, lat_step, lon_step
+            column += lon_step
+        row += lat_step
+
+
+class TooManyTiles(ValueError):
+    """Raised by cover_box when a box needs more than `max_tiles` queries."""
+
+    def __init__(self, tiles: int, max_tiles: int):
+        self.tiles = tiles
+        self.max_tiles = max_tiles
+        super().__init__(f"Box needs at least {tiles} searches (max {max_tiles})")
+
+
+def cover_box(
+    north: float,
+    west: float,
+    south: float,
+    east: float,
+    max_radius_km: float = 20.0,
+    max_tiles: Optional[int] = None
+) -> List[Dict[str, float]]:
+    """
+    Cover a box with lattice-aligned radius queries.
+
+    The tile edge is the smallest power of two degrees not shorter than the
+    box's longer side (so the box touches at most 2x2 tiles), halved until
+    every tile fits in a `max_radius_km` circle. If the box touches several
+    tiles but fits in one tile of the next level up, that single tile is used.
+
+    Args:
+        north, west, south, east: Box edges in degrees (west > east crosses the antimeridian)
+        max_radius_km: Largest radius the upstream accepts
+        max_tiles: Largest number of queries accepted; levels are counted
+            before their tiles are listed, so oversized boxes fail fast
+
+    Returns:
+        Queries as dicts with `latitude`, `longitude` and `radius` (whole km,
+        at least 1), ordered south to north, west to east
+
+    Raises:
+        TooManyTiles: if the box needs more than `max_tiles` queries
+    """
+    north, south = max(north, south), min(north, south)
+    parts = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+
+    height = north - south
+    width = sum(e - w for w, e in parts) * math.cos(math.radians(min(abs(north), abs(south), 89.0)))
+    level = math.ceil(math.log2(max(height, width, 2.0 ** MIN_LEVEL)))
+
+    def tiling(level: int) -> Tuple[float, List[Tuple[float, float, float, float]], List[float]]:
+        lat_step = 2.0 ** level
+        tiles = [tile for w, e in parts for tile in _tiles(north, w, south, e, lat_step)]
+        return lat_step, tiles, [_tile_radius_km(*tile) for tile in tiles]
+
+    lat_step, tiles, radii = tiling(level)
+    while level > MIN_LEVEL and max(radii) > max_radius_km:
+        level -= 1
+        if max_tiles is not None:
+            # Finer levels only add tiles, so an oversized level ends the search
+            count = sum(_count_tiles(north, w, south, e, 2.0 ** level) for w, e in parts)
+            if count > max_tiles:
+                raise TooManyTiles(count, max_tiles)
+        lat_step, tiles, radii = tiling(level)
+    # A box straddling a tile edge may fit in a single tile one level up
+    if len(tiles) > 1:
+        coarser = tiling(level + 1)
+        if len(coarser[1]) == 1 and coarser[2][0] <= max_radius_km:
+            lat_step, tiles, radii = coarser
+    if max_tiles is not None and len(tiles) > max_tiles:
+        raise TooManyTiles(len(tiles), max_tiles)
+
+    return [
+        {
+            'latitude': round(tile_south + lat_step / 2, 6),
+            'longitude': round((tile_west + lon_step / 2 + 180) % 360 - 180, 6),
+            'radius': max(1, math.ceil(radius))
+        }
+        for (tile_south, tile_west, lat_step, lon_step), radius in zip(tiles, radii)
+    ]
@@ -0,0 +1,369 @@
+"""
+Offer Projection for tool results
+Turns raw Amadeus flight offers, hotel offers and activities into compact,
+ranked summaries
+
+A flight-offers search can return hundreds of offers of several KB each.
+Only the summaries are sent to the LLM; the full objects stay in the offer
+store and are referenced by handle (e.g. for flight_offers_price).
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.offer_store import OfferStore
+
+
+_DURATION_RE = re.compile(r'^P(?:(\d+)D)?T?(?:(\d+)H)?(?:(\d+)M)?')
+
+
+def parse_duration(value: Optional[str]) -> Optional[int]:
+    """Convert an ISO 8601 duration such as 'PT14H5M' or 'P1DT2H' to minutes."""
+    if not value:
+        return None
+    match = _DURATION_RE.match(value)
+    if not match:
+        return None
+    days, hours, minutes = (int(part or 0) for part in match.groups())
+    return days * 1440 + hours * 60 + minutes
+
+
+def format_minutes(minutes: Optional[int]) -> Optional[str]:
+    if minutes is None:
+        return None
+    return f"{minutes // 60}h{minutes % 60:02d}m"
+
+
+def _price(offer: Dict[str, Any]) -> Tuple[float, Optional[str]]:
+    price = offer.get('price') or {}
+    try:
+        total = float(price.get('grandTotal') or price.get('total'))
+    except (TypeError, ValueError):
+        total = float('inf')
+    return total, price.get('currency')
+
+
+def _itinerary_summary(itinerary: Dict[str, Any]) -> Dict[str, Any]:
+    segments = itinerary.get('segments') or []
+    first, last = (segments[0], segments[-1]) if segments else ({}, {})
+    duration = parse_duration(itinerary.get('duration'))
+    return {
+        'from': first.get('departure', {}).get('iataCode'),
+        'to': last.get('arrival', {}).get('iataCode'),
+        'departure': first.get('departure', {}).get('at'),
+        'arrival': last.get('arrival', {}).get('at'),
+        'duration': format_minutes(duration),
+        'stops': max(len(segments) - 1, 0),
+        'via': [s.get('arrival', {}).get('iataCode') for s in segments[:-1]],
+        'flights': [f"{s.get('carrierCode', '')}{s.get('number', '')}" for s in segments]
+    }
+
+
+def _itinerary_key(offer: Dict[str, Any]) -> Tuple:
+    """Identify an offer by its flights and departure times, ignoring fare details."""
+    return tuple(
+        (s.get('carrierCode'), s.get('number'), s.get('departure', {}).get('at'))
+        for itinerary in offer.get('itineraries') or []
+        for s in itinerary.get('segments') or []
+    )
+
+
+def _total_minutes(offer: Dict[str, Any]) -> int:
+    return sum(parse_duration(i.get('duration')) or 0 for i in offer.get('itineraries') or [])
+
+
+def _cabin_and_bags(offer: Dict[str, Any]) -> Tuple[Optional[str], Optional[int]]:
+    for traveler in offer.get('travelerPricings') or []:
+        for fare in traveler.get('fareDetailsBySegment') or []:
+            return fare.get('cabin'), (fare.get('includedCheckedBags') or {}).get('quantity')
+    return None, None
+
+
+def project_flight_offer(offer: Dict[str, Any], handle: str) -> Dict[str, Any]:
+    """Compact summary of one flight offer."""
+    total, currency = _price(offer)
+    cabin, bags = _cabin_and_bags(offer)
+    carriers = []
+    for itinerary in offer.get('itineraries') or []:
+        for segment in itinerary.get('segments') or []:
+            code = segment.get('carrierCode')
+            if code and code not in carriers:
+                carriers.append(code)
+    return {
+        'handle': handle,
+        'price': total if total != float('inf') else None,
+        'currency': currency,
+        'carriers': carriers,
+        'itineraries': [_itinerary_summary(i) for i in offer.get('itineraries') or []],
+        'cabin': cabin,
+        'checked_bags': bags,
+        'seats_left': offer.get('numberOfBookableSeats'),
+        'last_ticketing_date': offer.get('lastTicketingDate')
+    }
+
+
+def project_flight_offers(
+    offers: List[Dict[str, Any]],
+    store: OfferStore,
+    limit: int = 10,
+    dictionaries: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Rank offers by price, then total duration and stops, drop offers for the
+    same flights, store the full offers and return the top summaries.
+
+    Args:
+        offers: Raw flight offers from Amadeus (not modified)
+        store: Store keeping the full offers under their handles
+        limit: Maximum number of summaries returned
+        dictionaries: Optional Amadeus dictionaries, used for carrier names
+
+    Returns:
+        Dict with `offers` (summaries) and `meta` (counts, cheapest price, carrier names)
+    """
+    ranked = sorted(
+        offers,
+        key=lambda o: (_price(o)[0], _total_minutes(o), sum(len(i.get('segments') or []) for i in o.get('itineraries') or []))
+    )
+    seen = set()
+    unique = []
+    for offer in ranked:
+        key = _itinerary_key(offer)
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(offer)
+
+    summaries = [project_flight_offer(offer, store.put(offer, 'F')) for offer in unique[:limit]]
+
+    carrier_names = (dictionaries or {}).get('carriers') or {}
+    used = {code for summary in summaries for code in summary['carriers']}
+    return {
+        'offers': summaries,
+        'meta': {
+            'total_offers': len(offers),
+            'unique_offers': len(unique),
+            'returned': len(summaries),
+            'cheapest': summaries[0]['price'] if summaries else None,
+            'currency': summaries[0]['currency'] if summaries else None,
+            'carriers': {code: carrier_names[code] for code in sorted(used) if code in carrier_names}
+        }
+    }
+
+
+def project_date_matrix(
+    cells: List[Tuple[str, Optional[str], List[Dict[str, Any]]]],
+    store: OfferStore,
+    best: int = 3
+) -> Dict[str, Any]:
+    """
+    Summarize a flexible-date search as a price matrix: one row per
+    departure date, one column per return date (a single column for
+    one-way searches), each cell holding its cheapest price or None.
+
+    Args:
+        cells: `(departure_date, return_date, offers)` per searched cell
+        store: Store keeping the full offers of the best cells under their handles
+        best: Number of cheapest cells returned as full summaries with handles
+
+    Returns:
+        Dict with `departureDates`, `returnDates`, `prices` (rows by departure date),
+        `currency` and `best` (cheapest cells with summaries)
+    """
+    departures = sorted({departure for departure, _, _ in cells})
+    returns = sorted({ret for _, ret, _ in cells if ret})
+    prices: Dict[Tuple[str, Optional[str]], float] = {}
+    cheapest: List[Tuple[float, str, Optional[str], Dict[str, Any]]] = []
+    currency = None
+    for departure, ret, offers in cells:
+        priced = [(_price(offer)[0], offer) for offer in offers]
+        priced = [(total, offer) for total, offer in priced if total != float('inf')]
+        if not priced:
+            continue
+        total, offer = min(priced, key=lambda entry: entry[0])
+        prices[(departure, ret)] = total
+        currency = currency or _price(offer)[1]
+        cheapest.append((total, departure, ret, offer))
+    cheapest.sort(key=lambda entry: entry[0])
+
+    columns = returns or [None]
+    return {
+        'departureDates': departures,
+        'returnDates': returns or None,
+        'prices': [[prices.get((departure, ret)) for ret in columns] for departure in departures],
+        'currency': currency,
+        'best': [
+            dict(project_flight_offer(offer, store.put(offer, 'F')), departureDate=departure, returnDate=ret)
+            for _, departure, ret, offer in cheapest[:best]
+        ]
+    }
+
+
+def project_route_comparison(
+    routes: List[Tuple[str, str, List[Dict[str, Any]]]],
+    store: OfferStore,
+    offers_per_route: int = 2
+) -> Dict[str, Any]:
+    """
+    Compare flight searches for several origin/destination pairs: routes
+    ranked by their cheapest offer, each with its best few offers
+    registered under 'F' handles. Routes without offers come last.
+
+    Args:
+        routes: `(origin, destination, offers)` per searched route
+        store: Store keeping the full offers under their handles
+        offers_per_route: Maximum number of offer summaries per route
+    """
+    ranked = []
+    for origin, destination, offers in routes:
+        unique, seen = [], set()
+        for offer in sorted(offers, key=lambda o: (_price(o)[0], _total_minutes(o))):
+            key = _itinerary_key(offer)
+            if key not in seen:
+                seen.add(key)
+                unique.append(offer)
+        cheapest, currency = _price(unique[0]) if unique else (float('inf'), None)
+        ranked.append((cheapest, origin, destination, currency, unique, len(offers)))
+    ranked.sort(key=lambda entry: entry[0])
+
+    return {
+        'routes': [
+            {
+                'origin': origin,
+                'destination': destination,
+                'cheapest': cheapest if cheapest != float('inf') else None,
+                'currency': currency,
+                'total_offers': total,
+                'offers': [project_flight_offer(offer, store.put(offer, 'F')) for offer in unique[:offers_per_route]]
+            }
+            for cheapest, origin, destination, currency, unique, total in ranked
+        ]
+    }
+
+
+def _amount(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('inf')
+
+
+def _rating(activity: Dict[str, Any]) -> float:
+    rating = _amount(activity.get('rating'))
+    return rating if rating != float('inf') else 0.0
+
+
+def project_hotel_offers(
+    hotels: List[Dict[str, Any]],
+    store: OfferStore,
+    limit: int = 10,
+    offers_per_hotel: int = 3
+) -> Dict[str, Any]:
+    """
+    Summarize hotel-offers results: hotels ranked by their cheapest offer,
+    each with its cheapest offers registered under 'H' handles.
+
+    Args:
+        hotels: Raw hotel-offers items from Amadeus (not modified)
+        store: Store keeping the full offers under their handles
+        limit: Maximum number of hotels returned
+        offers_per_hotel: Maximum number of offers returned per hotel
+    """
+    ranked = []
+    for item in hotels:
+        offers = sorted(item.get('offers') or [], key=lambda o: _amount((o.get('price') or {}).get('total')))
+        if offers:
+            ranked.append((_amount((offers[0].get('price') or {}).get('total')), item, offers))
+    ranked.sort(key=lambda entry: entry[0])
+
+    summaries = []
+    for _, item, offers in ranked[:limit]:
+        hotel = item.get('hotel') or {}
+        summaries.append({
+            'hotelId': hotel.get('hotelId'),
+            'name': hotel.get('name'),
+            'cityCode': hotel.get('cityCode'),
+            'offers': [
+                {
+                    'handle': store.put(offer, 'H'),
+                    'price': _amount((offer.get('price') or {}).get('total')),
+                    'currency': (offer.get('price') or {}).get('currency'),
+                    'checkInDate': offer.get('checkInDate'),
+                    'checkOutDate': offer.get('checkOutDate'),
+                    'room': ((offer.get('room') or {}).get('typeEstimated') or {}).get('category'),
+                    'board': offer.get('boardType'),
+                    'refundable': ((offer.get('policies') or {}).get('refundable') or {}).get('cancellationRefund')
+                }
+                for offer in offers[:offers_per_hotel]
+            ]
+        })
+    return {
+        'hotels': summaries,
+        'meta': {
+            'total_hotels': len(hotels),
+            'available_hotels': len(ranked),
+            'returned': len(summaries)
+        }
+    }
+
+
+def project_activities(
+    activities: List[Dict[str, Any]],
+    store: OfferStore,
+    limit: int = 20,
+    description_chars: int = 160
+) -> Dict[str, Any]:
+    """
+    Summarize activities ranked by rating, registering each under an 'A' handle.
+
+    Args:
+        activities: Raw activities from Amadeus (not modified)
+        store: Store keeping the full activities under their handles
+        limit: Maximum number of activities returned
+        description_chars: Maximum length of the short description
+    """
+    ranked = sorted(activities, key=lambda a: -_rating(a))
+    summaries = []
+    for activity in ranked[:limit]:
+        price = activity.get('price') or {}
+        geo = activity.get('geoCode') or {}
+        summaries.append({
+            'handle': store.put(activity, 'A'),
+            'name': activity.get('name'),
+            'description': (activity.get('shortDescription') or '')[:description_chars] or None,
+            'rating': activity.get('rating'),
+            'price': price.get('amount'),
+            'currency': price.get('currencyCode'),
+            'duration': activity.get('minimumDuration'),
+            'latitude': geo.get('latitude'),
+            'longitude': geo.get('longitude')
+        })
+    return {
+        'activities': summaries,
+        'meta': {'total_activities': len(activities), 'returned': len(summaries)}
+    }
+
+
+def project_points_of_interest(nearby: List[Tuple[float, Dict[str, Any]]], limit: int = 20) -> Dict[str, Any]:
+    """
+    Summarize points of interest, nearest first.
+
+    Args:
+        nearby: `(distance km, raw POI)` pairs sorted by distance
+        limit: Maximum number of POIs returned
+    """
+    summaries = []
+    for distance, poi in nearby[:limit]:
+        geo = poi.get('geoCode') or {}
+        summaries.append({
+            'name': poi.get('name'),
+            'category': poi.get('category'),
+            'tags': (poi.get('tags') or [])[:5],
+            'distanceKm': round(distance, 2),
+            'latitude': geo.get('latitude'),
+            'longitude': geo.get('longitude')
+        })
+    return {
+        'points_of_interest': summaries,
+        'meta': {'total_points_of_interest': len(nearby), 'returned': len(summaries)}
+    }
@@ -0,0 +1,198 @@
+"""
+Offer Store for full Amadeus offers
+Keeps complete offers server-side under short per-session handles (F1, H2,
+A3, ...) so tool results and tool arguments only need to carry the handle
+
+Offers are written through to the response cache's shared SQLite tier when
+it is enabled (AMADEUS_CACHE_BACKEND=sqlite), so a handle issued by one
+worker process resolves in the others on the same host. Deployments spread
+over several hosts must route each session to one host (sticky sessions).
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from services.response_cache import LRUCache, SQLiteCacheBackend, _MISSING, get_default_cache
+
+
+# Session whose registry offers are stored in and resolved from. Set around
+# tool execution by ChatbotService; '' is the registry used outside a chat.
+_current_scope: ContextVar[str] = ContextVar('offer_scope', default='')
+
+
+@contextmanager
+def offer_scope(session_id: Optional[str]) -> Iterator[None]:
+    """Resolve and register offers in `session_id`'s registry inside the block."""
+    token = _current_scope.set(session_id or '')
+    try:
+        yield
+    finally:
+        _current_scope.reset(token)
+
+
+class _ScopeOffers:
+    """Offers registered by one session, oldest first."""
+
+    __slots__ = ('offers', 'by_digest', 'counters', 'lock')
+
+    def __init__(self):
+        self.offers: "OrderedDict[str, Tuple[Dict[str, Any], float, str]]" = OrderedDict()
+        self.by_digest: Dict[str, str] = {}
+        self.counters: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+
+class OfferStore:
+    """
+    Per-session registry of full offers, bounded and TTL-evicted.
+
+    Each session numbers its offers per kind ('F' flights, 'H' hotel offers,
+    'A' activities), so handles stay a few characters long. Registering the
+    same offer again in a session returns its existing handle. A session's
+    registry expires `ttl` seconds after its last registration. With a
+    shared store, handles are numbered by counters incremented atomically in
+    it, so no two processes hand out the same handle, offers are written
+    through to it, and handles unknown locally are looked up there.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        max_offers: int = 500,
+        ttl: float = 30 * 60,
+        shared: Optional[SQLiteCacheBackend] = None
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            max_sessions: Maximum number of session registries kept (least recently used evicted)
+            max_offers: Maximum number of offers per session (oldest evicted)
+            ttl: Seconds an offer stays resolvable after it was registered
+            shared: Optional store shared with other worker processes
+        """
+        self.max_offers = max_offers
+        self.ttl = ttl
+        self.shared = shared
+        self._scopes = LRUCache(max_sessions)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(offer: Dict[str, Any]) -> str:
+        return hashlib.sha1(json.dumps(offer, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def _scope(self, create: bool) -> Optional[_ScopeOffers]:
+        scope_id = _current_scope.get()
+        scope = self._scopes.get(scope_id)
+        if scope is not _MISSING:
+            if create:
+                self._scopes.set(scope_id, scope, self.ttl)
+            return scope
+        if not create:
+            return None
+        with self._lock:
+            scope = self._scopes.get(scope_id)
+            if scope is _MISSING:
+                scope = _ScopeOffers()
+            self._scopes.set(scope_id, scope, self.ttl)
+            return scope
+
+    def put(self, offer: Dict[str, Any], prefix: str = 'F') -> str:
+        """
+        Register a full offer in the current session and return its handle.
+
+        Args:
+            offer: Full offer object as returned by Amadeus (stored by reference, not copied)
+            prefix: Handle prefix identifying the offer kind
+        """
+        digest = f"{prefix}:{self.digest(offer)}"
+        scope_id = _current_scope.get()
+        scope = self._scope(create=True)
+        expires_at = time.time() + self.ttl
+        with scope.lock:
+            handle = scope.by_digest.get(digest)
+            if handle is not None and handle in scope.offers:
+                scope.offers[handle] = (offer, expires_at, digest)
+                scope.offers.move_to_end(handle)
+                if self.shared is not None:
+                    self.shared.set(self._offer_key(scope_id, handle), offer, self.ttl)
+                return handle
+            if self.shared is not None:
+                # Refreshed with every offer, so it outlives all offers it numbered
+                number = self.shared.increment(self._counter_key(scope_id, prefix), self.ttl)
+            else:
+                number = scope.counters[prefix] = scope.counters.get(prefix, 0) + 1
+            handle = f"{prefix}{number}"
+            scope.offers[handle] = (offer, expires_at, digest)
+            scope.by_digest[digest] = handle
+            while len(scope.offers) > self.max_offers:
+                _, (_, _, old_digest) = scope.offers.popitem(last=False)
+                scope.by_digest.pop(old_digest, None)
+            if self.shared is not None:
+                self.shared.set(self._offer_key(scope_id, handle), offer, self.ttl)
+        return handle
+
+    def get(self, handle: str) -> Optional[Dict[str, Any]]:
+        """Return the full offer for a handle in the current session, or None if unknown or expired."""
+        handle = handle.strip().upper()
+        scope = self._scope(create=False)
+        entry = None
+        if scope is not None:
+            with scope.lock:
+                entry = scope.offers.get(handle)
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+        if self.shared is None:
+            return None
+        offer = self.shared.get(self._offer_key(_current_scope.get(), handle))
+        return None if offer is _MISSING else offer
+
+    @staticmethod
+    def _offer_key(scope_id: str, handle: str) -> str:
+        return f"offer:{scope_id}:{handle}"
+
+    @staticmethod
+    def _counter_key(scope_id: str, prefix: str) -> str:
+        return f"offer-counter:{scope_id}:{prefix}"
+
+    def discard(self, session_id: str):
+        """
+        Drop a session's registry (e.g. when the session is reset). Shared
+        counters are kept, so handles of the dropped offers are not reused
+        while other processes may still hold them.
+        """
+        self._scopes.delete(session_id)
+
+    def clear(self):
+        self._scopes.clear()
+
+
+_default_store: Optional[OfferStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_offer_store() -> OfferStore:
+    """
+    Return the process-wide offer store, configured from the environment:
+        OFFER_STORE_MAX_SESSIONS (default 1000)
+        OFFER_STORE_MAX_OFFERS per session (default 500)
+        OFFER_STORE_TTL_MINUTES (default 30)
+    Offers are shared through the response cache's SQLite tier when it is enabled.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = OfferStore(
+                max_sessions=int(os.getenv('OFFER_STORE_MAX_SESSIONS', '1000')),
+                max_offers=int(os.getenv('OFFER_STORE_MAX_OFFERS', '500')),
+                ttl=float(os.getenv('OFFER_STORE_TTL_MINUTES', '30')) * 60,
+                shared=get_default_cache().shared
+            )
+        return _default_store
@@ -5,14 +5,39 @@ Uses Claude Sonnet 4 via OpenRouter API with tool-calling support
 
 import os
 import json
+import atexit
+import asyncio
+import weakref
+import threading
 import httpx
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from services.circuit_breaker import get_breaker
+
+
+def _http2_available() -> bool:
+    """Return True when the optional `h2` package needed for HTTP/2 is installed."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
 
 
 class OpenRouterService:
     """
     Service for interacting with OpenRouter API with function calling support.
+
+    All instances share one long-lived, pooled `httpx.Client` per process so
+    consecutive LLM round-trips reuse warm keep-alive connections instead of
+    paying a TCP+TLS handshake on every call.
     """
+
+    _client: Optional[httpx.Client] = None
+    _client_pid: Optional[int] = None
+    _client_lock = threading.Lock()
+    _stats_lock = threading.Lock()
+    _stats = {'requests': 0, 'new_connections': 0}
+    _shutdown_registered = False
     
     def __init__(self, api_key: Optional[str] = None):
         """
@@ -27,6 +52,114 @@ class OpenRouterService:
         
         self.base_url = "https://openrouter.ai/api/v1/chat/completions"
         self.model = "anthropic/claude-sonnet-4"
+        # Mark stable prompt prefixes with cache_control breakpoints (OPENROUTER_PROMPT_CACHE, default 'True')
+        self.prompt_cache = os.getenv('OPENROUTER_PROMPT_CACHE', 'True') == 'True'
+        self.breaker = get_breaker('openrouter')
+
+    # ==================== CONNECTION POOL ====================
+
+    @classmethod
+    def get_client(cls) -> httpx.Client:
+        """
+        Return the process-wide pooled HTTP client, creating it on first use.
+
+        Pool sizing is read from the environment:
+            OPENROUTER_MAX_CONNECTIONS (default 20)
+            OPENROUTER_MAX_KEEPALIVE (default 10)
+            OPENROUTER_KEEPALIVE_EXPIRY seconds (default 120)
+            OPENROUTER_HTTP2 'True'/'False' (default 'True', needs the `h2` package)
+
+        A client inherited across fork() is discarded and rebuilt, since its
+        sockets belong to the parent process.
+        """
+        pid = os.getpid()
+        client = cls._client
+        if client is not None and cls._client_pid == pid:
+            return client
+        with cls._client_lock:
+            if cls._client is None or cls._client_pid != pid:
+                limits = httpx.Limits(
+                    max_connections=int(os.getenv('OPENROUTER_MAX_CONNECTIONS', '20')),
+                    max_keepalive_connections=int(os.getenv('OPENROUTER_MAX_KEEPALIVE', '10')),
+                    keepalive_expiry=float(os.getenv('OPENROUTER_KEEPALIVE_EXPIRY', '120'))
+                )
+                http2 = os.getenv('OPENROUTER_HTTP2', 'True') == 'True' and _http2_available()
+                cls._client = httpx.Client(limits=limits, http2=http2, timeout=60.0)
+                cls._client_pid = pid
+                if not cls._shutdown_registered:
+                    atexit.register(cls.close)
+                    cls._shutdown_registered = True
+            return cls._client
+
+    @classmethod
+    def close(cls):
+        """Close the shared HTTP client. Safe to call more than once (shutdown hook)."""
+        with cls._client_lock:
+            client, cls._client, cls._client_pid = cls._client, None, None
+        if client is not None:
+            client.close()
+
+    @classmethod
+    def connection_stats(cls) -> Dict[str, int]:
+        """
+        Return request and connection counters for the shared client.
+
+        `reused_connections` counts requests served over an already open
+        connection, i.e. requests that did not pay a new handshake.
+        """
+        with cls._stats_lock:
+            requests = cls._stats['requests']
+            new_connections = cls._stats['new_connections']
+        return {
+            'requests': requests,
+            'new_connections': new_connections,
+            'reused_connections': max(requests - new_connections, 0)
+        }
+
+    @classmethod
+    def _trace(cls, event_name: str, info: Dict[str, Any]):
+        """httpcore trace hook: a completed TCP connect means no pooled connection was reused."""
+        if event_name == 'connection.connect_tcp.complete':
+            with cls._stats_lock:
+                cls._stats['new_connections'] += 1
+
+    def _post(self, headers: Dict[str, str], payload: Dict[str, Any], timeout: float) -> httpx.Response:
+        """
+        POST a payload to OpenRouter over the shared connection pool.
+        
+        Raises:
+            CircuitOpenError: without calling OpenRouter while its circuit is open
+        """
+        self.breaker.allow()
+        with self._stats_lock:
+            self._stats['requests'] += 1
+        try:
+            response = self.get_client().post(
+                self.base_url,
+                headers=headers,
+                json=payload,
+                timeout=timeout,
+                extensions={'trace': self._trace}
+            )
+            response.raise_for_status()
+        except BaseException as e:
+            self._record_error(e)
+            raise
+        self.breaker.record_success()
+        return response
+    
+    def _record_error(self, error: BaseException):
+        """Count transport errors, 5xx and 429 against the circuit; other errors don't reflect upstream health."""
+        if isinstance(error, httpx.TransportError):
+            self.breaker.record_failure()
+        elif isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            if status >= 500 or status == 429:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+        else:
+            self.breaker.release()
     
     def chat_completion(
         self,
@@ -45,29 +178,69 @@ class OpenRouterService:
         Returns:
             OpenRouter API response
         """
-        headers = {
+        headers = self._chat_headers()
+        payload = self._chat_payload(messages, tools, tool_choice)
+        
+        try:
+            response = self._post(headers, payload, timeout=60.0)
+            return response.json()
+        except httpx.HTTPError as e:
+            raise Exception(f"OpenRouter API error: {str(e)}")
+    
+    def _chat_headers(self) -> Dict[str, str]:
+        """Headers for chat completion requests."""
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
             "HTTP-Referer": "local",
             "X-Title": "Travel Chatbot"
         }
-        
+    
+    def _chat_payload(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]],
+        tool_choice: str
+    ) -> Dict[str, Any]:
+        """Request body for chat completion requests."""
         payload = {
             "model": self.model,
-            "messages": messages
+            "messages": self._with_cache_hints(messages) if self.prompt_cache else messages
         }
         
         if tools:
             payload["tools"] = tools
             payload["tool_choice"] = tool_choice
         
-        try:
-            with httpx.Client(timeout=60.0) as client:
-                response = client.post(self.base_url, headers=headers, json=payload)
-                response.raise_for_status()
-                return response.json()
-        except httpx.HTTPError as e:
-            raise Exception(f"OpenRouter API error: {str(e)}")
+        return payload
+    
+    def _with_cache_hints(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Add ephemeral cache_control breakpoints for providers with explicit
+        prompt caching (Anthropic, Gemini); others cache prefixes automatically
+        and ignore the hint.
+        
+        Breakpoints go on the leading system message (caching tools + system
+        prompt) and on the latest user message (caching the conversation so
+        far for every tool round of the current turn). Messages are copied,
+        not modified.
+        """
+        marked = set()
+        if messages and messages[0].get('role') == 'system':
+            marked.add(0)
+        for index in range(len(messages) - 1, 0, -1):
+            if messages[index].get('role') == 'user':
+                marked.add(index)
+                break
+        
+        hinted = list(messages)
+        for index in marked:
+            content = hinted[index].get('content')
+            if isinstance(content, str) and content:
+                hinted[index] = dict(hinted[index], content=[
+                    {'type': 'text', 'text': content, 'cache_control': {'type': 'ephemeral'}}
+                ])
+        return hinted
     
     def extract_message(self, response: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -143,10 +316,8 @@ class OpenRouterService:
         payload = {"model": model, "messages": messages}
 
         try:
-            with httpx.Client(timeout=90.0) as client:
-                resp = client.post(self.base_url, headers=headers, json=payload)
-                resp.raise_for_status()
-                data = resp.json()
+            resp = self._post(headers, payload, timeout=90.0)
+            data = resp.json()
         except httpx.HTTPError as e:
             raise Exception(f"OpenRouter image locate error: {e}")
 
@@ -173,3 +344,233 @@ class OpenRouterService:
                 parsed = None
 
         return {"parsed": parsed, "assistant_text": content, "fallback": parsed is None, "raw_response": data}
+
+
+
+class StreamAccumulator:
+    """
+    Rebuilds an assistant message from OpenRouter `stream: true` chunks.
+
+    Content arrives as text deltas; tool calls arrive as fragments keyed by
+    `index`, whose `function.arguments` strings must be concatenated.
+    """
+
+    def __init__(self):
+        self.role = 'assistant'
+        self.content_parts: List[str] = []
+        self.tool_calls: Dict[int, Dict[str, Any]] = {}
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[Dict[str, Any]] = None
+
+    def add(self, chunk: Dict[str, Any]) -> str:
+        """
+        Merge one stream chunk.
+
+        Args:
+            chunk: Parsed `data:` payload of a stream event
+
+        Returns:
+            The content delta carried by the chunk ('' if none)
+        """
+        if chunk.get('usage'):
+            self.usage = chunk['usage']
+        choices = chunk.get('choices') or []
+        if not choices:
+            return ''
+        choice = choices[0]
+        if choice.get('finish_reason'):
+            self.finish_reason = choice['finish_reason']
+        delta = choice.get('delta') or {}
+        if delta.get('role'):
+            self.role = delta['role']
+        for fragment in delta.get('tool_calls') or []:
+            call = self.tool_calls.setdefault(fragment.get('index', 0), {
+                'id': None,
+                'type': 'function',
+                'function': {'name': '', 'arguments': ''}
+            })
+            if fragment.get('id'):
+                call['id'] = fragment['id']
+            function = fragment.get('function') or {}
+            if function.get('name'):
+                call['function']['name'] += function['name']
+            if function.get('arguments'):
+                call['function']['arguments'] += function['arguments']
+        content = delta.get('content') or ''
+        if content:
+            self.content_parts.append(content)
+        return content
+
+    def message(self) -> Dict[str, Any]:
+        """Return the accumulated message in the same shape as `extract_message`."""
+        tool_calls = [self.tool_calls[index] for index in sorted(self.tool_calls)]
+        return {
+            'role': self.role,
+            'content': ''.join(self.content_parts),
+            'tool_calls': tool_calls or None
+        }
+
+
+class AsyncOpenRouterService(OpenRouterService):
+    """
+    Async variant of OpenRouterService built on a pooled `httpx.AsyncClient`,
+    so one worker can keep many LLM round-trips in flight without threads.
+    """
+
+    # One client per event loop, with the async generator that closes it when the loop shuts down
+    _async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, AsyncIterator[None]]]" = weakref.WeakKeyDictionary()
+    _async_clients_lock = threading.Lock()
+
+    @classmethod
+    async def get_async_client(cls) -> httpx.AsyncClient:
+        """
+        Return the pooled async client for the running event loop.
+
+        Pooled connections belong to the loop that opened them, so each loop
+        gets its own client: one for the life of an ASGI server, one per
+        request when async views run under WSGI (asgiref runs each in a new
+        loop). The client is closed on its own loop when that loop shuts
+        down: asyncio.run, which both uvicorn and asgiref use, finalizes
+        pending async generators before closing the loop, and each client has
+        one parked on it.
+        """
+        loop = asyncio.get_running_loop()
+        entry = cls._async_clients.get(loop)
+        if entry is not None:
+            return entry[0]
+        limits = httpx.Limits(
+            max_connections=int(os.getenv('OPENROUTER_MAX_CONNECTIONS', '20')),
+            max_keepalive_connections=int(os.getenv('OPENROUTER_MAX_KEEPALIVE', '10')),
+            keepalive_expiry=float(os.getenv('OPENROUTER_KEEPALIVE_EXPIRY', '120'))
+        )
+        http2 = os.getenv('OPENROUTER_HTTP2', 'True') == 'True' and _http2_available()
+        client = httpx.AsyncClient(limits=limits, http2=http2, timeout=60.0)
+        closer = cls._close_at_shutdown(loop, client)
+        await closer.__anext__()
+        with cls._async_clients_lock:
+            cls._async_clients[loop] = (client, closer)
+        return client
+
+    @classmethod
+    async def _close_at_shutdown(cls, loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient) -> AsyncIterator[None]:
+        """Park at the first yield; the loop's shutdown_asyncgens() (or aclose) resumes it and closes the client."""
+        try:
+            yield
+        finally:
+            with cls._async_clients_lock:
+                if cls._async_clients.get(loop, (None,))[0] is client:
+                    del cls._async_clients[loop]
+            await client.aclose()
+
+    @classmethod
+    async def aclose(cls):
+        """Close the running loop's async client now (e.g. on ASGI lifespan shutdown)."""
+        entry = cls._async_clients.get(asyncio.get_running_loop())
+        if entry is not None:
+            await entry[1].aclose()
+
+    async def _apost(self, headers: Dict[str, str], payload: Dict[str, Any], timeout: float) -> httpx.Response:
+        """POST a payload to OpenRouter over the async connection pool (see _post)."""
+        self.breaker.allow()
+        with self._stats_lock:
+            self._stats['requests'] += 1
+        try:
+            client = await self.get_async_client()
+            response = await client.post(
+                self.base_url,
+                headers=headers,
+                json=payload,
+                timeout=timeout,
+                extensions={'trace': self._atrace}
+            )
+            response.raise_for_status()
+        except BaseException as e:
+            self._record_error(e)
+            raise
+        self.breaker.record_success()
+        return response
+
+    @classmethod
+    async def _atrace(cls, event_name: str, info: Dict[str, Any]):
+        """Async httpcore trace hook; httpx requires a coroutine for async clients."""
+        cls._trace(event_name, info)
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str = "auto"
+    ) -> Dict[str, Any]:
+        """
+        Send a chat completion request to OpenRouter with optional tools.
+        
+        Args:
+            messages: List of message objects with role and content
+            tools: Optional list of tool definitions in OpenAI format
+            tool_choice: Tool choice strategy ('auto', 'none', or specific tool)
+            
+        Returns:
+            OpenRouter API response
+        """
+        headers = self._chat_headers()
+        payload = self._chat_payload(messages, tools, tool_choice)
+        
+        try:
+            response = await self._apost(headers, payload, timeout=60.0)
+            return response.json()
+        except httpx.HTTPError as e:
+            raise Exception(f"OpenRouter API error: {str(e)}")
+
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str = "auto"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a chat completion using OpenRouter's `stream: true` mode.
+        
+        Args:
+            messages: List of message objects with role and content
+            tools: Optional list of tool definitions in OpenAI format
+            tool_choice: Tool choice strategy ('auto', 'none', or specific tool)
+            
+        Yields:
+            Parsed stream chunks (feed them to a StreamAccumulator)
+        """
+        headers = self._chat_headers()
+        payload = self._chat_payload(messages, tools, tool_choice)
+        payload["stream"] = True
+        
+        self.breaker.allow()
+        with self._stats_lock:
+            self._stats['requests'] += 1
+        try:
+            client = await self.get_async_client()
+            async with client.stream(
+                'POST',
+                self.base_url,
+                headers=headers,
+                json=payload,
+                timeout=60.0,
+                extensions={'trace': self._atrace}
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    # Blank separators and ": OPENROUTER PROCESSING" keep-alive comments
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[len('data:'):].strip()
+                    if data == '[DONE]':
+                        break
+                    chunk = json.loads(data)
+                    if chunk.get('error'):
+                        raise Exception(f"OpenRouter API error: {chunk['error']}")
+                    yield chunk
+        except httpx.HTTPError as e:
+            self._record_error(e)
+            raise Exception(f"OpenRouter API error: {str(e)}")
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
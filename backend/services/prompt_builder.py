@@ -0,0 +1,175 @@
+"""
+Prompt Builder with token-budgeted history compaction
+Keeps recent turns verbatim and shrinks older tool results to compact digests
+"""
+
+import os
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Keys of history messages that the chat completions API understands
+API_MESSAGE_KEYS = ('role', 'content', 'tool_calls', 'tool_call_id', 'name')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token for mixed JSON and prose)."""
+    return len(text) // 4 + 1
+
+
+class PromptBuilder:
+    """
+    Builds the message list for one LLM call within a prompt-token budget.
+
+    History is split into turns (each starting at a user message). The most
+    recent turns are sent verbatim; tool results of older turns are replaced
+    by short digests. If the prompt is still over budget, the oldest turns
+    are dropped entirely (the current turn is always kept).
+    """
+
+    def __init__(
+        self,
+        max_prompt_tokens: Optional[int] = None,
+        keep_recent_turns: Optional[int] = None,
+        tool_digest_chars: Optional[int] = None
+    ):
+        """
+        Initialize the builder.
+
+        Args:
+            max_prompt_tokens: Prompt budget, including tool schemas (env PROMPT_MAX_TOKENS, default 60000)
+            keep_recent_turns: Turns kept verbatim (env PROMPT_KEEP_RECENT_TURNS, default 2)
+            tool_digest_chars: Maximum length of a compacted tool result (env PROMPT_TOOL_DIGEST_CHARS, default 600)
+        """
+        self.max_prompt_tokens = max_prompt_tokens or int(os.getenv('PROMPT_MAX_TOKENS', '60000'))
+        self.keep_recent_turns = keep_recent_turns or int(os.getenv('PROMPT_KEEP_RECENT_TURNS', '2'))
+        self.tool_digest_chars = tool_digest_chars or int(os.getenv('PROMPT_TOOL_DIGEST_CHARS', '600'))
+
+    def build(
+        self,
+        system_messages: List[Dict[str, Any]],
+        history: List[Dict[str, Any]],
+        tools_json: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Assemble the prompt for one call.
+
+        Args:
+            system_messages: Leading system messages, always sent as-is
+            history: Full session history
+            tools_json: Serialized tool definitions sent with the call (counted against the budget)
+
+        Returns:
+            Tuple of (messages, stats) where stats has estimated_tokens,
+            budget, messages, compacted_tool_messages and dropped_turns
+        """
+        fixed_tokens = self._count(system_messages)
+        if tools_json:
+            fixed_tokens += estimate_tokens(tools_json)
+
+        turns = self._split_turns([self._api_message(m) for m in history])
+        compacted = 0
+        for turn in turns[:-self.keep_recent_turns]:
+            compacted += self._compact_turn(turn)
+
+        turn_tokens = [self._count(turn) for turn in turns]
+        dropped = 0
+        while dropped < len(turns) - 1 and fixed_tokens + sum(turn_tokens[dropped:]) > self.max_prompt_tokens:
+            dropped += 1
+
+        # A single oversized current turn: compact all but its latest tool round
+        if fixed_tokens + sum(turn_tokens[dropped:]) > self.max_prompt_tokens and turns:
+            compacted += self._compact_turn(turns[-1], keep_last_round=True)
+            turn_tokens[-1] = self._count(turns[-1])
+
+        messages = list(system_messages)
+        if dropped:
+            messages.append({
+                'role': 'system',
+                'content': f"[{dropped} earlier conversation turn(s) omitted to fit the context window]"
+            })
+        for turn in turns[dropped:]:
+            messages.extend(turn)
+
+        stats = {
+            'estimated_tokens': fixed_tokens + sum(turn_tokens[dropped:]),
+            'budget': self.max_prompt_tokens,
+            'messages': len(messages),
+            'compacted_tool_messages': compacted,
+            'dropped_turns': dropped
+        }
+        return messages, stats
+
+    def _api_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy a history message keeping only API fields (drops created_at etc.)."""
+        return {key: message[key] for key in API_MESSAGE_KEYS if key in message}
+
+    def _split_turns(self, messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        turns: List[List[Dict[str, Any]]] = []
+        for message in messages:
+            if message['role'] == 'user' or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    def _count(self, messages: List[Dict[str, Any]]) -> int:
+        total = 0
+        for message in messages:
+            content = message.get('content')
+            total += 4 + estimate_tokens(content if isinstance(content, str) else json.dumps(content))
+            if message.get('tool_calls'):
+                total += estimate_tokens(json.dumps(message['tool_calls']))
+        return total
+
+    def _compact_turn(self, turn: List[Dict[str, Any]], keep_last_round: bool = False) -> int:
+        """
+        Replace tool results (and oversized tool-call arguments) in a turn with digests, in place.
+
+        Returns:
+            Number of tool messages compacted
+        """
+        last_round_start = len(turn)
+        if keep_last_round:
+            for index in range(len(turn) - 1, -1, -1):
+                if turn[index].get('tool_calls'):
+                    last_round_start = index
+                    break
+
+        compacted = 0
+        for index, message in enumerate(turn[:last_round_start]):
+            if message['role'] == 'tool' and len(message.get('content') or '') > self.tool_digest_chars:
+                turn[index] = dict(message, content=self.digest_tool_result(message.get('content') or ''))
+                compacted += 1
+            elif message.get('tool_calls'):
+                turn[index] = dict(message, tool_calls=[self._compact_call(call) for call in message['tool_calls']])
+        return compacted
+
+    def _compact_call(self, tool_call: Dict[str, Any]) -> Dict[str, Any]:
+        arguments = tool_call.get('function', {}).get('arguments') or ''
+        if len(arguments) <= self.tool_digest_chars:
+            return tool_call
+        function = dict(tool_call['function'], arguments=json.dumps({'_omitted': 'arguments compacted'}))
+        return dict(tool_call, function=function)
+
+    def digest_tool_result(self, content: str) -> str:
+        """
+        Summarize a JSON tool result: success flag, error, item count and the
+        first items truncated, capped at `tool_digest_chars`.
+        """
+        try:
+            payload = json.loads(content)
+        except (TypeError, ValueError):
+            return content[:self.tool_digest_chars]
+        if not isinstance(payload, dict):
+            return json.dumps({'digest': True, 'preview': content[:self.tool_digest_chars]})
+
+        digest: Dict[str, Any] = {'digest': True}
+        for key in ('success', 'error', 'message'):
+            if key in payload:
+                digest[key] = payload[key]
+        data = payload.get('data')
+        if isinstance(data, list):
+            digest['count'] = len(data)
+            data = data[:3]
+        digest['preview'] = json.dumps(data, separators=(',', ':'))[:self.tool_digest_chars // 2] if data is not None else None
+        return json.dumps(digest, ensure_ascii=False)[:self.tool_digest_chars]
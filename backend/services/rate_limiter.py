@@ -0,0 +1,311 @@
+"""
+Rate Limiter for Amadeus API calls
+Client-side token buckets that queue calls to stay under the upstream
+per-second quotas, plus the retry policy for throttled/failed calls
+
+Buckets live in process memory by default; a SQLite store lets several
+worker processes on one host share the same buckets.
+"""
+
+import os
+import time
+import random
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a call would have to queue longer than the limiter's max wait."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Callers reserve a token and sleep until it is
+    available, so concurrent callers are served in reservation order.
+    """
+
+    def __init__(self, rate: float, burst: float = 1):
+        """
+        Initialize the bucket, full.
+
+        Args:
+            rate: Tokens added per second
+            burst: Bucket capacity
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        Take a token, possibly from the future.
+
+        Returns:
+            Seconds to wait before the token is usable, or None (nothing
+            reserved) if that would exceed `max_wait`
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def refund(self):
+        """Return a token taken by `reserve` that will not be used."""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets kept in a SQLite file, shared by the worker processes of
+    one host. Each reservation is a short IMMEDIATE transaction.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the store, creating the table if needed.
+
+        Args:
+            path: Path of the SQLite database file
+        """
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_buckets ('
+                'name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection (sqlite3 connections are not shareable across threads)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def reserve(self, name: str, rate: float, burst: float, max_wait: Optional[float] = None) -> Optional[float]:
+        """Same contract as TokenBucket.reserve, for the bucket called `name`."""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Wall-clock time: monotonic clocks are not comparable across processes
+            now = time.time()
+            row = conn.execute('SELECT tokens, updated FROM rate_buckets WHERE name = ?', (name,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            wait = max(0.0, (1 - tokens) / rate)
+            if max_wait is not None and wait > max_wait:
+                conn.execute('ROLLBACK')
+                return None
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_buckets (name, tokens, updated) VALUES (?, ?, ?)',
+                (name, tokens - 1, now)
+            )
+            conn.execute('COMMIT')
+            return wait
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def refund(self, name: str, burst: float):
+        """Same contract as TokenBucket.refund, for the bucket called `name`."""
+        conn = self._connection()
+        conn.execute('UPDATE rate_buckets SET tokens = MIN(?, tokens + 1) WHERE name = ?', (burst, name))
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter for throttled (429) and transient
+    (5xx, network) failures; an upstream Retry-After is honored as a minimum.
+    """
+
+    RETRY_STATUSES = (None, 429, 500, 502, 503, 504)
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        """
+        Initialize the policy.
+
+        Args:
+            max_retries: Retries after the first attempt
+            base_delay: Backoff ceiling for the first retry, doubled on each retry
+            max_delay: Upper bound of any single delay
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, status: Optional[int], attempt: int) -> bool:
+        return status in self.RETRY_STATUSES and attempt < self.max_retries
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to sleep before retry number `attempt + 1`."""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            return min(self.max_delay, max(retry_after, backoff))
+        return backoff
+
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """Read a Retry-After header given in seconds (HTTP-date values are ignored)."""
+    if not headers:
+        return None
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Per-endpoint token buckets plus an optional bucket shared by all
+    endpoints ('*'), with queue depth and wait-time metrics per endpoint.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, float],
+        burst: float = 1,
+        max_wait: Optional[float] = None,
+        store: Optional[SQLiteBucketStore] = None
+    ):
+        """
+        Initialize the limiter.
+
+        Args:
+            limits: Requests per second by endpoint; '*' applies to every call
+            burst: Bucket capacity (calls allowed back to back after idling)
+            max_wait: Longest a call may queue before RateLimitTimeout is raised
+            store: Shared bucket store (defaults to in-process buckets)
+        """
+        self.limits = {name: qps for name, qps in limits.items() if qps and qps > 0}
+        self.burst = burst
+        self.max_wait = max_wait
+        self.store = store
+        self._buckets: Dict[str, TokenBucket] = {
+            name: TokenBucket(qps, burst) for name, qps in self.limits.items()
+        }
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+
+    def _counters(self, endpoint: str) -> Dict[str, float]:
+        """Counters for `endpoint`. Caller holds the stats lock."""
+        return self._stats.setdefault(endpoint, {
+            'requests': 0, 'queued': 0, 'queue_depth': 0, 'max_queue_depth': 0,
+            'wait_total_ms': 0.0, 'wait_max_ms': 0.0, 'retries': 0, 'throttled': 0, 'rejected': 0
+        })
+
+    def _reserve(self, name: str, max_wait: Optional[float]) -> Optional[float]:
+        if self.store is not None:
+            return self.store.reserve(name, self.limits[name], self.burst, max_wait)
+        return self._buckets[name].reserve(max_wait)
+
+    def _refund(self, name: str):
+        if self.store is not None:
+            self.store.refund(name, self.burst)
+        else:
+            self._buckets[name].refund()
+
+    def acquire(self, endpoint: str) -> float:
+        """
+        Block until `endpoint` may be called.
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            RateLimitTimeout: if the wait would exceed `max_wait`
+        """
+        wait = 0.0
+        taken = []
+        for name in ('*', endpoint):
+            if name not in self.limits:
+                continue
+            reserved = self._reserve(name, self.max_wait)
+            if reserved is None:
+                # The call will not be made: give back the tokens already taken
+                for bucket in taken:
+                    self._refund(bucket)
+                with self._stats_lock:
+                    self._counters(endpoint)['rejected'] += 1
+                raise RateLimitTimeout(f"Rate limit queue for {endpoint} is longer than {self.max_wait}s")
+            taken.append(name)
+            wait = max(wait, reserved)
+
+        with self._stats_lock:
+            counters = self._counters(endpoint)
+            counters['requests'] += 1
+            if wait > 0:
+                counters['queued'] += 1
+                counters['queue_depth'] += 1
+                counters['max_queue_depth'] = max(counters['max_queue_depth'], counters['queue_depth'])
+        if wait > 0:
+            try:
+                time.sleep(wait)
+            finally:
+                with self._stats_lock:
+                    counters = self._counters(endpoint)
+                    counters['queue_depth'] -= 1
+                    counters['wait_total_ms'] += wait * 1000
+                    counters['wait_max_ms'] = max(counters['wait_max_ms'], wait * 1000)
+        return wait
+
+    def record_retry(self, endpoint: str, status: Optional[int]):
+        with self._stats_lock:
+            counters = self._counters(endpoint)
+            counters['retries'] += 1
+            if status == 429:
+                counters['throttled'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-endpoint counters; wait totals and maxima are in milliseconds."""
+        with self._stats_lock:
+            endpoints = {name: dict(counters) for name, counters in self._stats.items()}
+        for counters in endpoints.values():
+            counters['wait_avg_ms'] = round(counters['wait_total_ms'] / counters['queued'], 1) if counters['queued'] else 0.0
+        return {'limits': dict(self.limits), 'endpoints': endpoints}
+
+
+_default_limiter: Optional[RateLimiter] = None
+_SETTINGS = ('BURST', 'MAX_WAIT', 'BACKEND', 'PATH')
+_default_limiter_lock = threading.Lock()
+
+
+def get_default_rate_limiter(limits: Dict[str, float]) -> RateLimiter:
+    """
+    Return the process-wide Amadeus rate limiter, created on first use from
+    `limits` and the environment:
+        AMADEUS_RATE_LIMIT_QPS requests/second across all endpoints (overrides limits['*'])
+        AMADEUS_RATE_LIMIT_<METHOD_NAME> requests/second for one endpoint
+        AMADEUS_RATE_LIMIT_BURST (default 1)
+        AMADEUS_RATE_LIMIT_MAX_WAIT seconds a call may queue (default 10)
+        AMADEUS_RATE_LIMIT_BACKEND 'local' or 'sqlite' (default 'local')
+        AMADEUS_RATE_LIMIT_PATH SQLite file for the shared backend (default 'amadeus_ratelimit.sqlite3')
+    """
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            configured = dict(limits)
+            for key, value in os.environ.items():
+                name = key[len('AMADEUS_RATE_LIMIT_'):]
+                if key.startswith('AMADEUS_RATE_LIMIT_') and name not in _SETTINGS:
+                    configured['*' if name == 'QPS' else name.lower()] = float(value)
+            store = None
+            if os.getenv('AMADEUS_RATE_LIMIT_BACKEND', 'local') == 'sqlite':
+                store = SQLiteBucketStore(os.getenv('AMADEUS_RATE_LIMIT_PATH', 'amadeus_ratelimit.sqlite3'))
+            _default_limiter = RateLimiter(
+                configured,
+                burst=float(os.getenv('AMADEUS_RATE_LIMIT_BURST', '1')),
+                max_wait=float(os.getenv('AMADEUS_RATE_LIMIT_MAX_WAIT', '10')),
+                store=store
+            )
+        return _default_limiter
@@ -0,0 +1,464 @@
+"""
+Response Cache for Amadeus API calls
+In-process LRU with per-entry TTL, plus an optional shared SQLite store
+
+Reference data (airports, cities, airlines, routes) changes on the order of
+days, so identical lookups are answered from the cache instead of Amadeus.
+Offer searches use a short TTL and single-flight coalescing, so concurrent
+identical searches share one upstream request. Expired entries are kept for
+a stale window and served (marked `stale`) while Amadeus' circuit is open.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from services.circuit_breaker import CircuitOpenError
+from services.tool_registry import current_tool
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache whose entries expire after a TTL and
+    can optionally be read for `stale_ttl` seconds longer via get_stale.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of entries kept before evicting the least recently used
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        """Return the cached value, or `_MISSING` if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at, stale_until = entry
+            now = time.time()
+            if expires_at <= now:
+                if stale_until <= now:
+                    del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def get_stale(self, key: str) -> Any:
+        """Return `(value, expires_at)` even if expired, as long as it is within its stale window, else `_MISSING`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= time.time():
+                return _MISSING
+            return entry[0], entry[1]
+
+    def set(self, key: str, value: Any, ttl: float, stale_ttl: float = 0):
+        """Store a value for `ttl` (+ `stale_ttl`) seconds, evicting the oldest entries if full."""
+        with self._lock:
+            expires_at = time.time() + ttl
+            self._entries[key] = (value, expires_at, expires_at + stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    Shared cache store backed by a SQLite file, usable by several worker
+    processes on the same host. Values must be JSON-serializable.
+    """
+
+    def __init__(self, path: str, stale_ttl: float = 0):
+        """
+        Initialize the store, creating the table if needed.
+
+        Args:
+            path: Path of the SQLite database file
+            stale_ttl: Seconds expired rows stay readable with `allow_stale`
+        """
+        self.path = path
+        self.stale_ttl = stale_ttl
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS response_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection (sqlite3 connections are not shareable across threads)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get_entry(self, key: str, allow_stale: bool = False) -> Optional[Tuple[Any, float]]:
+        """Return `(value, expires_at)`, or None if absent or expired (beyond the stale window with `allow_stale`)."""
+        row = self._connection().execute(
+            'SELECT value, expires_at FROM response_cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or row[1] + (self.stale_ttl if allow_stale else 0) <= time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def get(self, key: str) -> Any:
+        """Return the stored value, or `_MISSING` if absent or expired."""
+        entry = self.get_entry(key)
+        return _MISSING if entry is None else entry[0]
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), time.time() + ttl)
+            )
+
+    def increment(self, key: str, ttl: float) -> int:
+        """
+        Atomically add one to an integer value, counting from zero if it is
+        absent or expired, and keep it for another `ttl` seconds.
+
+        Returns:
+            The new value
+        """
+        conn = self._connection()
+        now = time.time()
+        # Takes the write lock before reading, so concurrent increments serialize
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT value, expires_at FROM response_cache WHERE key = ?', (key,)).fetchone()
+            value = json.loads(row[0]) + 1 if row is not None and row[1] > now else 1
+            conn.execute(
+                'INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), now + ttl)
+            )
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        return value
+
+    def delete(self, key: str):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+
+    def purge_expired(self):
+        """Delete all rows past their stale window."""
+        with self._connection() as conn:
+            conn.execute('DELETE FROM response_cache WHERE expires_at <= ?', (time.time() - self.stale_ttl,))
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM response_cache')
+
+
+class _InFlightCall:
+    """A call in progress that other callers with the same key can wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function, later callers block until it finishes and receive its result.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _InFlightCall] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run `fn` once per key among concurrent callers.
+
+        Args:
+            key: Coalescing key
+            fn: Zero-argument function producing the result
+
+        Returns:
+            Tuple of (result, shared), where `shared` is True for callers that
+            received another caller's result
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _InFlightCall()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+
+class ResponseCache:
+    """
+    Two-tier response cache: an in-process LRU in front of an optional
+    shared backend, with hit/miss counters per endpoint.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        shared: Optional[SQLiteCacheBackend] = None,
+        stale_ttl: float = 0
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Capacity of the in-process LRU tier
+            shared: Optional shared backend consulted on local misses
+            stale_ttl: Seconds expired entries remain available to get_stale (0 disables)
+        """
+        self.local = LRUCache(max_entries)
+        self.shared = shared
+        self.stale_ttl = stale_ttl
+        self.single_flight = SingleFlight()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, endpoint: str, counter: str):
+        with self._stats_lock:
+            counters = self._stats.setdefault(
+                endpoint, {'hits': 0, 'shared_hits': 0, 'misses': 0, 'bypasses': 0, 'coalesced': 0, 'stale_hits': 0}
+            )
+            counters[counter] += 1
+
+    def get(self, endpoint: str, key: str) -> Any:
+        """
+        Look a key up in the local tier, then the shared tier.
+
+        Returns:
+            The cached value, or `_MISSING`
+        """
+        value = self.local.get(key)
+        if value is not _MISSING:
+            self._count(endpoint, 'hits')
+            return value
+        if self.shared is not None:
+            entry = self.shared.get_entry(key)
+            if entry is not None:
+                value, expires_at = entry
+                self._count(endpoint, 'shared_hits')
+                self.local.set(key, value, expires_at - time.time(), self.stale_ttl)
+                return value
+        self._count(endpoint, 'misses')
+        return _MISSING
+
+    def get_stale(self, endpoint: str, key: str, max_stale: Optional[float] = None) -> Any:
+        """
+        Look a key up ignoring expiry, within the stale window (used while the upstream is unavailable).
+
+        Args:
+            endpoint: Endpoint name, for statistics
+            key: Cache key
+            max_stale: Seconds past expiry accepted for this endpoint (default: the whole stale window)
+
+        Returns:
+            `(value, expires_at)`, or `_MISSING`
+        """
+        max_stale = self.stale_ttl if max_stale is None else min(max_stale, self.stale_ttl)
+        if not max_stale:
+            return _MISSING
+        entry = self.local.get_stale(key)
+        if entry is _MISSING and self.shared is not None:
+            entry = self.shared.get_entry(key, allow_stale=True) or _MISSING
+        if entry is _MISSING or time.time() - entry[1] > max_stale:
+            return _MISSING
+        self._count(endpoint, 'stale_hits')
+        return entry
+
+    def set(self, endpoint: str, key: str, value: Any, ttl: float):
+        """Store a value in both tiers."""
+        self.local.set(key, value, ttl, self.stale_ttl)
+        if self.shared is not None:
+            self.shared.set(key, value, ttl)
+
+    def record_bypass(self, endpoint: str):
+        self._count(endpoint, 'bypasses')
+
+    def record_coalesced(self, endpoint: str):
+        self._count(endpoint, 'coalesced')
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-endpoint counters and the local tier size."""
+        with self._stats_lock:
+            endpoints = {name: dict(counters) for name, counters in self._stats.items()}
+        return {'local_entries': len(self.local), 'endpoints': endpoints}
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> ResponseCache:
+    """
+    Return the process-wide response cache, configured from the environment:
+        AMADEUS_CACHE_MAX_ENTRIES (default 2048)
+        AMADEUS_CACHE_BACKEND 'local' or 'sqlite' (default 'local')
+        AMADEUS_CACHE_PATH SQLite file for the shared backend (default 'amadeus_cache.sqlite3')
+        AMADEUS_CACHE_STALE_SECONDS expired entries kept for serve-stale (default 86400, 0 disables)
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            stale_ttl = float(os.getenv('AMADEUS_CACHE_STALE_SECONDS', str(24 * 3600)))
+            shared = None
+            if os.getenv('AMADEUS_CACHE_BACKEND', 'local') == 'sqlite':
+                shared = SQLiteCacheBackend(os.getenv('AMADEUS_CACHE_PATH', 'amadeus_cache.sqlite3'), stale_ttl)
+            _default_cache = ResponseCache(
+                max_entries=int(os.getenv('AMADEUS_CACHE_MAX_ENTRIES', '2048')),
+                shared=shared,
+                stale_ttl=stale_ttl
+            )
+        return _default_cache
+
+
+def _normalize(value: Any) -> Any:
+    """Normalize an argument so equivalent calls map to the same key."""
+    if isinstance(value, str):
+        return value.strip().casefold()
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    return value
+
+
+def make_cache_key(endpoint: str, signature: inspect.Signature, args: tuple, kwargs: dict) -> str:
+    """
+    Build a cache key from the endpoint name and the fully bound, normalized call arguments.
+
+    Args:
+        endpoint: Endpoint (method) name
+        signature: Signature of the wrapped method
+        args: Positional arguments, including `self`
+        kwargs: Keyword arguments
+    """
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = {name: _normalize(value) for name, value in bound.arguments.items() if name != 'self'}
+    digest = hashlib.sha256(json.dumps(arguments, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f"{endpoint}:{digest[:32]}"
+
+
+def cached_response(coalesce: bool = False) -> Callable:
+    """
+    Decorator for AmadeusService methods returning `{'success': ..., ...}` dicts.
+
+    The endpoint is the method name; its TTL is read from `self.cache_ttls`
+    (a missing or zero TTL disables caching). Only successful responses are
+    stored. Callers can pass `use_cache=False` to skip the cache for one call;
+    calls made by a tool declared with `cacheable=False` always skip it.
+    Cached values are shared between callers and must be treated as read-only.
+    If the call fails fast because the upstream circuit is open, an expired
+    entry still within the endpoint's stale window (`self.stale_windows`,
+    else the cache's) is returned with `'stale': True` and its age in
+    `'stale_age_seconds'`.
+
+    Args:
+        coalesce: Collapse concurrent identical cache misses into one upstream call
+    """
+    def decorator(func: Callable) -> Callable:
+        endpoint = func.__name__
+        signature = inspect.signature(func)
+
+        def lookup(self, args: tuple, kwargs: dict, use_cache: bool) -> Tuple[Optional[ResponseCache], str, Any]:
+            """Return (cache, key, cached value); cache is None when this call is not cached."""
+            cache: Optional[ResponseCache] = getattr(self, 'cache', None)
+            if cache is None or not self.cache_ttls.get(endpoint):
+                return None, '', _MISSING
+            tool_spec = current_tool()
+            if not use_cache or (tool_spec is not None and not tool_spec.cacheable):
+                cache.record_bypass(endpoint)
+                return None, '', _MISSING
+            key = make_cache_key(endpoint, signature, (self,) + args, kwargs)
+            return cache, key, cache.get(endpoint, key)
+
+        def store(self, cache: ResponseCache, key: str, result: Dict[str, Any]):
+            if result.get('success'):
+                cache.set(endpoint, key, result, self.cache_ttls[endpoint])
+
+        def stale_or_raise(self, cache: ResponseCache, key: str, error: CircuitOpenError) -> Dict[str, Any]:
+            entry = cache.get_stale(endpoint, key, getattr(self, 'stale_windows', {}).get(endpoint))
+            if entry is _MISSING:
+                raise error
+            value, expires_at = entry
+            fetched_at = expires_at - self.cache_ttls[endpoint]
+            return dict(value, stale=True, stale_age_seconds=int(time.time() - fetched_at))
+
+        @functools.wraps(func)
+        def wrapper(self, *args, use_cache: bool = True, **kwargs):
+            cache, key, cached = lookup(self, args, kwargs, use_cache)
+            if cache is None:
+                return func(self, *args, **kwargs)
+            if cached is not _MISSING:
+                return cached
+
+            def load() -> Dict[str, Any]:
+                result = func(self, *args, **kwargs)
+                store(self, cache, key, result)
+                return result
+
+            try:
+                if not coalesce:
+                    return load()
+                result, shared = cache.single_flight.do(key, load)
+            except CircuitOpenError as error:
+                return stale_or_raise(self, cache, key, error)
+            if shared:
+                cache.record_coalesced(endpoint)
+            return result
+
+        return wrapper
+    return decorator
@@ -0,0 +1,231 @@
+"""
+Route Graph for connection discovery
+Keeps Amadeus direct-destination lists as a graph and answers connection queries locally
+
+Every airport seen gets an integer index; an airport's direct destinations
+are a sorted array of indexes, refreshed on its own when older than the TTL
+(incremental refresh: a query only re-fetches the airports it needs). Airports
+whose own list has not been fetched yet are assumed to fly back to every
+airport that lists them, since scheduled routes almost always run both ways.
+The same holds for lists known to be partial (cut off at a result limit):
+their airports also fly to every airport listing them.
+"""
+
+import os
+import time
+import bisect
+import threading
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from services.geo_tiling import haversine_km
+
+
+Locator = Callable[[str], Optional[Tuple[float, float]]]
+
+
+class RouteGraph:
+    """Directed airport graph with adjacency arrays keyed by airport index."""
+
+    def __init__(self, ttl: float = 24 * 3600):
+        """
+        Initialize an empty graph.
+
+        Args:
+            ttl: Seconds before an airport's direct-destination list is stale
+        """
+        self.ttl = ttl
+        self.codes: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._outbound: List[array] = []
+        self._inbound: List[Set[int]] = []
+        self._fetched_at = array('d')
+        self._partial: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _node(self, code: str) -> int:
+        index = self._index.get(code)
+        if index is None:
+            index = len(self.codes)
+            self._index[code] = index
+            self.codes.append(code)
+            self._outbound.append(array('I'))
+            self._inbound.append(set())
+            self._fetched_at.append(0.0)
+        return index
+
+    def set_destinations(self, code: str, destinations: Iterable[str], partial: bool = False):
+        """
+        Replace an airport's direct destinations with a freshly fetched list.
+
+        Args:
+            code: Airport IATA code
+            destinations: IATA codes of its direct destinations
+            partial: The list may be incomplete (e.g. truncated by a result limit)
+        """
+        with self._lock:
+            source = self._node(code.upper())
+            for target in self._outbound[source]:
+                self._inbound[target].discard(source)
+            targets = sorted({self._node(destination.upper()) for destination in destinations} - {source})
+            self._outbound[source] = array('I', targets)
+            for target in targets:
+                self._inbound[target].add(source)
+            self._fetched_at[source] = time.time()
+            if partial:
+                self._partial.add(source)
+            else:
+                self._partial.discard(source)
+
+    def is_fresh(self, code: str) -> bool:
+        index = self._index.get(code.upper())
+        return index is not None and time.time() - self._fetched_at[index] < self.ttl
+
+    def stale(self, codes: Iterable[str]) -> List[str]:
+        """Codes whose direct destinations are unknown or older than the TTL, in input order."""
+        return [code for code in dict.fromkeys(code.upper() for code in codes) if not self.is_fresh(code)]
+
+    def _out(self, index: int) -> Iterable[int]:
+        if not self._fetched_at[index]:
+            return sorted(self._inbound[index])
+        if index in self._partial:
+            return sorted(self._inbound[index].union(self._outbound[index]))
+        return self._outbound[index]
+
+    def _has_edge(self, source: int, target: int) -> bool:
+        if self._fetched_at[source]:
+            outbound = self._outbound[source]
+            position = bisect.bisect_left(outbound, target)
+            if position < len(outbound) and outbound[position] == target:
+                return True
+            if source not in self._partial:
+                return False
+        return target in self._inbound[source]
+
+    def destinations(self, code: str) -> List[str]:
+        """Known direct destinations of an airport."""
+        index = self._index.get(code.upper())
+        return [] if index is None else [self.codes[target] for target in self._out(index)]
+
+    def hubs(self, origin: str, destination: str, locate: Locator, limit: int) -> List[str]:
+        """
+        Direct destinations of `origin` worth expanding for two-stop
+        connections: those already reaching `destination` are skipped, the
+        rest ranked by detour (origin to hub to destination vs. great circle).
+        """
+        with self._lock:
+            origin_index = self._index.get(origin.upper())
+            destination_index = self._index.get(destination.upper())
+            if origin_index is None or destination_index is None:
+                return []
+            candidates = [
+                hub for hub in self._out(origin_index)
+                if hub != destination_index and not self._has_edge(hub, destination_index)
+            ]
+            codes = [self.codes[hub] for hub in candidates]
+        start, end = locate(origin), locate(destination)
+
+        def detour(code: str) -> float:
+            point = locate(code)
+            if start is None or end is None or point is None:
+                return float('inf')
+            return haversine_km(*start, *point) + haversine_km(*point, *end)
+
+        return sorted(codes, key=detour)[:limit]
+
+    def connections(
+        self,
+        origin: str,
+        destination: str,
+        locate: Locator,
+        max_stops: int = 1,
+        k: int = 5
+    ) -> List[Dict]:
+        """
+        The k shortest routes from origin to destination with at most
+        `max_stops` intermediate airports.
+
+        Routes are weighted by great-circle distance. With a stop limit of
+        two, all candidate paths are enumerated and ranked, which is exact and
+        cheaper than a general k-shortest-paths search on graphs this size.
+        Routes with an airport of unknown position rank after the others by
+        number of stops.
+
+        Args:
+            origin: Origin IATA code
+            destination: Destination IATA code
+            locate: Function returning (latitude, longitude) for a code, or None
+            max_stops: Maximum number of intermediate airports (0-2)
+            k: Number of routes to return
+
+        Returns:
+            Routes as dicts with `route` (codes), `stops`, `distanceKm` and `legs`
+        """
+        with self._lock:
+            origin_index = self._index.get(origin.upper())
+            destination_index = self._index.get(destination.upper())
+            if origin_index is None or destination_index is None or origin_index == destination_index:
+                return []
+            paths: List[List[int]] = []
+
+            def extend(path: List[int], stops_left: int):
+                if self._has_edge(path[-1], destination_index):
+                    paths.append(path + [destination_index])
+                if stops_left == 0:
+                    return
+                for hub in self._out(path[-1]):
+                    if hub != destination_index and hub not in path:
+                        extend(path + [hub], stops_left - 1)
+
+            extend([origin_index], max(0, min(max_stops, 2)))
+            routes = [[self.codes[index] for index in path] for path in paths]
+
+        ranked = []
+        for route in routes:
+            points = [locate(code) for code in route]
+            legs = [
+                {
+                    'from': route[i],
+                    'to': route[i + 1],
+                    'distanceKm': round(haversine_km(*points[i], *points[i + 1])) if points[i] and points[i + 1] else None
+                }
+                for i in range(len(route) - 1)
+            ]
+            known = all(leg['distanceKm'] is not None for leg in legs)
+            distance = sum(leg['distanceKm'] for leg in legs) if known else None
+            ranked.append(((not known, distance if known else len(route), route), {
+                'route': route,
+                'stops': len(route) - 2,
+                'distanceKm': distance,
+                'legs': legs
+            }))
+        ranked.sort(key=lambda item: item[0])
+        return [route for _, route in ranked[:k]]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'airports': len(self.codes),
+                'fetched': sum(1 for fetched_at in self._fetched_at if fetched_at),
+                'partial': len(self._partial),
+                'routes': sum(len(outbound) for outbound in self._outbound)
+            }
+
+
+_default_graph: Optional[RouteGraph] = None
+_default_lock = threading.Lock()
+
+
+def get_default_route_graph() -> RouteGraph:
+    """
+    Return the process-wide route graph, configured from the environment:
+        ROUTE_GRAPH_TTL seconds before an airport's destinations are re-fetched (default 86400)
+    """
+    global _default_graph
+    with _default_lock:
+        if _default_graph is None:
+            _default_graph = RouteGraph(ttl=float(os.getenv('ROUTE_GRAPH_TTL', str(24 * 3600))))
+        return _default_graph
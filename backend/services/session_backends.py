@@ -0,0 +1,350 @@
+"""
+Shared Session Backends for chat sessions
+Let several workers/nodes serve one conversation, with optimistic versioning
+
+Every save names the version it was based on; if another worker saved the
+session in the meantime the save is rejected with SessionConflict instead of
+silently overwriting that worker's turn.
+"""
+
+import os
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F, Q
+
+from apps.chat.models import ChatSession, ChatMessage
+
+try:
+    import redis
+except ImportError:  # optional dependency, only needed for CHAT_SESSION_BACKEND=redis
+    redis = None
+
+_WatchError = redis.WatchError if redis is not None else ()
+
+
+def _recent_turns(history: List[Dict[str, Any]], turns: Optional[int]) -> List[Dict[str, Any]]:
+    """The last `turns` turns of `history` (each starting at a user message); all of it if `turns` is None."""
+    if turns is None:
+        return history
+    seen = 0
+    for index in range(len(history) - 1, -1, -1):
+        if history[index]['role'] == 'user':
+            seen += 1
+            if seen == turns:
+                return history[index:]
+    return history
+
+
+def _trim_saved(session: Dict[str, Any], turns: Optional[int]):
+    """Drop turns older than the window from a session whose history is fully saved."""
+    session['history'] = _recent_turns(session['history'], turns)
+    session['persisted'] = len(session['history'])
+
+
+class SessionConflict(Exception):
+    """Raised when a session was saved by someone else since it was loaded."""
+
+
+class SessionBackend(ABC):
+    """
+    Interface for shared session storage.
+
+    Sessions are dicts with at least `id`, `state`, `history`, `version`,
+    `db_id` and `persisted` (number of history messages stored as ChatMessage rows).
+    Async methods default to running the sync ones in a worker thread.
+    """
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def version(self, session_id: str) -> Optional[int]:
+        """Return the current version without loading the session, or None if unknown."""
+
+    @abstractmethod
+    def create(self, session_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def save(self, session: Dict[str, Any], expected_version: int) -> int:
+        """
+        Save a session if its stored version still equals `expected_version`.
+
+        Returns:
+            The new version
+
+        Raises:
+            SessionConflict: if the session changed since it was loaded
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+    async def aload(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return await sync_to_async(self.load)(session_id)
+
+    async def aversion(self, session_id: str) -> Optional[int]:
+        return await sync_to_async(self.version)(session_id)
+
+    async def acreate(self, session_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        return await sync_to_async(self.create)(session_id, state)
+
+    async def asave(self, session: Dict[str, Any], expected_version: int) -> int:
+        return await sync_to_async(self.save)(session, expected_version)
+
+
+class DatabaseSessionBackend(SessionBackend):
+    """
+    Stores workflow state and version on ChatSession and history as ChatMessage rows.
+
+    Sessions are loaded with their last `history_turns` turns only; older
+    turns stay in the database. Every message of a loaded session is stored,
+    so `persisted` counts the loaded window.
+    """
+
+    def __init__(self, history_turns: Optional[int] = None):
+        """
+        Initialize the backend.
+
+        Args:
+            history_turns: Turns of history loaded with a session (None loads all)
+        """
+        self.history_turns = history_turns
+
+    def _history_queryset(self, db_id: int):
+        # Served by the (session, created_at) index as a single range scan
+        return ChatMessage.objects.filter(session_id=db_id).order_by('created_at', 'id')
+
+    def _window_start(self, db_id: int):
+        """One-row query for the `(created_at, id)` of the user message opening the window."""
+        return (
+            self._history_queryset(db_id).filter(role='user').reverse()
+            .values_list('created_at', 'id')[self.history_turns - 1:self.history_turns]
+        )
+
+    def _window_queryset(self, db_id: int, start: Optional[Tuple[Any, int]]):
+        rows = self._history_queryset(db_id)
+        if start is None:
+            return rows
+        created_at, row_id = start
+        return rows.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gte=row_id))
+
+    def _row_to_message(self, row: ChatMessage) -> Dict[str, Any]:
+        return {'role': row.role, 'content': row.content, **(row.metadata or {})}
+
+    def _to_session(self, db_session: ChatSession, history: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            'id': db_session.session_id,
+            'db_id': db_session.pk,
+            'version': db_session.version,
+            'history': history,
+            'persisted': len(history),
+            'state': db_session.workflow_state or {}
+        }
+
+    def _new_message_rows(self, session: Dict[str, Any]) -> List[ChatMessage]:
+        """ChatMessage rows for history appended since the last save; extra keys go to metadata."""
+        return [
+            ChatMessage(
+                session_id=session['db_id'],
+                role=message['role'],
+                content=message.get('content') or '',
+                metadata={k: v for k, v in message.items() if k not in ('role', 'content')}
+            )
+            for message in session['history'][session['persisted']:]
+        ]
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        db_session = ChatSession.objects.filter(session_id=session_id).first()
+        if not db_session:
+            return None
+        start = self._window_start(db_session.pk).first() if self.history_turns else None
+        history = [self._row_to_message(row) for row in self._window_queryset(db_session.pk, start)]
+        return self._to_session(db_session, history)
+
+    async def aload(self, session_id: str) -> Optional[Dict[str, Any]]:
+        db_session = await ChatSession.objects.filter(session_id=session_id).afirst()
+        if not db_session:
+            return None
+        start = await self._window_start(db_session.pk).afirst() if self.history_turns else None
+        history = [self._row_to_message(row) async for row in self._window_queryset(db_session.pk, start)]
+        return self._to_session(db_session, history)
+
+    def version(self, session_id: str) -> Optional[int]:
+        return ChatSession.objects.filter(session_id=session_id).values_list('version', flat=True).first()
+
+    async def aversion(self, session_id: str) -> Optional[int]:
+        return await ChatSession.objects.filter(session_id=session_id).values_list('version', flat=True).afirst()
+
+    def create(self, session_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        db_session, _ = ChatSession.objects.get_or_create(session_id=session_id, defaults={'workflow_state': state})
+        return self._to_session(db_session, [])
+
+    async def acreate(self, session_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        db_session, _ = await ChatSession.objects.aget_or_create(session_id=session_id, defaults={'workflow_state': state})
+        return self._to_session(db_session, [])
+
+    def save(self, session: Dict[str, Any], expected_version: int) -> int:
+        rows = self._new_message_rows(session)
+        with transaction.atomic():
+            updated = ChatSession.objects.filter(session_id=session['id'], version=expected_version).update(
+                workflow_state=session['state'],
+                version=F('version') + 1
+            )
+            if not updated:
+                raise SessionConflict(f"Session {session['id']} was modified concurrently")
+            if rows:
+                ChatMessage.objects.bulk_create(rows)
+        _trim_saved(session, self.history_turns)
+        session['version'] = expected_version + 1
+        return session['version']
+
+    def delete(self, session_id: str):
+        ChatSession.objects.filter(session_id=session_id).delete()
+
+
+class RedisSessionBackend(SessionBackend):
+    """
+    Keeps the full session in a Redis hash (`version` and `session` fields)
+    so any worker can resume it without reloading history from the DB.
+
+    Saves write through to a DatabaseSessionBackend, which stays the durable
+    record and serves sessions whose Redis key expired. Its version-conditional
+    update is the compare-and-set; the Redis hash is updated (under WATCH)
+    before that transaction commits, so the two cannot be left at different
+    versions by competing saves. Works with any client speaking the redis-py
+    API, e.g. a local redis-server or a fakeredis stand-in.
+    """
+
+    def __init__(
+        self,
+        client: Any = None,
+        url: Optional[str] = None,
+        durable: Optional[DatabaseSessionBackend] = None,
+        prefix: str = 'skypath:session:',
+        ttl: int = 24 * 3600
+    ):
+        """
+        Initialize the backend.
+
+        Args:
+            client: redis-py compatible client (defaults to one built from `url`)
+            url: Redis URL, used when no client is given
+            durable: Durable backend written through on every save
+            prefix: Key prefix for session hashes
+            ttl: Seconds a session stays in Redis after its last save
+        """
+        if client is None:
+            if redis is None:
+                raise ValueError("The redis package is required for the Redis session backend.")
+            client = redis.Redis.from_url(url or 'redis://localhost:6379/0')
+        self.client = client
+        self.durable = durable or DatabaseSessionBackend()
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    def _store(self, pipe: Any, session: Dict[str, Any], version: int):
+        key = self._key(session['id'])
+        # Everything in history is in the DB once the write-through completes
+        stored = dict(session, version=version)
+        _trim_saved(stored, self.durable.history_turns)
+        pipe.hset(key, mapping={'version': version, 'session': json.dumps(stored)})
+        pipe.expire(key, self.ttl)
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        key = self._key(session_id)
+        blob = self.client.hget(key, 'session')
+        if blob is not None:
+            return json.loads(blob)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    # Watched before reading the DB, so a save landing meanwhile aborts the refill
+                    pipe.watch(key)
+                    blob = pipe.hget(key, 'session')
+                    if blob is not None:
+                        return json.loads(blob)
+                    session = self.durable.load(session_id)
+                    if session is None:
+                        return None
+                    pipe.multi()
+                    self._store(pipe, session, session['version'])
+                    pipe.execute()
+                    return session
+                except _WatchError:
+                    continue
+
+    def version(self, session_id: str) -> Optional[int]:
+        version = self.client.hget(self._key(session_id), 'version')
+        if version is not None:
+            return int(version)
+        return self.durable.version(session_id)
+
+    def create(self, session_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        return self.durable.create(session_id, state)
+
+    def save(self, session: Dict[str, Any], expected_version: int) -> int:
+        key = self._key(session['id'])
+        new_version = expected_version + 1
+        cached = stale = False
+        try:
+            with self.client.pipeline() as pipe, transaction.atomic():
+                pipe.watch(key)
+                current = pipe.hget(key, 'version')
+                if current is not None and int(current) != expected_version:
+                    raise SessionConflict(f"Session {session['id']} was modified concurrently")
+                # Holds the session row lock until Redis is updated; rolled back if that fails
+                try:
+                    self.durable.save(dict(session), expected_version)
+                except SessionConflict:
+                    stale = True
+                    raise
+                pipe.multi()
+                self._store(pipe, session, new_version)
+                pipe.execute()
+                cached = True
+        except _WatchError as e:
+            raise SessionConflict(f"Session {session['id']} was modified concurrently") from e
+        except Exception:
+            if cached or stale:
+                # Redis is ahead of (failed commit) or behind (conflict) the DB;
+                # drop it so the next load rebuilds it from the durable record
+                self.client.delete(key)
+            raise
+        _trim_saved(session, self.durable.history_turns)
+        session['version'] = new_version
+        return new_version
+
+    def delete(self, session_id: str):
+        self.client.delete(self._key(session_id))
+        self.durable.delete(session_id)
+
+
+def get_session_backend() -> SessionBackend:
+    """
+    Build the session backend configured by the environment:
+        CHAT_SESSION_BACKEND 'db' or 'redis' (default 'db')
+        CHAT_SESSION_REDIS_URL (default 'redis://localhost:6379/0')
+        CHAT_SESSION_REDIS_TTL seconds (default 86400)
+        CHAT_HISTORY_TURNS turns of history loaded per session (default 20,
+            0 loads all); the prompt builder drops turns beyond its token
+            budget anyway, so this only needs to cover what a prompt can hold
+    """
+    history_turns = int(os.getenv('CHAT_HISTORY_TURNS', '20')) or None
+    durable = DatabaseSessionBackend(history_turns=history_turns)
+    if os.getenv('CHAT_SESSION_BACKEND', 'db') == 'redis':
+        return RedisSessionBackend(
+            url=os.getenv('CHAT_SESSION_REDIS_URL', 'redis://localhost:6379/0'),
+            durable=durable,
+            ttl=int(os.getenv('CHAT_SESSION_REDIS_TTL', str(24 * 3600)))
+        )
+    return durable
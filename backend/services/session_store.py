@@ -0,0 +1,200 @@
+"""
+Session Store for chat sessions
+Bounded in-process tier with LRU + idle-TTL eviction and size accounting
+"""
+
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# id(message) -> (message, encoded size); holding the message keeps its id from being reused
+_MessageSizes = Dict[int, Tuple[Dict[str, Any], int]]
+
+
+class _Entry:
+    __slots__ = ('session', 'size', 'message_sizes', 'last_access', 'pins')
+
+    def __init__(self, session: Dict[str, Any], size: int, message_sizes: _MessageSizes):
+        self.session = session
+        self.size = size
+        self.message_sizes = message_sizes
+        self.last_access = time.monotonic()
+        self.pins = 0
+
+
+class LocalSessionStore:
+    """
+    In-process session cache capped by entry count and estimated bytes.
+
+    Least recently used sessions are evicted when a cap is exceeded, and
+    sessions idle for longer than `idle_ttl` expire. Evicted sessions are
+    handed to `on_evict` (outside the store lock) so they can be flushed to
+    the database. Pinned sessions (a turn in progress) are never evicted.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        idle_ttl: float = 1800,
+        on_evict: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            max_entries: Maximum number of resident sessions
+            max_bytes: Maximum estimated size of all resident sessions
+            idle_ttl: Seconds without access after which a session expires
+            on_evict: Called with each evicted or expired session
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _measure(session: Dict[str, Any], known: _MessageSizes) -> Tuple[int, _MessageSizes]:
+        """
+        Approximate a session's footprint by the length of its JSON encoding.
+
+        History messages already measured for the previous version of the
+        session (working copies share them) are not encoded again, so a put
+        after a turn only encodes that turn's messages and the state.
+        """
+        sizes: _MessageSizes = {}
+        for message in session.get('history', ()):
+            seen = known.get(id(message))
+            if seen is None or seen[0] is not message:
+                seen = (message, len(json.dumps(message, default=str)))
+            sizes[id(message)] = seen
+        rest = {key: value for key, value in session.items() if key != 'history'}
+        return len(json.dumps(rest, default=str)) + sum(size for _, size in sizes.values()), sizes
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return a resident session and mark it recently used, or None."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end(session_id)
+            return entry.session
+
+    def put(self, session_id: str, session: Dict[str, Any]):
+        """
+        Insert or refresh a session, re-measuring its size, then enforce the caps.
+
+        Call again after mutating a resident session so byte accounting stays current.
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            known = entry.message_sizes if entry is not None else {}
+        size, message_sizes = self._measure(session, known)
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                entry = self._entries[session_id] = _Entry(session, size, message_sizes)
+            else:
+                self._bytes -= entry.size
+                entry.session, entry.size, entry.message_sizes = session, size, message_sizes
+                entry.last_access = time.monotonic()
+                self._entries.move_to_end(session_id)
+            self._bytes += size
+            evicted = self._enforce_limits()
+        self._notify(evicted)
+
+    def pop(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Remove a session without calling `on_evict` (e.g. on reset)."""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is None:
+                return None
+            self._bytes -= entry.size
+            return entry.session
+
+    def clear(self):
+        """Evict every unpinned session, calling `on_evict` for each (e.g. at shutdown)."""
+        with self._lock:
+            evicted = []
+            for session_id in [sid for sid, entry in self._entries.items() if not entry.pins]:
+                entry = self._entries.pop(session_id)
+                self._bytes -= entry.size
+                evicted.append(entry.session)
+        self._notify(evicted)
+
+    def pin(self, session_id: str):
+        """Protect a resident session from eviction until `unpin` is called."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                entry.pins += 1
+
+    def unpin(self, session_id: str):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry.pins > 0:
+                entry.pins -= 1
+
+    def sweep(self):
+        """Expire idle sessions now instead of waiting for the next insert."""
+        with self._lock:
+            evicted = self._enforce_limits()
+        self._notify(evicted)
+
+    def _enforce_limits(self) -> List[Dict[str, Any]]:
+        """Drop expired, then least recently used, unpinned entries. Caller holds the lock."""
+        evicted = []
+        now = time.monotonic()
+        for session_id in list(self._entries):
+            entry = self._entries[session_id]
+            if now - entry.last_access < self.idle_ttl:
+                break  # entries are ordered by last access
+            if entry.pins:
+                continue
+            del self._entries[session_id]
+            self._bytes -= entry.size
+            self._expirations += 1
+            evicted.append(entry.session)
+
+        for session_id in list(self._entries):
+            if len(self._entries) <= self.max_entries and self._bytes <= self.max_bytes:
+                break
+            entry = self._entries[session_id]
+            if entry.pins:
+                continue
+            del self._entries[session_id]
+            self._bytes -= entry.size
+            self._evictions += 1
+            evicted.append(entry.session)
+        return evicted
+
+    def _notify(self, evicted: List[Dict[str, Any]]):
+        if self.on_evict is None:
+            return
+        for session in evicted:
+            self.on_evict(session)
+
+    def stats(self) -> Dict[str, int]:
+        """Return resident session count, estimated bytes and eviction counters."""
+        with self._lock:
+            return {
+                'sessions': len(self._entries),
+                'bytes': self._bytes,
+                'evictions': self._evictions,
+                'expirations': self._expirations
+            }
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,232 @@
+"""
+Spatial Index for activities and points of interest
+Accumulates geocoded search results on a grid and answers nearby queries locally
+
+Records from Amadeus radius searches are bucketed into fixed grid cells
+(2**-7 degrees, under 1 km) by kind ('activity', 'poi'), so results of
+earlier searches around a city build up into one local index. Every
+successful search also records its circle as covered: a later query whose
+circle lies inside a covered one is answered from the index with haversine
+filtering, and only uncovered circles (e.g. geo_tiling tiles of a box) are
+fetched upstream. Coverage and records expire after a TTL, and both are
+capped: least recently used records are evicted (dropping the coverage of
+the areas they were in, which is no longer complete) and only the newest
+covered circles are kept.
+"""
+
+import os
+import math
+import time
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from services.geo_tiling import haversine_km, in_box
+
+
+KM_PER_DEGREE = 111.195
+
+# Slack for coordinates rounded by callers (km)
+_COVER_TOLERANCE_KM = 0.01
+
+
+def _geo(record: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    geo = record.get('geoCode') or {}
+    try:
+        return float(geo['latitude']), float(geo['longitude'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class SpatialIndex:
+    """
+    Grid index of geocoded records with coverage tracking. Coverage is kept
+    per kind and key (e.g. a POI category filter), since a search restricted
+    to some categories does not cover the others.
+    """
+
+    def __init__(
+        self,
+        cell_degrees: float = 2.0 ** -7,
+        ttl: float = 6 * 3600,
+        max_records: int = 50000,
+        max_areas: int = 1000
+    ):
+        """
+        Initialize an empty index.
+
+        Args:
+            cell_degrees: Grid cell edge in degrees
+            ttl: Seconds a fetched area and its records stay valid
+            max_records: Maximum number of records per kind (least recently used evicted)
+            max_areas: Maximum number of covered circles per kind and key (oldest dropped)
+        """
+        self.cell_degrees = cell_degrees
+        self.ttl = ttl
+        self.max_records = max_records
+        self.max_areas = max_areas
+        self._evictions: Dict[str, int] = defaultdict(int)
+        # kind -> record id -> (latitude, longitude, fetched at, record), least recently used first
+        self._records: Dict[str, "OrderedDict[str, Tuple[float, float, float, Dict[str, Any]]]"] = defaultdict(OrderedDict)
+        # kind -> (row, column) -> record ids
+        self._cells: Dict[str, Dict[Tuple[int, int], Set[str]]] = defaultdict(lambda: defaultdict(set))
+        # (kind, key) -> covered circles (latitude, longitude, radius km, fetched at)
+        self._coverage: Dict[Tuple[str, Optional[str]], List[Tuple[float, float, float, float]]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees)
+
+    def _cells_in_box(self, north: float, west: float, south: float, east: float) -> Iterator[Tuple[int, int]]:
+        parts = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+        rows = range(math.floor(south / self.cell_degrees), math.floor(north / self.cell_degrees) + 1)
+        for part_west, part_east in parts:
+            columns = range(math.floor(part_west / self.cell_degrees), math.floor(part_east / self.cell_degrees) + 1)
+            for row in rows:
+                for column in columns:
+                    yield row, column
+
+    def _unlink(self, kind: str, record_id: str, latitude: float, longitude: float):
+        """Remove a record id from its cell, dropping the cell once empty."""
+        grid = self._cells[kind]
+        cell = self._cell(latitude, longitude)
+        ids = grid.get(cell)
+        if ids is not None:
+            ids.discard(record_id)
+            if not ids:
+                del grid[cell]
+
+    def _evict(self, kind: str):
+        """Evict least recently used records beyond `max_records`, uncovering their areas."""
+        records = self._records[kind]
+        evicted = []
+        while len(records) > self.max_records:
+            record_id, (latitude, longitude, _, _) = records.popitem(last=False)
+            self._unlink(kind, record_id, latitude, longitude)
+            evicted.append((latitude, longitude))
+        if not evicted:
+            return
+        self._evictions[kind] += len(evicted)
+        for (covered_kind, _), circles in self._coverage.items():
+            if covered_kind == kind:
+                circles[:] = [
+                    circle for circle in circles
+                    if not any(haversine_km(latitude, longitude, circle[0], circle[1]) <= circle[2] for latitude, longitude in evicted)
+                ]
+
+    def add(self, kind: str, records: Iterable[Dict[str, Any]]) -> int:
+        """Index (or refresh) records by their `id` and `geoCode`; returns how many were indexed."""
+        now = time.time()
+        added = 0
+        with self._lock:
+            for record in records:
+                point = _geo(record)
+                record_id = record.get('id')
+                if point is None or record_id is None:
+                    continue
+                previous = self._records[kind].pop(record_id, None)
+                if previous is not None:
+                    self._unlink(kind, record_id, previous[0], previous[1])
+                self._records[kind][record_id] = (point[0], point[1], now, record)
+                self._cells[kind][self._cell(*point)].add(record_id)
+                added += 1
+            self._evict(kind)
+        return added
+
+    def cover(self, kind: str, latitude: float, longitude: float, radius: float, key: Optional[str] = None):
+        """Record a circle (radius in km) as fetched."""
+        now = time.time()
+        with self._lock:
+            circles = self._coverage[(kind, key)]
+            circles[:] = [circle for circle in circles if now - circle[3] < self.ttl]
+            circles.append((latitude, longitude, radius, now))
+            del circles[:-self.max_areas]
+
+    def is_covered(self, kind: str, latitude: float, longitude: float, radius: float, key: Optional[str] = None) -> bool:
+        """True if the circle lies inside one fetched circle that has not expired."""
+        now = time.time()
+        with self._lock:
+            circles = self._coverage.get((kind, key))
+            if not circles:
+                return False
+            circles[:] = [circle for circle in circles if now - circle[3] < self.ttl]
+            return any(
+                haversine_km(latitude, longitude, covered_lat, covered_lon) + radius <= covered_radius + _COVER_TOLERANCE_KM
+                for covered_lat, covered_lon, covered_radius, _ in circles
+            )
+
+    def _collect(self, kind: str, cells: Iterable[Tuple[int, int]]) -> Iterator[Tuple[float, float, Dict[str, Any]]]:
+        """Unexpired records in the given cells, marked recently used; expired ones are dropped."""
+        now = time.time()
+        records = self._records.get(kind, {})
+        grid = self._cells.get(kind, {})
+        for cell in cells:
+            for record_id in list(grid.get(cell, ())):
+                latitude, longitude, fetched_at, record = records[record_id]
+                if now - fetched_at >= self.ttl:
+                    self._unlink(kind, record_id, latitude, longitude)
+                    del records[record_id]
+                    continue
+                records.move_to_end(record_id)
+                yield latitude, longitude, record
+
+    def within_radius(self, kind: str, latitude: float, longitude: float, radius: float) -> List[Tuple[float, Dict[str, Any]]]:
+        """Records within `radius` km of a point as `(distance km, record)`, nearest first."""
+        lat_span = radius / KM_PER_DEGREE
+        lon_span = min(radius / (KM_PER_DEGREE * max(math.cos(math.radians(min(abs(latitude) + lat_span, 89.9))), 1e-6)), 180.0)
+        west = (longitude - lon_span + 180) % 360 - 180
+        east = (longitude + lon_span + 180) % 360 - 180
+        if lon_span >= 180.0:
+            west, east = -180.0, 180.0
+        cells = self._cells_in_box(min(latitude + lat_span, 90.0), west, max(latitude - lat_span, -90.0), east)
+        with self._lock:
+            found = []
+            for record_lat, record_lon, record in self._collect(kind, cells):
+                distance = haversine_km(latitude, longitude, record_lat, record_lon)
+                if distance <= radius:
+                    found.append((distance, record))
+        found.sort(key=lambda item: item[0])
+        return found
+
+    def within_box(self, kind: str, north: float, west: float, south: float, east: float) -> List[Dict[str, Any]]:
+        """Records inside a box (west > east crosses the antimeridian)."""
+        north, south = max(north, south), min(north, south)
+        with self._lock:
+            return [
+                record for latitude, longitude, record in self._collect(kind, self._cells_in_box(north, west, south, east))
+                if in_box(latitude, longitude, north, west, south, east)
+            ]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                kind: {
+                    'records': len(records),
+                    'cells': len(self._cells[kind]),
+                    'covered_areas': sum(len(circles) for (covered_kind, _), circles in self._coverage.items() if covered_kind == kind),
+                    'evictions': self._evictions[kind]
+                }
+                for kind, records in self._records.items()
+            }
+
+
+_default_index: Optional[SpatialIndex] = None
+_default_lock = threading.Lock()
+
+
+def get_default_spatial_index() -> SpatialIndex:
+    """
+    Return the process-wide spatial index, configured from the environment:
+        SPATIAL_INDEX_TTL seconds fetched areas stay covered (default 21600, like the activity cache)
+        SPATIAL_INDEX_MAX_RECORDS per kind (default 50000)
+        SPATIAL_INDEX_MAX_AREAS covered circles per kind and filter (default 1000)
+    """
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = SpatialIndex(
+                ttl=float(os.getenv('SPATIAL_INDEX_TTL', str(6 * 3600))),
+                max_records=int(os.getenv('SPATIAL_INDEX_MAX_RECORDS', '50000')),
+                max_areas=int(os.getenv('SPATIAL_INDEX_MAX_AREAS', '1000'))
+            )
+        return _default_index
@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from services.geo_tiling import TooManyTiles, cover_box, haversine_km, in_box
+
+
+def _grid(north, west, south, east, steps=12):
+    """Evenly spaced points of a box, edges included."""
+    width = east - west if west <= east else east - west + 360
+    for i in range(steps + 1):
+        for j in range(steps + 1):
+            longitude = east if j == steps else west + width * j / steps
+            yield south + (north - south) * i / steps, longitude - 360 if longitude > 180 else longitude
+
+
+@pytest.mark.parametrize('box', [
+    (48.95, 2.25, 48.80, 2.45),       # Paris
+    (1.50, 103.60, 1.20, 104.05),     # Singapore, near the equator
+    (64.20, -22.05, 64.05, -21.75),   # Reykjavik, tiles widen in longitude
+    (-16.90, 179.80, -17.20, -179.85) # across the antimeridian
+])
+def test_circles_cover_the_box_within_the_radius_cap(box):
+    circles = cover_box(*box, max_radius_km=20)
+
+    assert circles
+    assert all(1 <= circle['radius'] <= 20 for circle in circles)
+    for latitude, longitude in _grid(*box):
+        assert in_box(latitude, longitude, *box)
+        assert any(
+            haversine_km(latitude, longitude, circle['latitude'], circle['longitude']) <= circle['radius']
+            for circle in circles
+        )
+
+
+def test_max_tiles_accepts_a_box_at_the_limit():
+    circles = cover_box(48.95, 2.25, 48.80, 2.45)
+    assert cover_box(48.95, 2.25, 48.80, 2.45, max_tiles=len(circles)) == circles
+
+    with pytest.raises(TooManyTiles) as error:
+        cover_box(48.95, 2.25, 48.80, 2.45, max_tiles=len(circles) - 1)
+    assert error.value.tiles > error.value.max_tiles == len(circles) - 1
+
+
+def test_oversized_box_is_rejected_before_tiles_are_listed():
+    started = time.monotonic()
+    with pytest.raises(TooManyTiles) as error:
+        cover_box(60, -10, 35, 40, max_radius_km=20, max_tiles=16)
+    assert error.value.tiles > 16
+    assert time.monotonic() - started < 1
@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from services.offer_store import OfferStore, offer_scope
+from services.response_cache import SQLiteCacheBackend
+
+
+def test_stores_sharing_a_file_never_reuse_a_handle(tmp_path):
+    path = str(tmp_path / 'shared.sqlite3')
+    stores = [OfferStore(shared=SQLiteCacheBackend(path)), OfferStore(shared=SQLiteCacheBackend(path))]
+
+    def register(worker):
+        with offer_scope('session'):
+            return [stores[worker % 2].put({'id': f"{worker}-{n}"}, 'F') for n in range(25)]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        handles = [handle for batch in pool.map(register, range(4)) for handle in batch]
+
+    assert len(handles) == len(set(handles)) == 100
+    assert sorted(int(handle[1:]) for handle in handles) == list(range(1, 101))
+
+
+def test_handle_issued_by_one_store_resolves_in_the_other(tmp_path):
+    path = str(tmp_path / 'shared.sqlite3')
+    first, second = OfferStore(shared=SQLiteCacheBackend(path)), OfferStore(shared=SQLiteCacheBackend(path))
+
+    with offer_scope('session'):
+        handle = first.put({'id': 'offer-1'}, 'H')
+        assert second.put({'id': 'offer-2'}, 'H') != handle
+        assert second.get(handle) == {'id': 'offer-1'}
+    with offer_scope('other-session'):
+        assert second.get(handle) is None
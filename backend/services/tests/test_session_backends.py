@@ -0,0 +1,84 @@
+import pytest
+
+from apps.chat.models import ChatMessage
+from services.session_backends import DatabaseSessionBackend, RedisSessionBackend, SessionConflict
+
+
+def _turn(session, text):
+    session['history'].append({'role': 'user', 'content': text})
+    session['history'].append({'role': 'assistant', 'content': f"re: {text}"})
+
+
+@pytest.fixture
+def redis_backend(db):
+    fakeredis = pytest.importorskip('fakeredis')
+    return RedisSessionBackend(client=fakeredis.FakeRedis())
+
+
+def test_database_save_rejects_stale_version(db):
+    backend = DatabaseSessionBackend()
+    backend.create('s1', {})
+    first, second = backend.load('s1'), backend.load('s1')
+
+    _turn(first, 'one')
+    assert backend.save(first, first['version']) == 1
+
+    _turn(second, 'two')
+    with pytest.raises(SessionConflict):
+        backend.save(second, second['version'])
+
+    stored = backend.load('s1')
+    assert stored['version'] == 1
+    assert [m['content'] for m in stored['history']] == ['one', 're: one']
+    assert ChatMessage.objects.filter(session__session_id='s1').count() == 2
+
+
+def test_database_load_returns_recent_turns_only(db):
+    backend = DatabaseSessionBackend(history_turns=2)
+    session = backend.create('s2', {})
+    for text in ('one', 'two', 'three'):
+        _turn(session, text)
+        backend.save(session, session['version'])
+
+    loaded = backend.load('s2')
+    assert [m['content'] for m in loaded['history']] == ['two', 're: two', 'three', 're: three']
+    assert loaded['persisted'] == 4
+
+    _turn(loaded, 'four')
+    backend.save(loaded, loaded['version'])
+    assert ChatMessage.objects.filter(session__session_id='s2').count() == 8
+
+
+def test_redis_save_rejects_stale_version(redis_backend):
+    redis_backend.create('s3', {})
+    first, second = redis_backend.load('s3'), redis_backend.load('s3')
+
+    _turn(first, 'one')
+    redis_backend.save(first, first['version'])
+
+    _turn(second, 'two')
+    with pytest.raises(SessionConflict):
+        redis_backend.save(second, second['version'])
+
+    stored = redis_backend.load('s3')
+    assert stored['version'] == 1
+    assert [m['content'] for m in stored['history']] == ['one', 're: one']
+
+
+def test_redis_drops_cached_session_when_database_is_ahead(redis_backend):
+    redis_backend.create('s4', {})
+    cached = redis_backend.load('s4')
+
+    # Saved by a worker bypassing Redis: the cached hash is now behind the DB
+    newer = redis_backend.durable.load('s4')
+    _turn(newer, 'elsewhere')
+    redis_backend.durable.save(newer, newer['version'])
+
+    _turn(cached, 'stale')
+    with pytest.raises(SessionConflict):
+        redis_backend.save(cached, cached['version'])
+
+    assert not redis_backend.client.exists(redis_backend._key('s4'))
+    reloaded = redis_backend.load('s4')
+    assert reloaded['version'] == 1
+    assert [m['content'] for m in reloaded['history']] == ['elsewhere', 're: elsewhere']
@@ -0,0 +1,424 @@
+"""
+OAuth Token Manager for Amadeus API calls
+One access token per set of credentials, shared by every thread and,
+through an optional store, by every worker process
+
+Tokens are refreshed in the background once they come within a margin of
+their expiry, so requests rarely wait for a token round-trip. With a shared
+store (SQLite file or Redis) a restarted worker picks up the token another
+worker already holds, and only one process refreshes it at a time.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+try:
+    import redis
+except ImportError:  # optional dependency, only needed for AMADEUS_TOKEN_STORE=redis
+    redis = None
+
+
+class TokenFetchError(Exception):
+    """Raised when the OAuth token endpoint fails or cannot be reached."""
+
+    def __init__(self, status_code: Optional[int], description: str, headers: Any = None):
+        super().__init__(f"[{status_code or '---'}]\n{description}")
+        self.status_code = status_code
+        self.description = description
+        self.headers = headers
+
+
+class TokenStore(ABC):
+    """
+    Interface for sharing tokens between processes. Tokens are stored as
+    `(token, expires_at)` with `expires_at` in wall-clock seconds; the
+    refresh lock lets one process refresh while the others keep waiting.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, token: str, expires_at: float):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str, token: str):
+        """Remove the stored token if it is still `token`."""
+
+    @abstractmethod
+    def try_lock(self, key: str, ttl: float) -> bool:
+        """Take the refresh lock for `key` for at most `ttl` seconds; False if another process holds it."""
+
+    @abstractmethod
+    def unlock(self, key: str):
+        ...
+
+
+class SQLiteTokenStore(TokenStore):
+    """
+    Token store in a SQLite file, shared by the worker processes of one
+    host. The file holds live credentials, so it is created owner-only.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the store, creating the tables if needed.
+
+        Args:
+            path: Path of the SQLite database file
+        """
+        self.path = path
+        self._local = threading.local()
+        if not os.path.exists(path):
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS oauth_tokens ('
+            'key TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS oauth_token_locks ('
+            'key TEXT PRIMARY KEY, locked_until REAL NOT NULL)'
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection (sqlite3 connections are not shareable across threads)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        row = self._connection().execute(
+            'SELECT token, expires_at FROM oauth_tokens WHERE key = ?', (key,)
+        ).fetchone()
+        return (row[0], row[1]) if row is not None else None
+
+    def set(self, key: str, token: str, expires_at: float):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO oauth_tokens (key, token, expires_at) VALUES (?, ?, ?)',
+            (key, token, expires_at)
+        )
+
+    def delete(self, key: str, token: str):
+        self._connection().execute('DELETE FROM oauth_tokens WHERE key = ? AND token = ?', (key, token))
+
+    def try_lock(self, key: str, ttl: float) -> bool:
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = conn.execute('SELECT locked_until FROM oauth_token_locks WHERE key = ?', (key,)).fetchone()
+            if row is not None and row[0] > now:
+                conn.execute('ROLLBACK')
+                return False
+            conn.execute(
+                'INSERT OR REPLACE INTO oauth_token_locks (key, locked_until) VALUES (?, ?)', (key, now + ttl)
+            )
+            conn.execute('COMMIT')
+            return True
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def unlock(self, key: str):
+        self._connection().execute('DELETE FROM oauth_token_locks WHERE key = ?', (key,))
+
+
+class RedisTokenStore(TokenStore):
+    """
+    Token store in Redis, shared by workers on any node. Works with any
+    server speaking the Redis protocol through the redis-py API.
+    """
+
+    def __init__(self, url: Optional[str] = None, client: Any = None, prefix: str = 'amadeus:token:'):
+        """
+        Initialize the store.
+
+        Args:
+            url: Redis URL, used when no client is given
+            client: redis-py compatible client (defaults to one built from `url`)
+            prefix: Key prefix
+        """
+        if client is None:
+            if redis is None:
+                raise ValueError("The redis package is required for the Redis token store.")
+            client = redis.Redis.from_url(url or 'redis://localhost:6379/0')
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry['token'], entry['expires_at']
+
+    def set(self, key: str, token: str, expires_at: float):
+        ttl_ms = max(int((expires_at - time.time()) * 1000), 1)
+        self.client.set(self.prefix + key, json.dumps({'token': token, 'expires_at': expires_at}), px=ttl_ms)
+
+    def delete(self, key: str, token: str):
+        entry = self.get(key)
+        if entry is not None and entry[0] == token:
+            self.client.delete(self.prefix + key)
+
+    def try_lock(self, key: str, ttl: float) -> bool:
+        return bool(self.client.set(self.prefix + key + ':lock', '1', nx=True, px=max(int(ttl * 1000), 1)))
+
+    def unlock(self, key: str):
+        self.client.delete(self.prefix + key + ':lock')
+
+
+class TokenManager:
+    """
+    Thread-safe client-credentials token source for one Amadeus host and
+    client ID, with proactive background refresh and fetch-latency metrics.
+    """
+
+    # A token is never handed out with less than this many seconds left (as the SDK does)
+    EXPIRY_BUFFER = 10
+
+    def __init__(
+        self,
+        host: str,
+        client_id: str,
+        client_secret: str,
+        refresh_margin: float = 300,
+        store: Optional[TokenStore] = None,
+        timeout: float = 10.0
+    ):
+        """
+        Initialize the manager; no token is fetched until first use.
+
+        Args:
+            host: API host, e.g. 'test.api.amadeus.com'
+            client_id: Amadeus API client ID
+            client_secret: Amadeus API client secret
+            refresh_margin: Seconds before expiry at which the token is refreshed in the background
+            store: Shared token store (defaults to this process only)
+            timeout: Token request timeout in seconds
+        """
+        self.host = host
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_margin = refresh_margin
+        self.store = store
+        self.timeout = timeout
+        self.key = f"{host}:{client_id}"
+        self._token: Optional[Tuple[str, float]] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._stats: Dict[str, float] = {
+            'fetches': 0, 'fetch_errors': 0, 'fetch_ms_total': 0.0, 'fetch_ms_max': 0.0, 'fetch_ms_last': 0.0,
+            'shared_hits': 0, 'shared_waits': 0, 'proactive_refreshes': 0, 'invalidations': 0,
+            'lock_timeouts': 0
+        }
+        self._stats_lock = threading.Lock()
+
+    def _count(self, counter: str, amount: float = 1):
+        with self._stats_lock:
+            self._stats[counter] += amount
+
+    def _fresh(self, entry: Optional[Tuple[str, float]], min_ttl: float, rejected: Optional[str] = None) -> bool:
+        return entry is not None and entry[1] - time.time() > min_ttl and entry[0] != rejected
+
+    def token(self, rejected: Optional[str] = None) -> str:
+        """
+        Return a usable access token, fetching one only if none is usable.
+        A token within the refresh margin is still returned while a
+        background refresh replaces it.
+
+        Args:
+            rejected: A token the API just refused (401); it is replaced even if not expired
+
+        Raises:
+            TokenFetchError: if a token is needed and the token endpoint fails
+        """
+        if rejected is not None and self._token is not None and self._token[0] == rejected:
+            self._invalidate(rejected)
+        entry = self._token
+        if self._fresh(entry, self.refresh_margin, rejected):
+            return entry[0]
+        if self.store is not None:
+            shared = self.store.get(self.key)
+            if self._fresh(shared, self.EXPIRY_BUFFER, rejected) and shared != entry:
+                self._token = entry = shared
+                self._count('shared_hits')
+                if self._fresh(entry, self.refresh_margin):
+                    return entry[0]
+        if self._fresh(entry, self.EXPIRY_BUFFER, rejected):
+            self._refresh_in_background()
+            return entry[0]
+        return self._refresh(self.EXPIRY_BUFFER, rejected)
+
+    def _invalidate(self, token: str):
+        with self._lock:
+            if self._token is not None and self._token[0] == token:
+                self._token = None
+                self._count('invalidations')
+        if self.store is not None:
+            self.store.delete(self.key, token)
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        self._count('proactive_refreshes')
+
+        def run():
+            try:
+                self._refresh(self.refresh_margin)
+            except Exception:
+                pass  # the token is still valid; the next caller retries
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='amadeus-token-refresh', daemon=True).start()
+
+    def _refresh(self, min_ttl: float, rejected: Optional[str] = None) -> str:
+        """Fetch a token unless another thread or process already did; one fetch per process at a time."""
+        with self._lock:
+            if self._fresh(self._token, min_ttl, rejected):
+                return self._token[0]
+            if self.store is not None:
+                shared = self.store.get(self.key)
+                if self._fresh(shared, min_ttl, rejected):
+                    self._token = shared
+                    self._count('shared_hits')
+                    return shared[0]
+                acquired = self.store.try_lock(self.key, self.timeout + 5)
+                if not acquired:
+                    shared = self._wait_for_shared(min_ttl, rejected)
+                    if shared is not None:
+                        self._token = shared
+                        return shared[0]
+                    # The holder did not publish a token in time; take over its lock if it has
+                    # expired, else fetch without it (never release a lock held by another process)
+                    acquired = self.store.try_lock(self.key, self.timeout + 5)
+                    if not acquired:
+                        self._count('lock_timeouts')
+                try:
+                    token, expires_at = self._fetch()
+                    self.store.set(self.key, token, expires_at)
+                finally:
+                    if acquired:
+                        self.store.unlock(self.key)
+            else:
+                token, expires_at = self._fetch()
+            self._token = (token, expires_at)
+            return token
+
+    def _wait_for_shared(self, min_ttl: float, rejected: Optional[str]) -> Optional[Tuple[str, float]]:
+        """Poll the store while another process refreshes; None if it did not finish in time."""
+        self._count('shared_waits')
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            shared = self.store.get(self.key)
+            if self._fresh(shared, min_ttl, rejected):
+                return shared
+        return None
+
+    def _fetch(self) -> Tuple[str, float]:
+        """Request a new token from the OAuth endpoint, recording the round-trip latency."""
+        started = time.monotonic()
+        try:
+            response = httpx.post(
+                f"https://{self.host}/v1/security/oauth2/token",
+                data={
+                    'grant_type': 'client_credentials',
+                    'client_id': self.client_id,
+                    'client_secret': self.client_secret
+                },
+                timeout=self.timeout
+            )
+        except httpx.TransportError as e:
+            self._count('fetch_errors')
+            raise TokenFetchError(None, str(e)) from e
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._stats_lock:
+            self._stats['fetches'] += 1
+            self._stats['fetch_ms_total'] += elapsed_ms
+            self._stats['fetch_ms_last'] = elapsed_ms
+            self._stats['fetch_ms_max'] = max(self._stats['fetch_ms_max'], elapsed_ms)
+        try:
+            result = response.json()
+        except ValueError:
+            result = {}
+        if response.status_code >= 400 or 'access_token' not in result:
+            self._count('fetch_errors')
+            description = result.get('error_description') or result.get('error') or response.reason_phrase
+            raise TokenFetchError(response.status_code, description, response.headers)
+        return result['access_token'], time.time() + int(result.get('expires_in', 0))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return fetch counts and latencies (milliseconds) and the current token's remaining lifetime."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['fetch_ms_avg'] = round(stats['fetch_ms_total'] / stats['fetches'], 1) if stats['fetches'] else 0.0
+        entry = self._token
+        stats['expires_in'] = max(round(entry[1] - time.time()), 0) if entry is not None else 0
+        return stats
+
+
+class SDKAccessToken:
+    """
+    Stand-in for the Amadeus SDK's AccessToken: assigned to
+    `client.access_token`, it makes the SDK draw tokens from a TokenManager.
+    """
+
+    def __init__(self, manager: TokenManager):
+        self.manager = manager
+
+    def _bearer_token(self) -> str:
+        return f"Bearer {self.manager.token()}"
+
+
+_managers: Dict[str, TokenManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_token_manager(host: str, client_id: str, client_secret: str) -> TokenManager:
+    """
+    Return the process-wide token manager for a host and client ID,
+    configured from the environment:
+        AMADEUS_TOKEN_REFRESH_MARGIN seconds before expiry to refresh (default 300)
+        AMADEUS_TOKEN_STORE 'local', 'sqlite' or 'redis' (default 'local')
+        AMADEUS_TOKEN_STORE_PATH SQLite file for the sqlite store (default 'amadeus_tokens.sqlite3')
+        AMADEUS_TOKEN_REDIS_URL (default 'redis://localhost:6379/0')
+    """
+    key = f"{host}:{client_id}"
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            backend = os.getenv('AMADEUS_TOKEN_STORE', 'local')
+            store = None
+            if backend == 'sqlite':
+                store = SQLiteTokenStore(os.getenv('AMADEUS_TOKEN_STORE_PATH', 'amadeus_tokens.sqlite3'))
+            elif backend == 'redis':
+                store = RedisTokenStore(os.getenv('AMADEUS_TOKEN_REDIS_URL', 'redis://localhost:6379/0'))
+            manager = _managers[key] = TokenManager(
+                host, client_id, client_secret,
+                refresh_margin=float(os.getenv('AMADEUS_TOKEN_REFRESH_MARGIN', '300')),
+                store=store
+            )
+        return manager
+
+
+def token_stats() -> Dict[str, Dict[str, Any]]:
+    with _managers_lock:
+        managers = dict(_managers)
+    return {key: manager.stats() for key, manager in managers.items()}
@@ -0,0 +1,189 @@
+"""
+Tool Registry for LLM tool-calling
+Declares each tool's schema and execution policy next to its implementation
+
+Tools are methods decorated with @tool; a ToolRegistry built from the
+service instance dispatches calls by name in O(1) and generates the
+OpenRouter (OpenAI function-calling) tool list from the same declarations.
+While a tool runs, its spec is available through current_tool(), so the
+layers below apply its policy: non-cacheable tools bypass the response
+cache and non-idempotent tools are not retried after the upstream may have
+processed the request.
+"""
+
+import threading
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+
+class ToolSpec:
+    """
+    Schema and execution policy of one tool.
+
+    Attributes:
+        name: Tool name exposed to the LLM
+        description: Tool description exposed to the LLM
+        parameters: JSON-schema properties of the tool arguments
+        required: Names of required arguments
+        cacheable: Upstream responses may be served from (and stored in) the response cache
+        timeout: Seconds a call may take before it is reported as timed out (None: service default)
+        idempotent: Repeating the call yields the same result without side effects, so identical
+            calls in one turn share one execution and failed upstream requests may be retried
+        concurrency: Concurrency class; calls of one class share a concurrency limit
+        handler: Bound method implementing the tool (set when registered)
+    """
+
+    __slots__ = ('name', 'description', 'parameters', 'required', 'cacheable', 'timeout', 'idempotent', 'concurrency', 'handler')
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        required: Optional[List[str]] = None,
+        cacheable: bool = False,
+        timeout: Optional[float] = None,
+        idempotent: bool = True,
+        concurrency: str = 'default',
+        handler: Optional[Callable[..., Dict[str, Any]]] = None
+    ):
+        self.name = name
+        self.description = description
+        self.parameters = parameters or {}
+        self.required = required or []
+        self.cacheable = cacheable
+        self.timeout = timeout
+        self.idempotent = idempotent
+        self.concurrency = concurrency
+        self.handler = handler
+
+    def bind(self, handler: Callable[..., Dict[str, Any]]) -> 'ToolSpec':
+        """Return a copy of this spec bound to `handler`."""
+        return ToolSpec(
+            self.name, self.description, self.parameters, self.required,
+            self.cacheable, self.timeout, self.idempotent, self.concurrency, handler
+        )
+
+    def definition(self) -> Dict[str, Any]:
+        """Tool definition in OpenAI function-calling format."""
+        return {
+            'type': 'function',
+            'function': {
+                'name': self.name,
+                'description': self.description,
+                'parameters': {
+                    'type': 'object',
+                    'properties': self.parameters,
+                    'required': self.required
+                }
+            }
+        }
+
+
+def tool(
+    description: str,
+    parameters: Optional[Dict[str, Any]] = None,
+    required: Optional[List[str]] = None,
+    name: Optional[str] = None,
+    cacheable: bool = False,
+    timeout: Optional[float] = None,
+    idempotent: bool = True,
+    concurrency: str = 'default'
+) -> Callable:
+    """
+    Declare a service method as an LLM tool. See ToolSpec for the arguments;
+    the tool name defaults to the method name.
+    """
+    def decorator(func: Callable) -> Callable:
+        func.tool_spec = ToolSpec(
+            name or func.__name__, description, parameters, required,
+            cacheable, timeout, idempotent, concurrency
+        )
+        return func
+    return decorator
+
+
+_current_tool: ContextVar[Optional[ToolSpec]] = ContextVar('current_tool', default=None)
+
+
+def current_tool() -> Optional[ToolSpec]:
+    """Spec of the tool being dispatched in this context (fan-out tasks included), or None."""
+    return _current_tool.get()
+
+
+class ToolRegistry:
+    """
+    Name -> ToolSpec map with per-concurrency-class limits.
+    """
+
+    def __init__(self, concurrency_limits: Optional[Dict[str, int]] = None):
+        """
+        Initialize an empty registry.
+
+        Args:
+            concurrency_limits: Maximum concurrent calls per concurrency class (unlisted classes are unlimited)
+        """
+        self.concurrency_limits = concurrency_limits or {}
+        self._specs: Dict[str, ToolSpec] = {}
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._definitions: Optional[List[Dict[str, Any]]] = None
+
+    @classmethod
+    def from_instance(cls, instance: Any, concurrency_limits: Optional[Dict[str, int]] = None) -> 'ToolRegistry':
+        """Register every @tool method of `instance`, in class definition order."""
+        registry = cls(concurrency_limits)
+        seen = set()
+        for klass in type(instance).__mro__:
+            for attr, value in vars(klass).items():
+                spec = getattr(value, 'tool_spec', None)
+                if spec is not None and attr not in seen:
+                    seen.add(attr)
+                    registry.register(spec.bind(getattr(instance, attr)))
+        return registry
+
+    def register(self, spec: ToolSpec):
+        if spec.handler is None:
+            raise ValueError(f"Tool {spec.name} has no handler")
+        self._specs[spec.name] = spec
+        limit = self.concurrency_limits.get(spec.concurrency)
+        if limit and spec.concurrency not in self._semaphores:
+            self._semaphores[spec.concurrency] = threading.BoundedSemaphore(limit)
+        self._definitions = None
+
+    def get(self, name: str) -> Optional[ToolSpec]:
+        return self._specs.get(name)
+
+    def dispatch(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Call a tool by name, waiting for a slot in its concurrency class.
+
+        Raises:
+            ValueError: if no tool has this name
+        """
+        spec = self._specs.get(name)
+        if spec is None:
+            raise ValueError(f"Unknown function: {name}")
+        semaphore = self._semaphores.get(spec.concurrency)
+        token = _current_tool.set(spec)
+        try:
+            if semaphore is None:
+                return spec.handler(**arguments)
+            with semaphore:
+                return spec.handler(**arguments)
+        finally:
+            _current_tool.reset(token)
+
+    def definitions(self) -> List[Dict[str, Any]]:
+        """OpenRouter tool list, built once per registry."""
+        if self._definitions is None:
+            self._definitions = [spec.definition() for spec in self._specs.values()]
+        return self._definitions
+
+    def names(self) -> List[str]:
+        return list(self._specs)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._specs
+
+    def __len__(self) -> int:
+        return len(self._specs)